@@ -0,0 +1,381 @@
+"""端到端负载基准：本地假订阅源服务器 + 假 Telegram Bot API 驱动 check_feeds_job。
+
+用法（在仓库根目录执行）:
+
+    python benchmarks/load_test.py --chats 200 --feeds-per-chat 20 --feed-count 2000 --cycles 4
+
+假服务运行在独立进程中，测得的峰值内存只包含机器人进程。订阅源分布在
+127.0.0.1 ~ 127.0.0.N 多个回环地址上以模拟多主机（Linux 默认支持；
+其他系统可使用 --hosts 1）。
+"""
+import argparse
+import asyncio
+import html
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import time
+from email.utils import formatdate
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_manager  # noqa: E402
+import feed_checker  # noqa: E402
+import feed_parser  # noqa: E402
+import fetcher  # noqa: E402
+import metrics  # noqa: E402
+import sender  # noqa: E402
+
+logger = logging.getLogger("load_test")
+
+BOT_TOKEN = "123456:BENCHMARK"
+SUMMARY_TEXT = "Python asyncio 性能基准测试 <b>示例</b> 摘要内容，包含中文与 English mixed text. "
+_PUBLISHED_PATTERN = re.compile(r"published=(\d+)")
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(math.ceil(fraction * len(ordered))) - 1)]
+
+
+class FakeFeedServer:
+    def __init__(self, options: argparse.Namespace, started_at: float) -> None:
+        rng = random.Random(options.seed)
+        self.options = options
+        self.started_at = started_at
+        self.offsets = [rng.uniform(0, options.update_interval) for _ in range(options.feed_count)]
+        self.atom = [rng.random() < options.atom_ratio for _ in range(options.feed_count)]
+        self.failures = random.Random(options.seed + 1)
+        summary = SUMMARY_TEXT * (options.summary_bytes // len(SUMMARY_TEXT.encode("utf-8")) + 1)
+        self.summary = html.escape(summary.encode("utf-8")[:options.summary_bytes].decode("utf-8", "ignore"))
+        self.requests = 0
+        self.failed = 0
+        self.bytes_served = 0
+        self._cache: Dict[int, Tuple[int, bytes]] = {}
+
+    def _render(self, index: int, latest: int, base_url: str) -> bytes:
+        items = []
+        for sequence in range(latest, latest - self.options.entries, -1):
+            published = self.started_at + self.offsets[index] + sequence * self.options.update_interval
+            link = f"{base_url}/items/{index}/{sequence}?published={int(published * 1000)}"
+            title = f"Feed {index} entry {sequence}"
+            if self.atom[index]:
+                stamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(published))
+                items.append(
+                    f"<entry><id>urn:bench:{index}:{sequence}</id><title>{title}</title>"
+                    f'<link href="{html.escape(link)}"/><updated>{stamp}</updated>'
+                    f'<summary type="html">{self.summary}</summary></entry>'
+                )
+            else:
+                items.append(
+                    f"<item><guid isPermaLink=\"false\">bench-{index}-{sequence}</guid><title>{title}</title>"
+                    f"<link>{html.escape(link)}</link><pubDate>{formatdate(published, usegmt=True)}</pubDate>"
+                    f"<description>{self.summary}</description></item>"
+                )
+
+        if self.atom[index]:
+            document = (
+                '<?xml version="1.0" encoding="utf-8"?><feed xmlns="http://www.w3.org/2005/Atom">'
+                f"<title>Benchmark feed {index}</title>{''.join(items)}</feed>"
+            )
+        else:
+            document = (
+                '<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>'
+                f"<title>Benchmark feed {index}</title>"
+                f"<lastBuildDate>{formatdate(time.time(), usegmt=True)}</lastBuildDate>"
+                f"{''.join(items)}</channel></rss>"
+            )
+        return document.encode("utf-8")
+
+    async def handle(self, request: web.Request) -> web.Response:
+        index = int(request.match_info["index"])
+        self.requests += 1
+        if index >= self.options.feed_count:
+            return web.Response(status=404)
+        if self.failures.random() < self.options.failure_rate:
+            self.failed += 1
+            return web.Response(status=500)
+
+        elapsed = time.time() - self.started_at - self.offsets[index]
+        latest = int(elapsed // self.options.update_interval)
+        cached = self._cache.get(index)
+        if cached is None or cached[0] != latest or not self.atom[index]:
+            # RSS 文档的 lastBuildDate 每次都会变化，用于覆盖内容哈希的归一化路径。
+            cached = (latest, self._render(index, latest, f"http://{request.host}"))
+            self._cache[index] = cached
+        self.bytes_served += len(cached[1])
+        return web.Response(body=cached[1], content_type="application/xml")
+
+
+class FakeTelegramApi:
+    def __init__(self) -> None:
+        self.sent = 0
+        self.latencies: List[float] = []
+        self._message_id = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+
+        if method == "getMe":
+            result: Any = {"id": 123456, "is_bot": True, "first_name": "Benchmark", "username": "benchmark_bot"}
+        elif method == "sendMessage":
+            received_at = time.time()
+            text = str(params.get("text", ""))
+            self.sent += 1
+            self._message_id += 1
+            match = _PUBLISHED_PATTERN.search(text)
+            if match:
+                self.latencies.append(received_at - int(match.group(1)) / 1000)
+            result = {
+                "message_id": self._message_id,
+                "date": int(received_at),
+                "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+                "text": text,
+            }
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+
+async def _serve_fake_services(options: argparse.Namespace, connection: Any) -> None:
+    feeds = FakeFeedServer(options, time.time())
+    telegram_api = FakeTelegramApi()
+
+    async def handle_stats(request: web.Request) -> web.Response:
+        return web.json_response({
+            "feed_requests": feeds.requests,
+            "feed_failures": feeds.failed,
+            "feed_bytes": feeds.bytes_served,
+            "messages": telegram_api.sent,
+            "latencies": telegram_api.latencies,
+        })
+
+    app = web.Application()
+    app.router.add_get("/feeds/{index}.xml", feeds.handle)
+    app.router.add_post("/bot{token}/{method}", telegram_api.handle)
+    app.router.add_get("/stats", handle_stats)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+
+    first_site = web.TCPSite(runner, "127.0.0.1", 0)
+    await first_site.start()
+    port = first_site._server.sockets[0].getsockname()[1]
+    for host_index in range(2, options.hosts + 1):
+        await web.TCPSite(runner, f"127.0.0.{host_index}", port).start()
+
+    connection.send(port)
+    await asyncio.get_running_loop().run_in_executor(None, connection.recv)
+    await runner.cleanup()
+
+
+def _run_fake_services(options: argparse.Namespace, connection: Any) -> None:
+    asyncio.run(_serve_fake_services(options, connection))
+
+
+def _build_subscriptions(options: argparse.Namespace, port: int) -> Dict[str, Any]:
+    rng = random.Random(options.seed + 2)
+    subscriptions = {}
+    for chat_index in range(options.chats):
+        feed_indexes = rng.sample(range(options.feed_count), min(options.feeds_per_chat, options.feed_count))
+        rss_feeds = {}
+        for feed_index in feed_indexes:
+            host = f"127.0.0.{feed_index % options.hosts + 1}"
+            rss_feeds[f"http://{host}:{port}/feeds/{feed_index}.xml"] = {
+                "title": f"Benchmark feed {feed_index}",
+                "keywords": [],
+                "last_entry_id": None,
+            }
+        subscriptions[str(100000 + chat_index)] = {
+            "rss_feeds": rss_feeds,
+            "custom_footer": None,
+            "link_preview_enabled": True,
+        }
+    return subscriptions
+
+
+async def _get_service_stats(port: int) -> Dict[str, Any]:
+    session = fetcher.get_fetcher()._get_session()
+    async with session.get(f"http://127.0.0.1:{port}/stats") as response:
+        return await response.json()
+
+
+def _get_stage_seconds() -> Dict[str, Dict[str, float]]:
+    stages = {}
+    for name, metric in metrics._registry.items():
+        if isinstance(metric, metrics.Histogram) and metric.count:
+            stages[name] = {"count": metric.count, "total": metric.sum, "mean": metric.sum / metric.count}
+    return stages
+
+
+async def run_benchmark(options: argparse.Namespace, port: int, data_dir: str) -> Dict[str, Any]:
+    from telegram import Bot
+    from telegram.request import HTTPXRequest
+
+    json_file = os.path.join(data_dir, "subscriptions.json")
+    with open(json_file, "w", encoding="utf-8") as f:
+        json.dump(_build_subscriptions(options, port), f)
+    data_file = json_file if options.storage == "json" else os.path.join(data_dir, "subscriptions.db")
+
+    settings = {
+        "max_concurrent_checks": options.concurrency,
+        "max_checks_per_host": options.per_host,
+        "max_connections": options.concurrency * 2,
+        "max_connections_per_host": options.per_host * 2,
+        "global_messages_per_second": options.send_rate,
+        "chat_messages_per_second": options.send_rate,
+        "cycle_deadline_seconds": options.cycle_deadline,
+        "parse_workers": options.parse_workers,
+    }
+    data_manager.configure_persistence(data_manager.DEFAULT_SAVE_DELAY_SECONDS)
+    data_manager.load_subscriptions(data_file)
+    fetcher.set_fetcher(fetcher.create_fetcher(settings))
+    parse_pool = feed_parser.create_parse_pool(settings)
+    await asyncio.to_thread(feed_parser.warm_up_parse_pool, parse_pool)
+    feed_parser.set_parse_pool(parse_pool)
+
+    bot = Bot(
+        BOT_TOKEN,
+        base_url=f"http://127.0.0.1:{port}/bot",
+        request=HTTPXRequest(connection_pool_size=sender.DEFAULT_MAX_IN_FLIGHT),
+    )
+    await bot.initialize()
+    message_sender = sender.create_sender(bot, settings)
+    message_sender.start()
+    sender.set_sender(message_sender)
+    context = SimpleNamespace(bot=bot, bot_data={"config": settings, "data_file": data_file})
+
+    cycles = []
+    try:
+        for cycle in range(options.cycles):
+            for feed_state in data_manager.feed_states.values():
+                # 基准中每轮都检查全部订阅源，不受自适应间隔影响。
+                feed_state["next_check_at"] = None
+            before = await _get_service_stats(port)
+            started_at = time.perf_counter()
+            await feed_checker.check_feeds_job(context, data_file)
+            # 投递在后台进行，计时包含本轮消息全部送达。
+            await feed_checker.wait_for_delivery()
+            wall_seconds = time.perf_counter() - started_at
+            after = await _get_service_stats(port)
+
+            fetches = after["feed_requests"] - before["feed_requests"]
+            messages = after["messages"] - before["messages"]
+            cycles.append({
+                "cycle": cycle,
+                "seed_cycle": cycle == 0,
+                "wall_seconds": round(wall_seconds, 4),
+                "fetches": fetches,
+                "fetch_failures": after["feed_failures"] - before["feed_failures"],
+                "bytes": after["feed_bytes"] - before["feed_bytes"],
+                "fetches_per_second": round(fetches / wall_seconds, 2),
+                "messages": messages,
+                "sends_per_second": round(messages / wall_seconds, 2),
+            })
+            logger.info("第 %s 轮: %s", cycle, cycles[-1])
+            if cycle + 1 < options.cycles:
+                await asyncio.sleep(options.cycle_gap)
+
+        latencies = (await _get_service_stats(port))["latencies"]
+    finally:
+        await feed_checker.close_delivery()
+        await sender.close_sender()
+        sender.set_sender(None)
+        await data_manager.flush(data_file)
+        await fetcher.close_fetcher()
+        feed_parser.close_parse_pool()
+        data_manager.close_storage()
+        await bot.shutdown()
+
+    measured = [cycle for cycle in cycles if not cycle["seed_cycle"]] or cycles
+    return {
+        "parameters": vars(options),
+        "subscriptions": options.chats * min(options.feeds_per_chat, options.feed_count),
+        "cycles": cycles,
+        "summary": {
+            "mean_cycle_seconds": round(sum(c["wall_seconds"] for c in measured) / len(measured), 4),
+            "max_cycle_seconds": max(c["wall_seconds"] for c in measured),
+            "fetches_per_second": round(
+                sum(c["fetches"] for c in measured) / sum(c["wall_seconds"] for c in measured), 2
+            ),
+            "sends_per_second": round(
+                sum(c["messages"] for c in measured) / sum(c["wall_seconds"] for c in measured), 2
+            ),
+            "messages": sum(c["messages"] for c in cycles),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "delivery_latency_seconds": {
+                "p50": _percentile(latencies, 0.5),
+                "p95": _percentile(latencies, 0.95),
+                "max": max(latencies) if latencies else None,
+            },
+        },
+        "stage_seconds": _get_stage_seconds(),
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=100, help="聊天数量")
+    parser.add_argument("--feeds-per-chat", type=int, default=20, help="每个聊天订阅的订阅源数量")
+    parser.add_argument("--feed-count", type=int, default=1000, help="不同订阅源地址的总数")
+    parser.add_argument("--entries", type=int, default=20, help="每个订阅源文档中的条目数")
+    parser.add_argument("--summary-bytes", type=int, default=800, help="每个条目摘要的大致字节数")
+    parser.add_argument("--update-interval", type=float, default=20.0, help="每个订阅源产生新条目的间隔（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.02, help="订阅源请求返回 500 的概率")
+    parser.add_argument("--atom-ratio", type=float, default=0.3, help="Atom 格式订阅源的比例")
+    parser.add_argument("--hosts", type=int, default=20, help="订阅源分布的回环地址数量")
+    parser.add_argument("--cycles", type=int, default=3, help="检查轮数（第一轮只初始化已读记录）")
+    parser.add_argument("--cycle-gap", type=float, default=20.0, help="两轮检查之间的等待时间（秒）")
+    parser.add_argument("--concurrency", type=int, default=20, help="max_concurrent_checks")
+    parser.add_argument("--per-host", type=int, default=2, help="max_checks_per_host")
+    parser.add_argument("--send-rate", type=float, default=1000.0, help="假 Telegram API 的发送限速（条/秒）")
+    parser.add_argument("--cycle-deadline", type=float, default=600.0, help="cycle_deadline_seconds")
+    parser.add_argument("--parse-workers", type=int, default=0, help="parse_workers")
+    parser.add_argument("--storage", choices=("sqlite", "json"), default="sqlite", help="存储后端")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+    parser.add_argument("--output", help="把 JSON 结果写入此文件")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    options = parse_args(argv)
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    parent_connection, child_connection = multiprocessing.Pipe()
+    services = multiprocessing.Process(target=_run_fake_services, args=(options, child_connection), daemon=True)
+    services.start()
+    try:
+        port = parent_connection.recv()
+        with tempfile.TemporaryDirectory() as data_dir:
+            result = asyncio.run(run_benchmark(options, port, data_dir))
+    finally:
+        parent_connection.send("stop")
+        services.join(timeout=10)
+
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""逐条目热点函数的微基准，结果写入 JSON 以便跨提交比较。
+
+用法（在仓库根目录执行）:
+
+    python benchmarks/micro_benchmarks.py --output micro.json
+    python benchmarks/micro_benchmarks.py --output new.json --compare micro.json
+    python benchmarks/micro_benchmarks.py --full   # 订阅文件最大到 100 MB，耗时较长
+
+每项结果记录 repeat 次测量中每次操作的最短耗时（最不受干扰的一次）。
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_manager  # noqa: E402
+import feed_checker  # noqa: E402
+import feed_parser  # noqa: E402
+import keyword_filter  # noqa: E402
+import sender  # noqa: E402
+
+KEYWORD_COUNTS = (1, 10, 100, 500)
+MATCHER_KEYWORD_COUNTS = (100, 200, 300, 500)
+DEFAULT_FILE_SIZES = (1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024)
+FULL_FILE_SIZES = DEFAULT_FILE_SIZES + (100 * 1024 * 1024,)
+
+CJK_TEXT = "异步事件循环在高并发场景下调度协程，订阅源更新后推送到电报频道。性能优化需要基准测试来验证。"
+LATIN_TEXT = "The quick brown fox jumps over the lazy dog while asyncio schedules thousands of coroutines. "
+WORDS = (
+    "python", "asyncio", "rust", "kernel", "database", "release", "security", "性能", "数据库", "发布",
+    "安全", "内核", "编程", "机器学习", "云原生", "容器", "编译器", "网络", "存储", "前端",
+)
+
+
+def _make_html_summary(size: int, rng: random.Random) -> str:
+    parts = []
+    length = 0
+    while length < size:
+        text = CJK_TEXT if rng.random() < 0.5 else LATIN_TEXT
+        part = f'<p class="para"><a href="https://example.com/{rng.randrange(10**6)}">{text[:20]}</a>{text}</p>'
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)[:size]
+
+
+def _make_keywords(count: int, rng: random.Random) -> List[str]:
+    keywords = [f"{rng.choice(WORDS)}{index}" for index in range(count)]
+    # 最后一个关键词在条目中出现，确保匹配必须扫描到全部模式。
+    keywords[-1] = "asyncio"
+    return keywords
+
+
+def _make_entry(index: int, summary: str) -> feed_parser.FeedEntry:
+    entry = feed_parser.extract_entry({
+        "id": f"https://example.com/posts/{index}",
+        "title": f"{CJK_TEXT[:24]} {index}: Python asyncio 性能",
+        "link": f"https://example.com/posts/{index}?utm_source=rss&a=1&b=2",
+        "summary": summary,
+        "content": [{"value": summary}],
+    })
+    assert entry is not None
+    return entry
+
+
+def _make_subscriptions(target_bytes: int, rng: random.Random) -> Dict[str, Any]:
+    # 按 JSON 后端落盘格式（indent=4）估算体积，逐个订阅源累加直到达到目标大小。
+    subscriptions: Dict[str, Any] = {}
+    size = 0
+    chat_index = 0
+    while size < target_bytes:
+        rss_feeds: Dict[str, Any] = {}
+        subscriptions[str(100000 + chat_index)] = {
+            "rss_feeds": rss_feeds,
+            "custom_footer": None,
+            "link_preview_enabled": True,
+        }
+        size += 120
+        for feed_index in range(rng.randint(1, 30)):
+            feed_url = f"https://feeds{rng.randrange(1000)}.example.com/{chat_index}/{feed_index}.xml"
+            # 每个已读键在缩进后的文件中约占 40 字节，小目标时只保留放得下的数量。
+            seen_count = max(1, min(data_manager.SEEN_ENTRIES_LIMIT, (target_bytes - size) // 40))
+            feed_data = {
+                "title": f"{CJK_TEXT[:rng.randint(4, 20)]} {feed_index}",
+                "keywords": [rng.choice(WORDS) for _ in range(rng.randint(0, 5))],
+                "seen_entries": [
+                    data_manager.make_entry_key(f"{feed_url}#{entry}")
+                    for entry in range(rng.randint(max(1, seen_count // 2), seen_count))
+                ],
+                "last_entry_id": f"{feed_url}#latest",
+            }
+            rss_feeds[feed_url] = feed_data
+            size += len(json.dumps({feed_url: feed_data}, indent=4, ensure_ascii=False).encode("utf-8")) + 16
+            if size >= target_bytes:
+                break
+        chat_index += 1
+    return subscriptions
+
+
+def _get_storage_bytes(data_file: str) -> int:
+    # SQLite 在 WAL 模式下尚未检查点的数据位于 -wal 文件中。
+    return sum(
+        os.path.getsize(path)
+        for path in (data_file, f"{data_file}-wal")
+        if os.path.exists(path)
+    )
+
+
+class BenchmarkRunner:
+    def __init__(self, repeat: int, min_seconds: float) -> None:
+        self.repeat = repeat
+        self.min_seconds = min_seconds
+        self.results: List[Dict[str, Any]] = []
+
+    def _autorange(self, timer: timeit.Timer) -> int:
+        number = 1
+        while True:
+            if timer.timeit(number) >= self.min_seconds or number >= 10**7:
+                return number
+            number *= 10
+
+    def _record(self, name: str, params: Dict[str, Any], number: int, timings: List[float]) -> None:
+        best = min(timings) / number
+        result = {
+            "name": name,
+            "params": params,
+            "number": number,
+            "repeat": len(timings),
+            "seconds_per_op": best,
+            "ops_per_second": 1 / best if best else None,
+        }
+        self.results.append(result)
+        print(f"{name:<32} {json.dumps(params, ensure_ascii=False):<40} {best * 1e6:>14.3f} µs/op", flush=True)
+
+    def bench(self, name: str, params: Dict[str, Any], func: Callable[[], Any]) -> None:
+        timer = timeit.Timer(func)
+        number = self._autorange(timer)
+        self._record(name, params, number, timer.repeat(repeat=self.repeat, number=number))
+
+    def bench_once(self, name: str, params: Dict[str, Any], func: Callable[[], Any]) -> None:
+        # 耗时较长的操作每次只执行一次。
+        timings = []
+        for _ in range(self.repeat):
+            started_at = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started_at)
+        self._record(name, params, 1, timings)
+
+    def bench_async(self, name: str, params: Dict[str, Any], func: Callable[[], Any], number: int) -> None:
+        async def run_batch() -> float:
+            started_at = time.perf_counter()
+            for _ in range(number):
+                await func()
+            return time.perf_counter() - started_at
+
+        loop = asyncio.new_event_loop()
+        try:
+            timings = [loop.run_until_complete(run_batch()) for _ in range(self.repeat)]
+        finally:
+            loop.close()
+        self._record(name, params, number, timings)
+
+
+def bench_entries(runner: BenchmarkRunner, rng: random.Random) -> None:
+    for summary_size in (200, 5000, 50000):
+        summary = _make_html_summary(summary_size, rng)
+        raw_entry = {
+            "id": "https://example.com/posts/1",
+            "title": CJK_TEXT[:30],
+            "link": "https://example.com/posts/1",
+            "summary": summary,
+            "content": [{"value": summary}],
+        }
+        runner.bench("extract_entry", {"summary_bytes": summary_size}, lambda: feed_parser.extract_entry(raw_entry))
+
+    entry = _make_entry(1, _make_html_summary(5000, rng))
+    runner.bench("entry_identity_key", {}, lambda: data_manager.make_entry_key(entry.identity))
+    runner.bench(
+        "_build_entry_message",
+        {"title": "cjk"},
+        lambda: feed_checker._build_entry_message(f"{CJK_TEXT[:12]} & <Feed>", entry),
+    )
+
+
+def bench_keywords(runner: BenchmarkRunner, rng: random.Random) -> None:
+    for summary_size in (500, 20000):
+        entry = _make_entry(2, _make_html_summary(summary_size, rng))
+        for count in KEYWORD_COUNTS:
+            keywords = _make_keywords(count, rng)
+            feed_checker._matches_keywords(entry, keywords)
+            runner.bench(
+                "_matches_keywords",
+                {"keywords": count, "summary_bytes": summary_size},
+                lambda: feed_checker._matches_keywords(entry, keywords),
+            )
+
+    # 关键词都不命中时两种策略都要扫描全文，用于确定 AHO_CORASICK_MIN_KEYWORDS。
+    for summary_size in (500, 20000):
+        text = _make_html_summary(summary_size, rng).lower()
+        for count in MATCHER_KEYWORD_COUNTS:
+            keywords = keyword_filter.normalize_keywords(_make_keywords(count, rng)[:-1] + ["不会命中"])
+            automaton = keyword_filter._AhoCorasickAutomaton(keywords)
+            params = {"keywords": count, "summary_bytes": summary_size}
+            runner.bench(
+                "keyword_scan_naive",
+                params,
+                lambda: any(keyword in text for keyword in keywords),
+            )
+            runner.bench("keyword_scan_aho_corasick", params, lambda: automaton.search(text))
+
+    for count in KEYWORD_COUNTS:
+        keywords = _make_keywords(count, rng)
+
+        def compile_uncached() -> None:
+            keyword_filter._compile_normalized.cache_clear()
+            keyword_filter.compile_keywords(keywords)
+
+        runner.bench("compile_keywords_uncached", {"keywords": count}, compile_uncached)
+
+
+def bench_send_footer(runner: BenchmarkRunner, rng: random.Random) -> None:
+    entry = _make_entry(3, _make_html_summary(500, rng))
+    text = feed_checker._build_entry_message("Feed", entry)
+
+    async def send_message(**kwargs: Any) -> None:
+        return None
+
+    context = SimpleNamespace(bot=SimpleNamespace(send_message=send_message), bot_data={})
+    previous_sender = sender.get_sender()
+    previous_subscriptions = data_manager.subscriptions_data
+    sender.set_sender(None)
+    try:
+        for footer in (None, f"{CJK_TEXT} <footer> & more"):
+            data_manager.subscriptions_data = {
+                "1": {"rss_feeds": {}, "custom_footer": footer, "link_preview_enabled": True}
+            }
+            runner.bench_async(
+                "send_telegram_message",
+                {"footer": footer is not None},
+                lambda: feed_checker.send_telegram_message(context, "1", text),
+                number=20000,
+            )
+    finally:
+        sender.set_sender(previous_sender)
+        data_manager.subscriptions_data = previous_subscriptions
+
+
+def bench_persistence(runner: BenchmarkRunner, rng: random.Random, file_sizes: List[int]) -> None:
+    previous_subscriptions = data_manager.subscriptions_data
+    try:
+        for target_bytes in file_sizes:
+            subscriptions = _make_subscriptions(target_bytes, rng)
+            for backend, file_name in (("json", "subscriptions.json"), ("sqlite", "subscriptions.db")):
+                with tempfile.TemporaryDirectory() as data_dir:
+                    data_file = os.path.join(data_dir, file_name)
+                    data_manager.subscriptions_data = subscriptions
+                    data_manager._clear_dirty_marks()
+                    params = {"backend": backend, "target_bytes": target_bytes}
+
+                    runner.bench_once("save_subscriptions", params, lambda: data_manager.save_subscriptions(data_file))
+                    params = dict(params, file_bytes=_get_storage_bytes(data_file))
+                    runner.bench_once("load_subscriptions", params, lambda: data_manager.load_subscriptions(data_file))
+
+                    # 检查周期中的典型写入：只有一个订阅源的已读标记发生变化。
+                    chat_id = next(iter(data_manager.subscriptions_data))
+                    feed_url = next(iter(data_manager.subscriptions_data[chat_id]["rss_feeds"]))
+
+                    def save_one_dirty_feed() -> None:
+                        data_manager.mark_feed_dirty(chat_id, feed_url)
+                        data_manager.save_subscriptions(data_file)
+
+                    runner.bench_once("save_subscriptions_one_dirty_feed", params, save_one_dirty_feed)
+                    data_manager.close_storage()
+    finally:
+        data_manager.subscriptions_data = previous_subscriptions
+        data_manager.feed_states = {}
+        data_manager.outbox = {}
+        data_manager._clear_dirty_marks()
+
+
+def _get_git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _result_key(result: Dict[str, Any]) -> str:
+    params = {key: value for key, value in result["params"].items() if key != "file_bytes"}
+    return f"{result['name']} {json.dumps(params, sort_keys=True, ensure_ascii=False)}"
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[Dict[str, Any]]:
+    baseline_results = {_result_key(result): result for result in baseline.get("results", [])}
+    comparison = []
+    for result in current["results"]:
+        previous = baseline_results.get(_result_key(result))
+        if previous is None or not previous["seconds_per_op"]:
+            continue
+        ratio = result["seconds_per_op"] / previous["seconds_per_op"]
+        comparison.append({"benchmark": _result_key(result), "ratio": ratio})
+        print(f"{_result_key(result):<72} {ratio:>6.2f}x")
+    return comparison
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="把 JSON 结果写入此文件")
+    parser.add_argument("--compare", help="与之前的 JSON 结果比较，输出耗时比值（>1 表示变慢）")
+    parser.add_argument("--full", action="store_true", help="包含 100 MB 的订阅文件")
+    parser.add_argument("--repeat", type=int, default=5, help="每项测量的重复次数")
+    parser.add_argument("--min-seconds", type=float, default=0.2, help="每次测量的最短耗时（秒）")
+    parser.add_argument("--only", choices=("entries", "keywords", "send", "persistence"), action="append")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    options = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    rng = random.Random(options.seed)
+    runner = BenchmarkRunner(options.repeat, options.min_seconds)
+    groups = options.only or ["entries", "keywords", "send", "persistence"]
+
+    if "entries" in groups:
+        bench_entries(runner, rng)
+    if "keywords" in groups:
+        bench_keywords(runner, rng)
+    if "send" in groups:
+        bench_send_footer(runner, rng)
+    if "persistence" in groups:
+        bench_persistence(runner, rng, list(FULL_FILE_SIZES if options.full else DEFAULT_FILE_SIZES))
+
+    report: Dict[str, Any] = {
+        "metadata": {
+            "commit": _get_git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "repeat": options.repeat,
+            "seed": options.seed,
+        },
+        "results": runner.results,
+    }
+    if options.compare:
+        with open(options.compare, "r", encoding="utf-8") as f:
+            report["comparison"] = compare_results(json.load(f), report)
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,17 @@
 import logging
+import os
 from typing import Any, Dict
 from telegram.ext import Application, CommandHandler, ContextTypes
 import config
 import data_manager
 import feed_checker
+import feed_parser
+import fetcher
 import handlers
+import metrics
+import polling
+import profiler
+import sender
 
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -12,12 +19,44 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+TITLE_REFRESH_INTERVAL_SECONDS = 3600
+
 
 async def check_feeds_job_wrapper(context: ContextTypes.DEFAULT_TYPE) -> None:
     data_file = context.bot_data.get('data_file', 'data/subscriptions.json')
     await feed_checker.check_feeds_job(context, data_file)
 
 
+async def on_startup(application: Application) -> None:
+    message_sender = sender.create_sender(application.bot, application.bot_data.get('config', {}))
+    message_sender.start()
+    sender.set_sender(message_sender)
+
+    metrics_address = application.bot_data.get('metrics_address')
+    if metrics_address:
+        await metrics.start_metrics_server(*metrics_address)
+
+    # 信号处理器必须在事件循环中注册，因此放在启动回调而不是 main() 里。
+    data_file = application.bot_data.get('data_file', 'data/subscriptions.json')
+    profiler.install_signal_handler(os.path.dirname(data_file) or config.DATA_DIR)
+
+
+async def on_shutdown(application: Application) -> None:
+    profiler.remove_signal_handler()
+    await metrics.stop_metrics_server()
+    await feed_checker.close_delivery()
+    await sender.close_sender()
+    await data_manager.flush(application.bot_data.get('data_file', 'data/subscriptions.json'))
+    await fetcher.close_fetcher()
+    feed_parser.close_parse_pool()
+    data_manager.close_storage()
+
+
+async def refresh_titles_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    data_file = context.bot_data.get('data_file', 'data/subscriptions.json')
+    await data_manager.refresh_pending_titles(data_file)
+
+
 def _register_handlers(application: Application) -> None:
     handlers_map = {
         "start": handlers.start,
@@ -29,15 +68,21 @@ def _register_handlers(application: Application) -> None:
         "removekeyword": handlers.remove_keyword,
         "listkeywords": handlers.list_keywords,
         "removeallkeywords": handlers.remove_all_keywords,
+        "setfilter": handlers.set_filter,
+        "clearfilter": handlers.clear_filter,
         "setfooter": handlers.set_custom_footer,
         "togglepreview": handlers.toggle_link_preview,
+        "digest": handlers.set_digest_mode,
+        "brokenfeeds": handlers.list_broken_feeds,
+        "profile": handlers.profile_check_cycles,
     }
     
     for command, handler in handlers_map.items():
         application.add_handler(CommandHandler(command, handler))
 
 
-def _setup_job_queue(application: Application, check_interval: int) -> bool:
+def _setup_job_queue(application: Application, cfg: Dict[str, Any]) -> bool:
+    check_interval = cfg.get("check_interval_seconds", 300)
     if not isinstance(check_interval, int) or check_interval <= 0:
         logger.warning(f"无效的 check_interval_seconds: {check_interval}。默认为 300 秒。")
         check_interval = 300
@@ -47,13 +92,26 @@ def _setup_job_queue(application: Application, check_interval: int) -> bool:
         logger.error("JobQueue 未初始化，请安装 `python-telegram-bot[job-queue]` 依赖。")
         return False
 
+    bounds = polling.get_polling_bounds(cfg)
+    tick_interval = min(check_interval, bounds["min"])
+
+    # 检查耗时超过调度周期时，错过的调度合并为一次，不叠加执行。
     job_queue.run_repeating(
         check_feeds_job_wrapper,
-        interval=check_interval,
-        first=10
+        interval=tick_interval,
+        first=10,
+        job_kwargs={"max_instances": 1, "coalesce": True}
+    )
+    job_queue.run_repeating(
+        refresh_titles_job,
+        interval=TITLE_REFRESH_INTERVAL_SECONDS,
+        first=5
     )
     
-    logger.info(f"订阅源检查间隔: {check_interval} 秒")
+    logger.info(
+        f"订阅源默认检查间隔: {bounds['default']} 秒 (自适应范围 {bounds['min']}-{bounds['max']} 秒)，"
+        f"调度周期: {tick_interval} 秒"
+    )
     return True
 
 
@@ -64,6 +122,9 @@ def main() -> None:
         return
 
     data_file = cfg.get('data_file', 'data/subscriptions.json')
+    data_manager.configure_persistence(
+        cfg.get("save_delay_seconds", data_manager.DEFAULT_SAVE_DELAY_SECONDS)
+    )
     data_manager.load_subscriptions(data_file)
 
     telegram_token = cfg.get("telegram_token")
@@ -71,14 +132,26 @@ def main() -> None:
         logger.error("配置中缺少 Telegram token，无法启动机器人。")
         return
 
-    application = Application.builder().token(telegram_token).build()
+    fetcher.set_fetcher(fetcher.create_fetcher(cfg))
+    parse_pool = feed_parser.create_parse_pool(cfg)
+    feed_parser.warm_up_parse_pool(parse_pool)
+    feed_parser.set_parse_pool(parse_pool)
+
+    application = (
+        Application.builder()
+        .token(telegram_token)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
     application.bot_data['data_file'] = data_file
+    application.bot_data['config'] = cfg
+    application.bot_data['metrics_address'] = metrics.get_metrics_address(cfg)
 
     _register_handlers(application)
 
-    check_interval = cfg.get("check_interval_seconds", 300)
-    if not _setup_job_queue(application, check_interval):
-        return
+    if not _setup_job_queue(application, cfg):
+        return
 
     logger.info("机器人启动中...")
     application.run_polling()
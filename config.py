@@ -7,6 +7,8 @@ logger = logging.getLogger(__name__)
 
 CONFIG_FILE = 'config.json'
 DATA_DIR = 'data'
+STORAGE_BACKENDS = {'sqlite': '.db', 'json': '.json'}
+DEFAULT_STORAGE_BACKEND = 'sqlite'
 
 
 def load_config() -> Optional[Dict[str, Any]]:
@@ -35,6 +37,18 @@ def load_config() -> Optional[Dict[str, Any]]:
             )
             data_file_name = os.path.basename(data_file_name)
 
+        storage_backend = str(config.get("storage_backend", DEFAULT_STORAGE_BACKEND)).lower()
+        if storage_backend not in STORAGE_BACKENDS:
+            logger.warning(
+                f"未知的 storage_backend: {storage_backend}。默认为 {DEFAULT_STORAGE_BACKEND}。"
+            )
+            storage_backend = DEFAULT_STORAGE_BACKEND
+        config['storage_backend'] = storage_backend
+
+        # SQLite 后端首次启动时会自动从同名的 JSON 文件迁移数据。
+        data_file_root = os.path.splitext(data_file_name)[0]
+        data_file_name = f"{data_file_root}{STORAGE_BACKENDS[storage_backend]}"
+
         data_file = os.path.join(DATA_DIR, data_file_name)
         config['data_file'] = data_file
         logger.info(f"数据将存储在: {data_file}")
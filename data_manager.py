@@ -1,26 +1,115 @@
+import asyncio
+import hashlib
 import json
 import logging
-import os
-from typing import Any, Dict, Optional
+import time
+from collections import deque
+from typing import AbstractSet, Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
 
 import feedparser
 
-logger = logging.getLogger(__name__)
+import digest
+import fetcher
+import metrics
+import storage
 
-subscriptions_data: Dict[str, Dict[str, Any]] = {}
+logger = logging.getLogger(__name__)
 
+UNKNOWN_FEED_TITLE = "未知标题"
+DEFAULT_TITLE_FETCH_CONCURRENCY = 10
+# 每次检查最多保留的条目数。已读集合必须明显大于它：仍在订阅源中的条目一旦被挤出已读集合就会被重复推送。
+MAX_FEED_ENTRIES = 200
+SEEN_ENTRIES_LIMIT = 2 * MAX_FEED_ENTRIES
+MAX_FEED_ERROR_CHARS = 300
 
-def get_feed_title(feed_url: str) -> Optional[str]:
+subscriptions_data: Dict[str, Dict[str, Any]] = {}
+feed_states: Dict[str, Dict[str, Any]] = {}
+outbox: Dict[str, Dict[str, Any]] = {}
+
+_storages: Dict[str, Any] = {}
+_dirty_chats: Set[str] = set()
+_dirty_feeds: Set[Tuple[str, str]] = set()
+_dirty_feed_states: Set[str] = set()
+_dirty_outbox: Set[str] = set()
+_pending_titles: Dict[str, Set[str]] = {}
+_seen_entries_cache: Dict[Tuple[str, str], Tuple[List[str], "SeenEntries"]] = {}
+# 订阅数据只按聊天组织，以下二级索引由 add_subscription/remove_subscription 增量维护。
+# 订阅源地址 -> 订阅它的聊天（字典保持插入顺序，值恒为 None）
+_feed_subscribers: Dict[str, Dict[str, None]] = {}
+# 聊天 -> 按添加顺序排列的订阅源地址，对应 /list 中的编号
+_chat_feed_urls: Dict[str, List[str]] = {}
+_indexed_subscriptions: Optional[Dict[str, Dict[str, Any]]] = None
+_indexes_valid = False
+
+DEFAULT_SAVE_DELAY_SECONDS = 2.0
+_save_delay_seconds = DEFAULT_SAVE_DELAY_SECONDS
+_save_handle: Optional[asyncio.TimerHandle] = None
+_save_handle_loop: Optional[asyncio.AbstractEventLoop] = None
+_flush_lock: Optional[asyncio.Lock] = None
+
+
+async def fetch_feed_title(feed_url: str) -> Optional[str]:
     try:
-        feed = feedparser.parse(feed_url)
-        if feed.feed and feed.feed.title:
-            return feed.feed.title
+        fetch_result = await fetcher.get_fetcher().fetch(feed_url)
+        feed = await asyncio.to_thread(
+            feedparser.parse,
+            fetch_result.content,
+            response_headers={"content-location": fetch_result.url, **fetch_result.headers},
+        )
+        if feed.feed and feed.feed.get("title"):
+            return str(feed.feed.title)
         logger.warning(f"无法获取订阅源标题: {feed_url}")
     except Exception as e:
         logger.error(f"获取订阅源 {feed_url} 标题时出错: {e}")
     return None
 
 
+def mark_title_pending(chat_id: str, feed_url: str) -> None:
+    _pending_titles.setdefault(feed_url, set()).add(chat_id)
+
+
+def get_pending_title_urls() -> List[str]:
+    return list(_pending_titles)
+
+
+async def refresh_pending_titles(
+    data_file: str,
+    concurrency: int = DEFAULT_TITLE_FETCH_CONCURRENCY
+) -> int:
+    if not _pending_titles:
+        return 0
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def refresh(feed_url: str) -> int:
+        async with semaphore:
+            title = await fetch_feed_title(feed_url)
+        if not title:
+            return 0
+
+        updated = 0
+        for chat_id in _pending_titles.pop(feed_url, set()):
+            feed_data = subscriptions_data.get(chat_id, {}).get("rss_feeds", {}).get(feed_url)
+            if feed_data is not None and feed_data.get("title") in (None, "", UNKNOWN_FEED_TITLE):
+                feed_data["title"] = title
+                mark_feed_dirty(chat_id, feed_url)
+                updated += 1
+        return updated
+
+    feed_urls = get_pending_title_urls()
+    logger.info("正在后台获取 %s 个订阅源的标题。", len(feed_urls))
+    updated_count = sum(await asyncio.gather(*(refresh(feed_url) for feed_url in feed_urls)))
+
+    if updated_count:
+        request_save(data_file)
+    logger.info(
+        "已补全 %s 个订阅的标题，仍有 %s 个订阅源标题待获取。",
+        updated_count,
+        len(_pending_titles),
+    )
+    return updated_count
+
+
 def _ensure_feed_data_structure(feed_data: Any, feed_url: str) -> Dict[str, Any]:
     normalized_feed_data = dict(feed_data) if isinstance(feed_data, dict) else {}
 
@@ -34,13 +123,22 @@ def _ensure_feed_data_structure(feed_data: Any, feed_url: str) -> Dict[str, Any]
         if str(keyword).strip()
     ]
 
+    raw_filter = normalized_feed_data.get("filter")
+    filter_text = str(raw_filter).strip() if raw_filter else ""
+    normalized_feed_data["filter"] = filter_text or None
+
+    raw_seen_entries = normalized_feed_data.get("seen_entries", [])
+    if not isinstance(raw_seen_entries, list):
+        raw_seen_entries = []
+    normalized_feed_data["seen_entries"] = [str(key) for key in raw_seen_entries if key][-SEEN_ENTRIES_LIMIT:]
+
     if "last_entry_id" not in normalized_feed_data:
         normalized_feed_data["last_entry_id"] = None
     elif normalized_feed_data["last_entry_id"] is not None:
         normalized_feed_data["last_entry_id"] = str(normalized_feed_data["last_entry_id"])
 
     if "title" not in normalized_feed_data or not normalized_feed_data["title"]:
-        normalized_feed_data["title"] = get_feed_title(feed_url) or "未知标题"
+        normalized_feed_data["title"] = UNKNOWN_FEED_TITLE
     else:
         normalized_feed_data["title"] = str(normalized_feed_data["title"])
 
@@ -87,20 +185,165 @@ def _ensure_user_data_structure(user_config: Any) -> Dict[str, Any]:
         normalized_user_config.get("link_preview_enabled", True)
     )
 
+    if "digest_mode" in normalized_user_config:
+        normalized_user_config["digest_mode"] = digest.normalize_digest_mode(
+            normalized_user_config["digest_mode"]
+        )
+    if "digest_interval_minutes" in normalized_user_config:
+        normalized_user_config["digest_interval_minutes"] = digest.normalize_digest_interval(
+            normalized_user_config["digest_interval_minutes"]
+        )
+    if "digest_pending" in normalized_user_config:
+        pending = normalized_user_config["digest_pending"]
+        normalized_user_config["digest_pending"] = [
+            item for item in pending
+            if isinstance(item, dict) and isinstance(item.get("line"), str)
+        ] if isinstance(pending, list) else []
+
     return normalized_user_config
 
 
+def _get_storage(data_file: str) -> Any:
+    storage_backend = _storages.get(data_file)
+    if storage_backend is None:
+        storage_backend = storage.create_storage(data_file)
+        _storages[data_file] = storage_backend
+    return storage_backend
+
+
+def close_storage() -> None:
+    for storage_backend in _storages.values():
+        try:
+            storage_backend.close()
+        except Exception as e:
+            logger.warning(f"关闭存储 {storage_backend.data_file} 时出错: {e}")
+    _storages.clear()
+
+
+class SeenEntries:
+    __slots__ = ("_order", "_members")
+
+    def __init__(self, keys: Iterable[str] = (), limit: int = SEEN_ENTRIES_LIMIT) -> None:
+        self._order: Deque[str] = deque(maxlen=limit)
+        self._members: Set[str] = set()
+        for key in keys:
+            self.add(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._members
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def add(self, key: str) -> bool:
+        if key in self._members:
+            return False
+        if len(self._order) == self._order.maxlen:
+            self._members.discard(self._order[0])
+        self._order.append(key)
+        self._members.add(key)
+        return True
+
+    def to_list(self) -> List[str]:
+        return list(self._order)
+
+
+def make_entry_key(entry_identity: str) -> str:
+    return hashlib.blake2b(entry_identity.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def get_seen_entries(chat_id: str, feed_url: str) -> SeenEntries:
+    feed_data = subscriptions_data.get(chat_id, {}).get("rss_feeds", {}).get(feed_url, {})
+    stored_keys = feed_data.get("seen_entries")
+    cached = _seen_entries_cache.get((chat_id, feed_url))
+    # 订阅数据中的列表对象被替换（重新加载、删除后重新添加等）时缓存失效。
+    if cached is not None and stored_keys is not None and cached[0] is stored_keys:
+        return cached[1]
+
+    seen_entries = SeenEntries(stored_keys or ())
+    if stored_keys is not None:
+        _seen_entries_cache[(chat_id, feed_url)] = (stored_keys, seen_entries)
+    return seen_entries
+
+
+def mark_entries_seen(chat_id: str, feed_url: str, keys: Iterable[str]) -> None:
+    # keys 须按从旧到新的顺序传入：已读集合满时先淘汰最早加入的键。
+    feed_data = subscriptions_data.get(chat_id, {}).get("rss_feeds", {}).get(feed_url)
+    if feed_data is None:
+        return
+
+    seen_entries = get_seen_entries(chat_id, feed_url)
+    changed = False
+    for key in keys:
+        changed = seen_entries.add(key) or changed
+    if not changed:
+        return
+
+    stored_keys = seen_entries.to_list()
+    feed_data["seen_entries"] = stored_keys
+    _seen_entries_cache[(chat_id, feed_url)] = (stored_keys, seen_entries)
+    mark_feed_dirty(chat_id, feed_url)
+
+
+def is_feed_initialized(feed_data: Dict[str, Any]) -> bool:
+    # 首次检查后才有判断新条目的基线；旧数据没有 initialized 标记时以游标或已读条目判断。
+    return bool(feed_data.get("initialized") or feed_data.get("last_entry_id") or feed_data.get("seen_entries"))
+
+
+def mark_feed_initialized(chat_id: str, feed_url: str) -> None:
+    feed_data = subscriptions_data.get(chat_id, {}).get("rss_feeds", {}).get(feed_url)
+    if feed_data is None or feed_data.get("initialized"):
+        return
+    feed_data["initialized"] = True
+    mark_feed_dirty(chat_id, feed_url)
+
+
+def add_digest_entry(chat_id: str, feed_url: str, feed_title: str, line: str) -> None:
+    user_config = subscriptions_data.get(chat_id)
+    if user_config is None:
+        return
+
+    pending = user_config.setdefault("digest_pending", [])
+    pending.append({"feed_url": feed_url, "feed_title": feed_title, "line": line})
+    overflow = len(pending) - digest.MAX_PENDING_DIGEST_ENTRIES
+    if overflow > 0:
+        del pending[:overflow]
+        logger.warning(
+            "用户 %s 的待发摘要超过 %s 条，已丢弃最旧的 %s 条。",
+            chat_id,
+            digest.MAX_PENDING_DIGEST_ENTRIES,
+            overflow,
+        )
+    mark_chat_dirty(chat_id)
+
+
+def _clear_pending_titles() -> None:
+    _pending_titles.clear()
+
+
+def _clear_dirty_marks() -> None:
+    _dirty_chats.clear()
+    _dirty_feeds.clear()
+    _dirty_feed_states.clear()
+    _dirty_outbox.clear()
+
+
 def load_subscriptions(data_file: str) -> Dict[str, Dict[str, Any]]:
     global subscriptions_data
 
-    if not os.path.exists(data_file):
+    _clear_dirty_marks()
+    _clear_pending_titles()
+    _seen_entries_cache.clear()
+    invalidate_indexes()
+    storage_backend = _get_storage(data_file)
+
+    if not storage_backend.exists():
         logger.info(f"未找到 {data_file}，初始化为空订阅。")
         subscriptions_data = {}
         return subscriptions_data
 
     try:
-        with open(data_file, "r", encoding="utf-8") as f:
-            loaded_data = json.load(f)
+        loaded_data = storage_backend.load_subscriptions()
     except json.JSONDecodeError as e:
         logger.error(f"解析 {data_file} 出错: {e}。初始化为空订阅。")
         subscriptions_data = {}
@@ -122,37 +365,436 @@ def load_subscriptions(data_file: str) -> Dict[str, Dict[str, Any]]:
             logger.warning("聊天 %s 的订阅数据结构无效，已跳过。", chat_id)
             continue
         normalized_data[chat_id] = _ensure_user_data_structure(user_config)
+        for feed_url, feed_data in normalized_data[chat_id]["rss_feeds"].items():
+            if feed_data["title"] == UNKNOWN_FEED_TITLE:
+                mark_title_pending(chat_id, feed_url)
 
     subscriptions_data = normalized_data
+    load_feed_states(data_file)
+    load_outbox(data_file)
     logger.info(f"订阅已成功从 {data_file} 加载")
     return subscriptions_data
 
 
+def mark_chat_dirty(chat_id: str) -> None:
+    _dirty_chats.add(chat_id)
+
+
+def mark_feed_dirty(chat_id: str, feed_url: str) -> None:
+    _dirty_feeds.add((chat_id, feed_url))
+
+
+def mark_feed_state_dirty(feed_url: str) -> None:
+    _dirty_feed_states.add(feed_url)
+
+
+def mark_outbox_dirty(message_key: str) -> None:
+    _dirty_outbox.add(message_key)
+
+
+def _copy_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _copy_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy_value(item) for item in value]
+    return value
+
+
+def _snapshot_subscriptions(
+    storage_backend: Any,
+    dirty_chats: Set[str],
+    dirty_feeds: Set[Tuple[str, str]]
+) -> Dict[str, Dict[str, Any]]:
+    if not storage_backend.incremental:
+        return _copy_value(subscriptions_data)
+
+    snapshot: Dict[str, Dict[str, Any]] = {}
+    for chat_id in dirty_chats | {chat_id for chat_id, _ in dirty_feeds}:
+        user_config = subscriptions_data.get(chat_id)
+        if user_config is None:
+            continue
+        snapshot[chat_id] = {
+            key: _copy_value(value)
+            for key, value in user_config.items()
+            if key != "rss_feeds"
+        }
+        snapshot[chat_id]["rss_feeds"] = {}
+
+    for chat_id, feed_url in dirty_feeds:
+        feed_data = subscriptions_data.get(chat_id, {}).get("rss_feeds", {}).get(feed_url)
+        if feed_data is not None:
+            snapshot[chat_id]["rss_feeds"][feed_url] = _copy_value(feed_data)
+    return snapshot
+
+
+def _snapshot_feed_states(storage_backend: Any, dirty_urls: Set[str]) -> Dict[str, Dict[str, Any]]:
+    if not storage_backend.incremental:
+        return _copy_value(feed_states)
+    return {
+        feed_url: dict(feed_states[feed_url])
+        for feed_url in dirty_urls
+        if feed_url in feed_states
+    }
+
+
+def _snapshot_outbox(storage_backend: Any, dirty_keys: Set[str]) -> Dict[str, Dict[str, Any]]:
+    if not storage_backend.incremental:
+        return _copy_value(outbox)
+    return {
+        message_key: dict(message)
+        for message_key, message in outbox.items()
+        if message_key in dirty_keys
+    }
+
+
+def _take_pending_writes(data_file: str, full: bool = False) -> Optional[Callable[[], None]]:
+    # 在事件循环线程中取走脏标记并复制变更数据，返回的写入函数可在线程池中执行。
+    if not (full or _dirty_chats or _dirty_feeds or _dirty_feed_states or _dirty_outbox):
+        return None
+
+    storage_backend = _get_storage(data_file)
+    dirty_chats = set(_dirty_chats)
+    dirty_feeds = set(_dirty_feeds)
+    dirty_urls = set(_dirty_feed_states)
+    dirty_keys = set(_dirty_outbox)
+    _clear_dirty_marks()
+
+    subscriptions_snapshot = None
+    if full:
+        subscriptions_snapshot = _copy_value(subscriptions_data)
+    elif dirty_chats or dirty_feeds:
+        subscriptions_snapshot = _snapshot_subscriptions(storage_backend, dirty_chats, dirty_feeds)
+    states_snapshot = None
+    if dirty_urls:
+        states_snapshot = _snapshot_feed_states(storage_backend, dirty_urls)
+    outbox_snapshot = None
+    if dirty_keys:
+        outbox_snapshot = _snapshot_outbox(storage_backend, dirty_keys)
+
+    def write() -> None:
+        started_at = time.perf_counter()
+        try:
+            # 先写发件箱再写已读标记：两者之间崩溃时，重新入队会因幂等键相同而被忽略。
+            if outbox_snapshot is not None:
+                storage_backend.save_outbox(outbox_snapshot, dirty_keys)
+            if subscriptions_snapshot is not None:
+                storage_backend.save_subscriptions(
+                    subscriptions_snapshot,
+                    None if full else dirty_chats,
+                    None if full else dirty_feeds,
+                )
+            if states_snapshot is not None:
+                storage_backend.save_feed_states(states_snapshot, dirty_urls)
+        except Exception:
+            _dirty_chats.update(dirty_chats)
+            _dirty_feeds.update(dirty_feeds)
+            _dirty_feed_states.update(dirty_urls)
+            _dirty_outbox.update(dirty_keys)
+            raise
+        finally:
+            metrics.SAVE_SECONDS.observe(time.perf_counter() - started_at)
+
+    return write
+
+
 def save_subscriptions(data_file: str) -> None:
     global subscriptions_data
 
-    temp_file = f"{data_file}.tmp"
+    try:
+        # 调用方未标记任何变更时退回整体保存，保证不会丢失修改。
+        write = _take_pending_writes(data_file, full=not (_dirty_chats or _dirty_feeds))
+        if write is not None:
+            write()
+        logger.debug(f"订阅已成功保存到 {data_file}")
+    except Exception as e:
+        logger.error(f"保存订阅到 {data_file} 时出错: {e}")
+
+
+def configure_persistence(save_delay_seconds: Any) -> None:
+    global _save_delay_seconds
 
     try:
-        data_dir = os.path.dirname(data_file)
-        if data_dir:
-            os.makedirs(data_dir, exist_ok=True)
+        delay = float(save_delay_seconds)
+    except (TypeError, ValueError):
+        delay = -1
+    if delay < 0:
+        logger.warning(f"无效的 save_delay_seconds: {save_delay_seconds}。默认为 {DEFAULT_SAVE_DELAY_SECONDS} 秒。")
+        delay = DEFAULT_SAVE_DELAY_SECONDS
+    _save_delay_seconds = delay
 
-        with open(temp_file, "w", encoding="utf-8") as f:
-            json.dump(subscriptions_data, f, indent=4, ensure_ascii=False)
-            f.flush()
-            os.fsync(f.fileno())
 
-        os.replace(temp_file, data_file)
-        logger.debug(f"订阅已成功保存到 {data_file}")
+def request_save(data_file: str) -> None:
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        save_subscriptions(data_file)
+        return
+
+    if _save_handle is not None and not _save_handle.cancelled() and _save_handle_loop is loop:
+        return
+
+    def start_flush() -> None:
+        _set_save_handle(None)
+        loop.create_task(flush(data_file))
+
+    _set_save_handle(loop.call_later(_save_delay_seconds, start_flush), loop)
+
+
+def _set_save_handle(handle: Optional[asyncio.TimerHandle], loop: Any = None) -> None:
+    global _save_handle, _save_handle_loop
+    _save_handle = handle
+    _save_handle_loop = loop
+
+
+async def flush(data_file: str) -> None:
+    global _flush_lock
+
+    if _save_handle is not None:
+        _save_handle.cancel()
+        _set_save_handle(None)
+
+    if _flush_lock is None:
+        _flush_lock = asyncio.Lock()
+
+    async with _flush_lock:
+        write = _take_pending_writes(data_file)
+        if write is None:
+            return
+        try:
+            await asyncio.to_thread(write)
+            logger.debug(f"订阅变更已批量写入 {data_file}")
+        except Exception as e:
+            logger.error(f"批量保存订阅到 {data_file} 时出错: {e}")
+
+
+def _normalize_feed_state(state: Any) -> Dict[str, Any]:
+    normalized_state = dict(state) if isinstance(state, dict) else {}
+    for key in ("etag", "modified"):
+        value = normalized_state.get(key)
+        normalized_state[key] = str(value) if value else None
+    for key in ("interval_seconds", "next_check_at", "last_success_at", "last_failure_at"):
+        value = normalized_state.get(key)
+        if value is not None and not isinstance(value, (int, float)):
+            normalized_state.pop(key)
+    if not isinstance(normalized_state.get("failure_count", 0), int):
+        normalized_state.pop("failure_count")
+    return normalized_state
+
+
+def load_feed_states(data_file: str) -> Dict[str, Dict[str, Any]]:
+    global feed_states
+
+    feed_states = {}
+    try:
+        loaded_states = _get_storage(data_file).load_feed_states()
     except Exception as e:
-        if os.path.exists(temp_file):
-            try:
-                os.remove(temp_file)
-            except OSError:
-                logger.warning("清理临时订阅文件失败: %s", temp_file)
-        logger.error(f"保存订阅到 {data_file} 时出错: {e}")
+        logger.warning(f"读取 {data_file} 的订阅源状态出错: {e}。将重新获取。")
+        return feed_states
+
+    if isinstance(loaded_states, dict):
+        subscribed_urls = {
+            feed_url
+            for user_data in subscriptions_data.values()
+            for feed_url in user_data.get("rss_feeds", {})
+        }
+        for feed_url, state in loaded_states.items():
+            if feed_url in subscribed_urls:
+                feed_states[str(feed_url)] = _normalize_feed_state(state)
+            else:
+                mark_feed_state_dirty(str(feed_url))
+    return feed_states
+
+
+def load_outbox(data_file: str) -> Dict[str, Dict[str, Any]]:
+    global outbox
+
+    outbox = {}
+    try:
+        loaded_outbox = _get_storage(data_file).load_outbox()
+    except Exception as e:
+        logger.error(f"读取 {data_file} 的待发消息出错: {e}")
+        return outbox
+
+    if isinstance(loaded_outbox, dict):
+        for message_key, message in loaded_outbox.items():
+            if isinstance(message, dict) and message.get("chat_id") and isinstance(message.get("text"), str):
+                outbox[str(message_key)] = message
+            else:
+                mark_outbox_dirty(str(message_key))
+
+    if outbox:
+        logger.info("从 %s 恢复了 %s 条待发送消息。", data_file, len(outbox))
+    return outbox
+
+
+def enqueue_message(message_key: str, chat_id: str, text: str, feed_url: Optional[str] = None) -> bool:
+    if message_key in outbox:
+        return False
+
+    outbox[message_key] = {
+        "chat_id": chat_id,
+        "text": text,
+        "created_at": time.time(),
+        "attempts": 0,
+    }
+    if feed_url is not None:
+        # 记录来源订阅源，取消订阅时据此清理尚未投递的消息。
+        outbox[message_key]["feed_url"] = feed_url
+    mark_outbox_dirty(message_key)
+    return True
+
+
+def acknowledge_message(message_key: str) -> None:
+    if outbox.pop(message_key, None) is not None:
+        mark_outbox_dirty(message_key)
+
+
+def get_outbox() -> Dict[str, Dict[str, Any]]:
+    return outbox
+
+
+def get_feed_state(feed_url: str) -> Dict[str, Any]:
+    return feed_states.setdefault(feed_url, _normalize_feed_state(None))
+
+
+def record_feed_failure(feed_url: str, error: str, now: Optional[float] = None) -> int:
+    feed_state = get_feed_state(feed_url)
+    feed_state["failure_count"] = feed_state.get("failure_count", 0) + 1
+    feed_state["last_error"] = error[:MAX_FEED_ERROR_CHARS]
+    feed_state["last_failure_at"] = time.time() if now is None else now
+    mark_feed_state_dirty(feed_url)
+    return feed_state["failure_count"]
+
+
+def record_feed_success(feed_url: str, now: Optional[float] = None) -> int:
+    # 返回成功前的连续失败次数，调用方据此判断订阅源是否刚刚恢复。
+    feed_state = get_feed_state(feed_url)
+    previous_failures = feed_state.pop("failure_count", 0)
+    feed_state["last_success_at"] = time.time() if now is None else now
+    mark_feed_state_dirty(feed_url)
+    return previous_failures
+
+
+def get_failing_feeds(chat_id: str) -> List[Tuple[str, Dict[str, Any], Dict[str, Any]]]:
+    feeds = subscriptions_data.get(chat_id, {}).get("rss_feeds", {})
+    failing = []
+    for feed_url, feed_config in feeds.items():
+        feed_state = feed_states.get(feed_url)
+        if feed_state and feed_state.get("failure_count"):
+            failing.append((feed_url, feed_config, feed_state))
+    return failing
 
 
 def get_subscriptions() -> Dict[str, Dict[str, Any]]:
     return subscriptions_data
+
+
+def _rebuild_indexes() -> None:
+    global _indexed_subscriptions, _indexes_valid
+    _feed_subscribers.clear()
+    _chat_feed_urls.clear()
+    for chat_id, user_config in subscriptions_data.items():
+        feed_urls = list(user_config.get("rss_feeds", {}))
+        _chat_feed_urls[chat_id] = feed_urls
+        for feed_url in feed_urls:
+            _feed_subscribers.setdefault(feed_url, {})[chat_id] = None
+    _indexed_subscriptions = subscriptions_data
+    _indexes_valid = True
+
+
+def invalidate_indexes() -> None:
+    # 绕过 add_subscription/remove_subscription 修改订阅后须调用，下次查询时整体重建索引。
+    global _indexes_valid
+    _indexes_valid = False
+
+
+def _ensure_indexes() -> None:
+    # 订阅数据被整体替换（例如测试中直接赋值）时同样重建索引。
+    if not _indexes_valid or _indexed_subscriptions is not subscriptions_data:
+        _rebuild_indexes()
+
+
+def add_subscription(chat_id: str, feed_url: str, feed_data: Dict[str, Any]) -> None:
+    _ensure_indexes()
+    feeds = subscriptions_data[chat_id]["rss_feeds"]
+    is_new = feed_url not in feeds
+    feeds[feed_url] = feed_data
+    if is_new:
+        _chat_feed_urls.setdefault(chat_id, []).append(feed_url)
+        _feed_subscribers.setdefault(feed_url, {})[chat_id] = None
+
+
+def _prune_unsubscribed(chat_id: str, feed_url: str) -> None:
+    for message_key, message in list(outbox.items()):
+        if message.get("feed_url") == feed_url and str(message.get("chat_id")) == chat_id:
+            acknowledge_message(message_key)
+
+    user_config = subscriptions_data.get(chat_id, {})
+    digest_pending = user_config.get("digest_pending")
+    if digest_pending:
+        remaining = [item for item in digest_pending if item.get("feed_url") != feed_url]
+        if len(remaining) != len(digest_pending):
+            user_config["digest_pending"] = remaining
+            mark_chat_dirty(chat_id)
+
+    pending_chats = _pending_titles.get(feed_url)
+    if pending_chats is not None:
+        pending_chats.discard(chat_id)
+        if not pending_chats:
+            del _pending_titles[feed_url]
+
+    if feed_url not in _feed_subscribers and feed_states.pop(feed_url, None) is not None:
+        mark_feed_state_dirty(feed_url)
+
+
+def remove_subscription(chat_id: str, feed_url: str) -> Optional[Dict[str, Any]]:
+    _ensure_indexes()
+    feeds = subscriptions_data.get(chat_id, {}).get("rss_feeds", {})
+    feed_data = feeds.pop(feed_url, None)
+    if feed_data is None:
+        return None
+
+    feed_urls = _chat_feed_urls.get(chat_id)
+    if feed_urls is not None and feed_url in feed_urls:
+        # 单个聊天的订阅数量有限，按值删除的线性开销可以接受。
+        feed_urls.remove(feed_url)
+    subscribers = _feed_subscribers.get(feed_url)
+    if subscribers is not None:
+        subscribers.pop(chat_id, None)
+        if not subscribers:
+            del _feed_subscribers[feed_url]
+    _seen_entries_cache.pop((chat_id, feed_url), None)
+    # 取消订阅后不再投递该订阅源的待发消息和摘要；最后一个订阅者离开时丢弃订阅源状态。
+    _prune_unsubscribed(chat_id, feed_url)
+    return feed_data
+
+
+def get_feed_subscribers(feed_url: str) -> AbstractSet[str]:
+    _ensure_indexes()
+    return _feed_subscribers.get(feed_url, {}).keys()
+
+
+def get_feed_subscriptions(feed_url: str) -> List[Tuple[str, Dict[str, Any]]]:
+    subscriptions = []
+    for chat_id in get_feed_subscribers(feed_url):
+        feed_config = subscriptions_data.get(chat_id, {}).get("rss_feeds", {}).get(feed_url)
+        if feed_config is not None:
+            subscriptions.append((chat_id, feed_config))
+    return subscriptions
+
+
+def get_subscribed_feed_urls() -> List[str]:
+    _ensure_indexes()
+    return list(_feed_subscribers)
+
+
+def get_chat_feed_urls(chat_id: str) -> List[str]:
+    _ensure_indexes()
+    return _chat_feed_urls.get(chat_id, [])
+
+
+def get_chat_feed_url(chat_id: str, index: int) -> Optional[str]:
+    feed_urls = get_chat_feed_urls(chat_id)
+    if 0 <= index < len(feed_urls):
+        return feed_urls[index]
+    return None
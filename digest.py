@@ -0,0 +1,90 @@
+import html
+import re
+from typing import Any, Iterable, List, Optional, Tuple
+
+DIGEST_MODES = ("off", "feed", "chat")
+TELEGRAM_MESSAGE_LIMIT = 4096
+MAX_DIGEST_TITLE_CHARS = 300
+MAX_PENDING_DIGEST_ENTRIES = 500
+MAX_DIGEST_INTERVAL_MINUTES = 24 * 60
+_TAG_PATTERN = re.compile(r"<[^>]*>")
+_PARTIAL_ENTITY_PATTERN = re.compile(r"&[^;\s]*$")
+
+
+def normalize_digest_mode(value: Any) -> str:
+    mode = str(value).strip().lower() if value else "off"
+    return mode if mode in DIGEST_MODES else "off"
+
+
+def normalize_digest_interval(value: Any) -> int:
+    try:
+        minutes = int(value)
+    except (TypeError, ValueError):
+        return 0
+    return min(max(minutes, 0), MAX_DIGEST_INTERVAL_MINUTES)
+
+
+def build_digest_line(entry: Any) -> str:
+    title = entry.title or "无标题"
+    if len(title) > MAX_DIGEST_TITLE_CHARS:
+        title = title[:MAX_DIGEST_TITLE_CHARS - 1] + "…"
+    safe_title = html.escape(title, quote=False)
+    link = entry.link
+
+    if link:
+        safe_link = html.escape(str(link), quote=True)
+        return f'• <a href="{safe_link}">{safe_title}</a>'
+    return f"• {safe_title}"
+
+
+def _build_header(feed_title: str) -> str:
+    return f"<b>{html.escape(feed_title, quote=False)}</b>"
+
+
+def _truncate_escaped(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    # 截断已转义的文本时去掉被切开的实体（如 "&am"），避免 Telegram 解析失败。
+    return _PARTIAL_ENTITY_PATTERN.sub("", text[:max(limit - 1, 0)]) + "…"
+
+
+def _shrink_block(feed_title: str, line: str, limit: int) -> List[str]:
+    # 单个条目连同标题就超过上限时（如超长链接），去掉链接只保留文本，仍过长则截断。
+    title = _truncate_escaped(html.escape(feed_title, quote=False), max(limit // 2 - len("<b></b>"), 1))
+    header = f"<b>{title}</b>"
+    text = _truncate_escaped(_TAG_PATTERN.sub("", line), max(limit - len(header) - 1, 1))
+    return [header, text]
+
+
+def split_digest_messages(
+    items: Iterable[Tuple[str, str]],
+    limit: int = TELEGRAM_MESSAGE_LIMIT
+) -> List[Tuple[str, int]]:
+    # 返回 (消息文本, 条目数)，调用方据此只确认已送达的条目；跨消息的订阅源会重复标题。
+    messages: List[Tuple[str, int]] = []
+    parts: List[str] = []
+    count = 0
+    current_title: Optional[str] = None
+
+    for feed_title, line in items:
+        block = []
+        if feed_title != current_title:
+            if parts:
+                block.append("")
+            block.append(_build_header(feed_title))
+        block.append(line)
+
+        if parts and len("\n".join(parts + block)) > limit:
+            messages.append(("\n".join(parts), count))
+            parts, count = [], 0
+            block = [_build_header(feed_title), line]
+        if not parts and len("\n".join(block)) > limit:
+            block = _shrink_block(feed_title, line, limit)
+
+        parts.extend(block)
+        count += 1
+        current_title = feed_title
+
+    if parts:
+        messages.append(("\n".join(parts), count))
+    return messages
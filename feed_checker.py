@@ -1,19 +1,40 @@
 import asyncio
+import functools
 import html
 import logging
-from typing import Any, Dict, Optional
+import time
+from concurrent.futures.process import BrokenProcessPool
+from typing import AbstractSet, Any, Dict, Iterable, List, Optional, Set, Tuple
 
-import feedparser
 from telegram import constants
+from telegram import error as tg_error
 from telegram.ext import ContextTypes
 
 import data_manager
+import digest
+import feed_parser
+import fetcher
+import keyword_filter
+import metrics
+import polling
+import profiler
 import retry_utils
+import scheduler
+import sender
 
 logger = logging.getLogger(__name__)
 
 MAX_SENT_ENTRIES_PER_CYCLE = 5
 SUMMARY_MESSAGE_THRESHOLD = 7
+OUTBOX_MAX_ATTEMPTS = 5
+
+_delivering_keys: Set[str] = set()
+_check_cycle_running = False
+DELIVERY_SHUTDOWN_TIMEOUT_SECONDS = 15.0
+
+_delivery_task: Optional["asyncio.Task[None]"] = None
+_delivery_requested = False
+_delivery_closing = False
 
 
 async def send_telegram_message(
@@ -30,6 +51,16 @@ async def send_telegram_message(
     if custom_footer:
         text = f"{text}\n---\n{html.escape(str(custom_footer), quote=False)}"
 
+    message_sender = sender.get_sender()
+    if message_sender is not None:
+        await message_sender.send(
+            chat_id,
+            text=text,
+            parse_mode=constants.ParseMode.HTML,
+            disable_web_page_preview=not link_preview_enabled
+        )
+        return
+
     await retry_utils.retry_telegram_api(
         context.bot.send_message,
         chat_id=chat_id,
@@ -39,34 +70,38 @@ async def send_telegram_message(
     )
 
 
-def _get_entry_id(entry: Dict[str, Any]) -> Optional[str]:
-    return entry.get("id") or entry.get("link")
-
-
-def _matches_keywords(entry: Dict[str, Any], keywords: list) -> bool:
+def _matches_keywords(entry: feed_parser.FeedEntry, keywords: list) -> bool:
     if not keywords:
         return True
 
-    title = entry.get("title", "")
-    summary = entry.get("summary", "")
-    content = ""
-    entry_content = entry.get("content")
+    matcher = keyword_filter.compile_keywords(keywords)
+    return matcher.matches(entry.match_fields.any)
 
-    if isinstance(entry_content, list):
-        content = " ".join(
-            str(item.get("value", ""))
-            for item in entry_content
-            if isinstance(item, dict)
-        )
 
-    content_to_check = f"{title} {summary} {content}".lower()
-    return any(kw.lower() in content_to_check for kw in keywords)
+@functools.lru_cache(maxsize=keyword_filter.MATCHER_CACHE_SIZE)
+def _compile_stored_filter(filter_expression: str) -> Optional[keyword_filter.Predicate]:
+    # lru_cache 不缓存异常，无效表达式在这里记为 None，每条条目不再重复解析和记录日志。
+    try:
+        return keyword_filter.compile_filter(filter_expression)
+    except keyword_filter.FilterSyntaxError as e:
+        logger.warning("过滤表达式 %r 无效，已忽略: %s", filter_expression, e)
+        return None
 
 
-def _build_entry_message(feed_title: str, entry: Dict[str, Any]) -> str:
+def _matches_filter(entry: feed_parser.FeedEntry, filter_expression: Optional[str]) -> bool:
+    if not filter_expression:
+        return True
+
+    predicate = _compile_stored_filter(filter_expression)
+    if predicate is None:
+        return True
+    return predicate(entry.match_fields)
+
+
+def _build_entry_message(feed_title: str, entry: feed_parser.FeedEntry) -> str:
     safe_feed_title = html.escape(feed_title, quote=False)
-    safe_title = html.escape(entry.get("title", "无标题"), quote=False)
-    link = entry.get("link", "")
+    safe_title = html.escape(entry.title or "无标题", quote=False)
+    link = entry.link
 
     if link:
         safe_link = html.escape(str(link), quote=True)
@@ -80,6 +115,10 @@ def _build_overflow_message(feed_title: str, remaining: int) -> str:
     return f"<i>以及来自 {safe_feed_title} 的另外 {remaining} 条更新未在本轮发送。</i>"
 
 
+def _make_message_key(chat_id: str, feed_url: str, entry_key: str) -> str:
+    return data_manager.make_entry_key(f"{chat_id}\n{feed_url}\n{entry_key}")
+
+
 def _update_last_entry_id(
     chat_id: str,
     feed_url: str,
@@ -89,204 +128,832 @@ def _update_last_entry_id(
     subscriptions_data = data_manager.get_subscriptions()
     if chat_id in subscriptions_data and feed_url in subscriptions_data[chat_id].get("rss_feeds", {}):
         subscriptions_data[chat_id]["rss_feeds"][feed_url]["last_entry_id"] = entry_id
-        data_manager.save_subscriptions(data_file)
+        data_manager.mark_feed_dirty(chat_id, feed_url)
+        data_manager.request_save(data_file)
+
+
+async def _download_feed(feed_url: str, feed_state: Optional[Dict[str, Any]] = None) -> fetcher.FetchResult:
+    etag = feed_state.get("etag") if feed_state else None
+    modified = feed_state.get("modified") if feed_state else None
+    started_at = time.perf_counter()
+    fetch_result = await fetcher.get_fetcher().fetch(feed_url, etag=etag, modified=modified)
+    metrics.FETCH_SECONDS.observe(time.perf_counter() - started_at)
+    if fetch_result.not_modified:
+        metrics.FEEDS_NOT_MODIFIED.inc()
+    else:
+        metrics.FEEDS_FETCHED.inc()
+        metrics.FEED_BYTES.inc(feed_url, len(fetch_result.content))
+    return fetch_result
 
 
-async def check_single_feed(
-    context: ContextTypes.DEFAULT_TYPE,
-    chat_id: str,
+async def _parse_feed(
     feed_url: str,
-    feed_config: Dict[str, Any],
-    data_file: str
-) -> None:
-    logger.info(f"正在为用户 {chat_id} 检查订阅源: {feed_url}")
-
-    try:
+    fetch_result: fetcher.FetchResult,
+    known_keys: Optional[AbstractSet[str]] = None
+) -> Any:
+    response_headers = {"content-location": fetch_result.url, **fetch_result.headers}
+    parse_pool = feed_parser.get_parse_pool()
+    feed_content = None
+    started_at = time.perf_counter()
+
+    if parse_pool is not None:
+        try:
+            feed_content = await asyncio.get_running_loop().run_in_executor(
+                parse_pool,
+                feed_parser.parse_feed_bytes,
+                fetch_result.content,
+                response_headers,
+                known_keys,
+            )
+        except BrokenProcessPool:
+            logger.error("解析进程池已损坏，改为在线程中解析订阅源。")
+            feed_parser.close_parse_pool()
+
+    if feed_content is None:
+        parse = functools.partial(
+            feed_parser.parse_feed_bytes,
+            fetch_result.content,
+            response_headers,
+            known_keys,
+        )
         if hasattr(asyncio, "to_thread"):
-            feed_content = await asyncio.to_thread(feedparser.parse, feed_url)
+            feed_content = await asyncio.to_thread(parse)
         else:
             loop = asyncio.get_event_loop()
-            feed_content = await loop.run_in_executor(None, feedparser.parse, feed_url)
+            feed_content = await loop.run_in_executor(None, parse)
+    metrics.PARSE_SECONDS.observe(time.perf_counter() - started_at)
+
+    if feed_content.bozo:
+        logger.warning(
+            "订阅源 %s 可能存在格式问题: %s",
+            feed_url,
+            feed_content.bozo_exception,
+        )
 
-        if feed_content.bozo:
-            logger.warning(
-                "用户 %s 的订阅源 %s 可能存在格式问题: %s",
-                chat_id,
-                feed_url,
-                feed_content.bozo_exception,
-            )
+    return feed_content
 
-        last_known_entry_id = feed_config.get("last_entry_id")
-        current_feed_latest_entry_id = None
 
-        if feed_content.entries:
-            latest_entry = feed_content.entries[0]
-            current_feed_latest_entry_id = _get_entry_id(latest_entry)
+def _get_settings(context: ContextTypes.DEFAULT_TYPE) -> Dict[str, Any]:
+    return context.bot_data.get("config", {})
 
-        if last_known_entry_id is None:
-            if current_feed_latest_entry_id:
-                _update_last_entry_id(chat_id, feed_url, current_feed_latest_entry_id, data_file)
-                logger.info(
-                    "首次检查 %s (用户 %s)，已将 last_entry_id 设置为 %s，本轮不推送历史内容。",
-                    feed_url,
-                    chat_id,
-                    current_feed_latest_entry_id,
-                )
-            return
 
-        temp_new_entries = []
-        found_last_known = False
+def _update_poll_interval(
+    feed_state: Dict[str, Any],
+    settings: Dict[str, Any],
+    fetch_result: fetcher.FetchResult,
+    feed_content: Any = None
+) -> None:
+    bounds = polling.get_polling_bounds(settings)
+    if feed_content is None:
+        learned_seconds = feed_state.get("interval_seconds")
+        feed_info = None
+    else:
+        entry_timestamps = [
+            entry.published for entry in feed_content.entries if entry.published is not None
+        ][:polling.LEARNING_SAMPLE_SIZE]
+        learned_seconds = polling.learn_update_interval(entry_timestamps)
+        feed_info = getattr(feed_content, "feed", None)
 
-        for entry in feed_content.entries:
-            entry_id = _get_entry_id(entry)
-            if not entry_id:
-                logger.warning("%s 中存在缺少 id/link 的条目，已跳过。", feed_url)
-                continue
+    hint_seconds = polling.get_publisher_hint_seconds(feed_info, fetch_result.headers)
+    feed_state["interval_seconds"] = polling.compute_poll_interval(bounds, learned_seconds, hint_seconds)
 
-            if last_known_entry_id == entry_id:
-                found_last_known = True
-                break
 
-            temp_new_entries.append(entry)
+def _update_feed_validators(feed_state: Dict[str, Any], fetch_result: fetcher.FetchResult) -> bool:
+    etag = fetch_result.etag
+    modified = fetch_result.modified
 
-        if not found_last_known and last_known_entry_id is not None:
-            logger.warning(
-                "用户 %s 的 %s 未找到上次记录的条目 %s，本轮最多补发 %s 条。",
-                chat_id,
-                feed_url,
-                last_known_entry_id,
-                MAX_SENT_ENTRIES_PER_CYCLE,
-            )
-            new_entries = list(reversed(temp_new_entries[:MAX_SENT_ENTRIES_PER_CYCLE]))
-        else:
-            new_entries = list(reversed(temp_new_entries))
+    if feed_state.get("etag") == etag and feed_state.get("modified") == modified:
+        return False
 
-        sent_count = 0
-        latest_sent_entry_id_this_cycle = None
-        keywords = feed_config.get("keywords", [])
-        feed_title = feed_config.get("title", feed_url)
+    feed_state["etag"] = etag
+    feed_state["modified"] = modified
+    return True
 
-        for entry in new_entries:
-            if not _matches_keywords(entry, keywords):
-                logger.debug(
-                    "用户 %s 的订阅源 %s 中有条目未匹配关键字，已跳过。",
-                    chat_id,
-                    feed_url,
-                )
-                continue
 
-            entry_id = _get_entry_id(entry)
-            message = _build_entry_message(feed_title, entry)
-
-            try:
-                await send_telegram_message(context, chat_id, message)
-            except Exception:
-                if latest_sent_entry_id_this_cycle:
-                    _update_last_entry_id(
-                        chat_id,
-                        feed_url,
-                        latest_sent_entry_id_this_cycle,
-                        data_file,
-                    )
-                raise
-
-            sent_count += 1
-            latest_sent_entry_id_this_cycle = entry_id
-
-            if sent_count >= MAX_SENT_ENTRIES_PER_CYCLE and len(new_entries) > SUMMARY_MESSAGE_THRESHOLD:
-                remaining = len(new_entries) - sent_count
-                try:
-                    await send_telegram_message(
-                        context,
-                        chat_id,
-                        _build_overflow_message(feed_title, remaining),
-                    )
-                except Exception as exc:
-                    logger.warning(
-                        "用户 %s 的订阅源 %s 摘要消息发送失败: %s",
-                        chat_id,
-                        feed_url,
-                        exc,
-                    )
-
-                logger.info(
-                    "已向用户 %s 发送来自 %s 的 %s 条更新，剩余 %s 条留待后续轮次发送。",
-                    chat_id,
-                    feed_url,
-                    sent_count,
-                    remaining,
-                )
-                break
+def _get_changed_body_hashes(feed_state: Dict[str, Any], content: bytes) -> Optional[Dict[str, str]]:
+    # 内容未变化时返回 None；否则返回新的哈希，由调用方在解析成功后写入状态。
+    body_hash = feed_parser.hash_feed_body(content)
+    if body_hash == feed_state.get("body_hash"):
+        return None
+
+    normalized_hash = feed_parser.hash_normalized_feed_body(content)
+    if normalized_hash == feed_state.get("normalized_body_hash"):
+        feed_state["body_hash"] = body_hash
+        return None
+    return {"body_hash": body_hash, "normalized_body_hash": normalized_hash}
+
 
-        if latest_sent_entry_id_this_cycle:
-            _update_last_entry_id(chat_id, feed_url, latest_sent_entry_id_this_cycle, data_file)
+class FetchStats:
+    def __init__(self) -> None:
+        self.parsed = 0
+        self.not_modified = 0
+        self.unchanged = 0
+
+
+def _seed_seen_entries(
+    chat_id: str,
+    feed_url: str,
+    feed_config: Dict[str, Any],
+    entries: List[feed_parser.FeedEntry]
+) -> bool:
+    if not data_manager.is_feed_initialized(feed_config):
+        data_manager.mark_entries_seen(chat_id, feed_url, [entry.key for entry in reversed(entries)])
+        # 订阅源为空或条目没有 id/链接时不会产生游标，需单独记录首次检查已完成。
+        data_manager.mark_feed_initialized(chat_id, feed_url)
+        return True
+
+    # 从旧版 last_entry_id 游标迁移：游标及其之后（更旧）的条目视为已读。
+    last_known_entry_id = feed_config.get("last_entry_id")
+    for index, entry in enumerate(entries):
+        if entry.identity == last_known_entry_id:
+            data_manager.mark_entries_seen(chat_id, feed_url, [older.key for older in reversed(entries[index:])])
+            break
+    return False
+
+
+async def _process_feed_for_chat(
+    context: ContextTypes.DEFAULT_TYPE,
+    chat_id: str,
+    feed_url: str,
+    feed_config: Dict[str, Any],
+    feed_content: Any,
+    data_file: str
+) -> bool:
+    # 返回 True 表示受单轮发送上限限制，还有未读条目留待后续轮次。
+    current_feed_latest_entry_id = feed_content.latest_entry_id
+    entries = feed_content.entries
+    seen_entries = data_manager.get_seen_entries(chat_id, feed_url)
+
+    if not seen_entries:
+        if _seed_seen_entries(chat_id, feed_url, feed_config, entries):
+            if current_feed_latest_entry_id:
+                _update_last_entry_id(chat_id, feed_url, current_feed_latest_entry_id, data_file)
             logger.info(
-                "已向用户 %s 发送来自 %s 的 %s 条新条目，last_entry_id 更新为 %s。",
+                "首次检查 %s (用户 %s)，已记录 %s 个现有条目，本轮不推送历史内容。",
+                feed_url,
+                chat_id,
+                len(entries),
+            )
+            return False
+        seen_entries = data_manager.get_seen_entries(chat_id, feed_url)
+
+    unseen_entries = [entry for entry in entries if entry.key not in seen_entries]
+
+    # 被裁剪掉的条目对所有订阅者都是已读的，此时不属于“没有任何已读条目”的情况。
+    if unseen_entries and len(unseen_entries) == len(entries) and not feed_content.pruned_count:
+        logger.warning(
+            "用户 %s 的 %s 中没有任何已读条目，本轮最多补发 %s 条。",
+            chat_id,
+            feed_url,
+            MAX_SENT_ENTRIES_PER_CYCLE,
+        )
+        data_manager.mark_entries_seen(
+            chat_id,
+            feed_url,
+            [entry.key for entry in reversed(unseen_entries[MAX_SENT_ENTRIES_PER_CYCLE:])],
+        )
+        unseen_entries = unseen_entries[:MAX_SENT_ENTRIES_PER_CYCLE]
+
+    new_entries = list(reversed(unseen_entries))
+
+    sent_count = 0
+    queued_count = 0
+    has_remaining = False
+    latest_processed_entry_id = None
+    keywords = feed_config.get("keywords", [])
+    filter_expression = feed_config.get("filter")
+    feed_title = feed_config.get("title", feed_url)
+    user_config = data_manager.get_subscriptions().get(chat_id, {})
+    digest_enabled = digest.normalize_digest_mode(user_config.get("digest_mode")) != "off"
+
+    for entry in new_entries:
+        entry_key = entry.key
+        match_started_at = time.perf_counter()
+        matched = _matches_keywords(entry, keywords) and _matches_filter(entry, filter_expression)
+        metrics.MATCH_SECONDS.observe(time.perf_counter() - match_started_at)
+        if not matched:
+            logger.debug(
+                "用户 %s 的订阅源 %s 中有条目未匹配关键字或过滤表达式，已跳过。",
+                chat_id,
+                feed_url,
+            )
+            data_manager.mark_entries_seen(chat_id, feed_url, [entry_key])
+            latest_processed_entry_id = entry.identity or latest_processed_entry_id
+            continue
+
+        if digest_enabled:
+            # 摘要模式下条目先进入持久化的待发列表，不受单轮发送上限限制。
+            data_manager.add_digest_entry(chat_id, feed_url, feed_title, digest.build_digest_line(entry))
+            data_manager.mark_entries_seen(chat_id, feed_url, [entry_key])
+            queued_count += 1
+            latest_processed_entry_id = entry.identity or latest_processed_entry_id
+            continue
+
+        # 消息与已读标记在同一次落盘中持久化，实际发送由 deliver_outbox 在落盘之后完成。
+        data_manager.enqueue_message(
+            _make_message_key(chat_id, feed_url, entry_key),
+            chat_id,
+            _build_entry_message(feed_title, entry),
+            feed_url,
+        )
+        data_manager.mark_entries_seen(chat_id, feed_url, [entry_key])
+        sent_count += 1
+        latest_processed_entry_id = entry.identity or latest_processed_entry_id
+
+        if sent_count >= MAX_SENT_ENTRIES_PER_CYCLE and len(new_entries) > SUMMARY_MESSAGE_THRESHOLD:
+            remaining = len(new_entries) - sent_count
+            data_manager.enqueue_message(
+                _make_message_key(chat_id, feed_url, f"overflow:{entry_key}"),
+                chat_id,
+                _build_overflow_message(feed_title, remaining),
+                feed_url,
+            )
+            logger.info(
+                "已为用户 %s 排队来自 %s 的 %s 条更新，剩余 %s 条留待后续轮次发送。",
                 chat_id,
                 feed_url,
                 sent_count,
-                latest_sent_entry_id_this_cycle,
+                remaining,
             )
-        elif not new_entries and current_feed_latest_entry_id:
-            subscriptions_data = data_manager.get_subscriptions()
-            current_last_id = subscriptions_data.get(chat_id, {}).get("rss_feeds", {}).get(feed_url, {}).get("last_entry_id")
-            if current_last_id != current_feed_latest_entry_id:
-                _update_last_entry_id(chat_id, feed_url, current_feed_latest_entry_id, data_file)
-                logger.info(
-                    "用户 %s 的 %s 本轮无可发送条目，last_entry_id 对齐到最新条目 %s。",
-                    chat_id,
-                    feed_url,
-                    current_feed_latest_entry_id,
-                )
-        elif sent_count == 0 and new_entries:
-            id_of_newest_identified_entry = _get_entry_id(new_entries[-1])
-            if id_of_newest_identified_entry:
-                _update_last_entry_id(chat_id, feed_url, id_of_newest_identified_entry, data_file)
-                logger.info(
-                    "用户 %s 的 %s 新条目均被过滤，last_entry_id 更新为 %s。",
+            has_remaining = True
+            break
+
+    if latest_processed_entry_id:
+        _update_last_entry_id(chat_id, feed_url, latest_processed_entry_id, data_file)
+    data_manager.request_save(data_file)
+
+    if sent_count:
+        logger.info(
+            "已为用户 %s 排队来自 %s 的 %s 条新条目，last_entry_id 更新为 %s。",
+            chat_id,
+            feed_url,
+            sent_count,
+            latest_processed_entry_id,
+        )
+    elif queued_count:
+        logger.info(
+            "已将用户 %s 的 %s 中 %s 条新条目加入摘要，last_entry_id 更新为 %s。",
+            chat_id,
+            feed_url,
+            queued_count,
+            latest_processed_entry_id,
+        )
+    elif not new_entries and current_feed_latest_entry_id:
+        subscriptions_data = data_manager.get_subscriptions()
+        current_last_id = subscriptions_data.get(chat_id, {}).get("rss_feeds", {}).get(feed_url, {}).get("last_entry_id")
+        if current_last_id != current_feed_latest_entry_id:
+            _update_last_entry_id(chat_id, feed_url, current_feed_latest_entry_id, data_file)
+            logger.info(
+                "用户 %s 的 %s 本轮无可发送条目，last_entry_id 对齐到最新条目 %s。",
+                chat_id,
+                feed_url,
+                current_feed_latest_entry_id,
+            )
+    elif new_entries:
+        logger.info(
+            "用户 %s 的 %s 新条目均被过滤，last_entry_id 更新为 %s。",
+            chat_id,
+            feed_url,
+            latest_processed_entry_id,
+        )
+    return has_remaining
+
+
+async def _deliver_chat_outbox(
+    context: ContextTypes.DEFAULT_TYPE,
+    chat_id: str,
+    message_keys: List[str]
+) -> int:
+    delivered = 0
+    for message_key in message_keys:
+        if _delivery_closing:
+            break
+        message = data_manager.get_outbox().get(message_key)
+        if message is None:
+            continue
+
+        _delivering_keys.add(message_key)
+        try:
+            await send_telegram_message(context, chat_id, message["text"])
+        except tg_error.RetryAfter as e:
+            # 限流不计入失败次数：消息留在发件箱，同一聊天的后续消息也等到之后再投递。
+            logger.warning("向用户 %s 投递消息时触发限流 (%s 秒)，将在之后重试。", chat_id, e.retry_after)
+            break
+        except Exception as e:
+            message["attempts"] = message.get("attempts", 0) + 1
+            data_manager.mark_outbox_dirty(message_key)
+            permanent = isinstance(e, tg_error.TelegramError) and not retry_utils.is_retryable_error(e)
+            if permanent or message["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+                logger.error(
+                    "向用户 %s 投递消息失败 %s 次，已放弃: %s: %s",
                     chat_id,
-                    feed_url,
-                    id_of_newest_identified_entry,
+                    message["attempts"],
+                    type(e).__name__,
+                    e,
                 )
+                data_manager.acknowledge_message(message_key)
+                continue
+            # 保持同一聊天内的消息顺序：本条失败时后续消息留到下一轮。
+            logger.warning("向用户 %s 投递消息失败，将在下一轮重试: %s", chat_id, e)
+            break
+        else:
+            data_manager.acknowledge_message(message_key)
+            delivered += 1
+        finally:
+            _delivering_keys.discard(message_key)
+    return delivered
+
+
+async def deliver_outbox(context: ContextTypes.DEFAULT_TYPE, data_file: str) -> int:
+    chat_keys: Dict[str, List[str]] = {}
+    for message_key, message in list(data_manager.get_outbox().items()):
+        if message_key not in _delivering_keys:
+            chat_keys.setdefault(str(message["chat_id"]), []).append(message_key)
+
+    if not chat_keys:
+        return 0
+
+    started_at = time.perf_counter()
+    results = await asyncio.gather(
+        *(_deliver_chat_outbox(context, chat_id, message_keys) for chat_id, message_keys in chat_keys.items()),
+        return_exceptions=True,
+    )
+    metrics.DELIVER_SECONDS.observe(time.perf_counter() - started_at)
+    delivered = 0
+    for chat_id, result in zip(chat_keys, results):
+        if isinstance(result, BaseException):
+            logger.error("投递用户 %s 的待发消息时出错: %s", chat_id, result)
+        else:
+            delivered += result
+    data_manager.request_save(data_file)
+
+    remaining = len(data_manager.get_outbox())
+    logger.info("本轮投递 %s 条消息，发件箱剩余 %s 条。", delivered, remaining)
+    return delivered
+
+
+def _get_digest_message_limit(user_config: Dict[str, Any]) -> int:
+    limit = digest.TELEGRAM_MESSAGE_LIMIT
+    custom_footer = user_config.get("custom_footer")
+    if custom_footer:
+        limit -= len(html.escape(str(custom_footer), quote=False)) + len("\n---\n")
+    return max(limit, 1)
+
+
+def _group_digest_items(pending: List[Dict[str, Any]], digest_mode: str) -> List[List[Dict[str, Any]]]:
+    if digest_mode != "feed":
+        return [list(pending)]
+
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for item in pending:
+        groups.setdefault(item.get("feed_url", ""), []).append(item)
+    return list(groups.values())
+
+
+async def _send_digest_for_chat(
+    context: ContextTypes.DEFAULT_TYPE,
+    chat_id: str,
+    user_config: Dict[str, Any],
+    now: float
+) -> None:
+    pending = user_config.get("digest_pending", [])
+    digest_mode = digest.normalize_digest_mode(user_config.get("digest_mode"))
+    limit = _get_digest_message_limit(user_config)
+    delivered_ids = set()
+    message_count = 0
 
+    try:
+        for group in _group_digest_items(pending, digest_mode):
+            items = [(item.get("feed_title", ""), item["line"]) for item in group]
+            offset = 0
+            for text, item_count in digest.split_digest_messages(items, limit):
+                if _delivery_closing:
+                    return
+                await send_telegram_message(context, chat_id, text)
+                delivered_ids.update(id(item) for item in group[offset:offset + item_count])
+                offset += item_count
+                message_count += 1
+    finally:
+        if delivered_ids:
+            # 发送期间可能有新条目追加进来，只移除本次确实送达的条目。
+            user_config["digest_pending"] = [
+                item for item in user_config.get("digest_pending", []) if id(item) not in delivered_ids
+            ]
+            interval = digest.normalize_digest_interval(user_config.get("digest_interval_minutes"))
+            user_config["digest_next_at"] = now + interval * 60 if interval else None
+            data_manager.mark_chat_dirty(chat_id)
+
+    logger.info("已向用户 %s 发送摘要: %s 条条目，%s 条消息。", chat_id, len(delivered_ids), message_count)
+
+
+async def send_pending_digests(
+    context: ContextTypes.DEFAULT_TYPE,
+    data_file: str,
+    now: Optional[float] = None
+) -> None:
+    now = time.time() if now is None else now
+    due_chats = []
+    for chat_id, user_config in list(data_manager.get_subscriptions().items()):
+        if not user_config.get("digest_pending"):
+            continue
+        digest_enabled = digest.normalize_digest_mode(user_config.get("digest_mode")) != "off"
+        next_at = user_config.get("digest_next_at")
+        if digest_enabled and next_at and next_at > now:
+            continue
+        due_chats.append((chat_id, user_config))
+
+    if not due_chats:
+        return
+
+    results = await asyncio.gather(
+        *(_send_digest_for_chat(context, chat_id, user_config, now) for chat_id, user_config in due_chats),
+        return_exceptions=True,
+    )
+    for (chat_id, _), result in zip(due_chats, results):
+        if isinstance(result, BaseException):
+            logger.error("向用户 %s 发送摘要失败，未送达的条目将在下一轮重试: %s", chat_id, result)
+    data_manager.request_save(data_file)
+
+
+async def _delivery_worker(context: ContextTypes.DEFAULT_TYPE, data_file: str) -> None:
+    global _delivery_requested
+    # 投递期间又有新的请求时再跑一轮，确保之后入队的消息不会等到下一次检查。
+    while _delivery_requested:
+        _delivery_requested = False
+        try:
+            await deliver_outbox(context, data_file)
+            await send_pending_digests(context, data_file)
+        except Exception:
+            logger.exception("投递待发消息时出错")
+
+
+def schedule_delivery(context: ContextTypes.DEFAULT_TYPE, data_file: str) -> Optional["asyncio.Task[None]"]:
+    # 投递在独立任务中进行，检查周期不等待它完成，Telegram 限流不会拖住之后的检查。
+    global _delivery_task, _delivery_requested
+    if _delivery_closing:
+        return _delivery_task
+    _delivery_requested = True
+    if _delivery_task is None or _delivery_task.done():
+        _delivery_task = asyncio.get_running_loop().create_task(_delivery_worker(context, data_file))
+    return _delivery_task
+
+
+async def wait_for_delivery() -> None:
+    if _delivery_task is not None:
+        await _delivery_task
+
+
+async def close_delivery(timeout: float = DELIVERY_SHUTDOWN_TIMEOUT_SECONDS) -> None:
+    global _delivery_task, _delivery_requested, _delivery_closing
+    _delivery_requested = False
+    if _delivery_task is None:
+        return
+
+    # 不再开始投递新消息，但要等正在发送的消息完成并从发件箱确认后再退出，
+    # 否则消息已送达而确认丢失，重启后会被重复发送。须在关闭发送器之前调用。
+    _delivery_closing = True
+    try:
+        await asyncio.wait_for(asyncio.shield(_delivery_task), timeout)
+    except asyncio.TimeoutError:
+        logger.warning("投递任务未能在 %s 秒内结束，已取消；未确认的消息将在下次启动后重新投递。", timeout)
+        _delivery_task.cancel()
+        try:
+            await _delivery_task
+        except asyncio.CancelledError:
+            pass
+    finally:
+        _delivery_task = None
+        _delivery_closing = False
+
+
+async def _fetch_for_subscribers(
+    context: ContextTypes.DEFAULT_TYPE,
+    feed_url: str,
+    subscribers: List[Tuple[str, Dict[str, Any]]],
+    stats: Optional[FetchStats] = None
+) -> Any:
+    logger.info("正在检查订阅源 %s (%s 个订阅者)", feed_url, len(subscribers))
+    stats = stats or FetchStats()
+
+    feed_state = data_manager.get_feed_state(feed_url)
+    # 有订阅者尚未完成首次检查时需要完整内容来初始化，不发送条件请求；
+    # 上一轮受发送上限限制还有未读条目时，内容即使未变化也要重新解析，直到全部发完。
+    use_validators = not feed_state.get("pending_unseen") and all(
+        data_manager.is_feed_initialized(feed_config) for _, feed_config in subscribers
+    )
+
+    try:
+        fetch_result = await _download_feed(feed_url, feed_state if use_validators else None)
+        if fetch_result.not_modified:
+            _update_poll_interval(feed_state, _get_settings(context), fetch_result)
+            logger.info("订阅源 %s 未发生变化 (304)，跳过解析。", feed_url)
+            stats.not_modified += 1
+            return None
+
+        # 不提供 ETag/Last-Modified 的订阅源依靠响应体哈希判断内容是否变化。
+        body_hashes = _get_changed_body_hashes(feed_state, fetch_result.content)
+        if body_hashes is None and use_validators:
+            _update_poll_interval(feed_state, _get_settings(context), fetch_result)
+            logger.info("订阅源 %s 的内容与上次相同，跳过解析。", feed_url)
+            stats.unchanged += 1
+            metrics.FEEDS_UNCHANGED.inc()
+            return None
+
+        # 所有订阅者都已读的条目可作为停止点，解析到这些条目后不再读取更早的内容。
+        feed_content = await _parse_feed(feed_url, fetch_result, _get_keys_seen_by_all(feed_url, subscribers))
+        # 解析成功后才记录验证头和哈希，超时或出错的订阅源下一轮会重新解析。
+        _update_feed_validators(feed_state, fetch_result)
+        feed_state.update(body_hashes or {})
+        data_manager.mark_feed_state_dirty(feed_url)
+        stats.parsed += 1
+        _update_poll_interval(feed_state, _get_settings(context), fetch_result, feed_content)
     except Exception:
-        logger.exception("处理用户 %s 的订阅源 %s 时出错", chat_id, feed_url)
+        logger.exception("拉取订阅源 %s 时出错", feed_url)
         raise
+    return feed_content
+
+
+def _get_keys_seen_by_all(
+    feed_url: str,
+    subscribers: List[Tuple[str, Dict[str, Any]]],
+    candidates: Optional[Iterable[str]] = None
+) -> Set[str]:
+    seen_by_all: Optional[Set[str]] = set(candidates) if candidates is not None else None
+    for chat_id, _ in subscribers:
+        seen_entries = data_manager.get_seen_entries(chat_id, feed_url)
+        if not seen_entries:
+            # 需要初始化已读集合的订阅者要看到完整的条目列表。
+            return set()
+        if seen_by_all is None:
+            seen_by_all = set(seen_entries.to_list())
+        else:
+            seen_by_all = {key for key in seen_by_all if key in seen_entries}
+        if not seen_by_all:
+            return set()
+    return seen_by_all or set()
+
+
+def _prune_seen_entries(
+    feed_url: str,
+    subscribers: List[Tuple[str, Dict[str, Any]]],
+    feed_content: feed_parser.CompactFeed
+) -> feed_parser.CompactFeed:
+    seen_by_all = _get_keys_seen_by_all(
+        feed_url,
+        subscribers,
+        (entry.key for entry in feed_content.entries),
+    )
+    if not seen_by_all:
+        return feed_content
+    return feed_content.without_entries(seen_by_all)
+
+
+async def _dispatch_to_subscribers(
+    context: ContextTypes.DEFAULT_TYPE,
+    feed_url: str,
+    subscribers: List[Tuple[str, Dict[str, Any]]],
+    feed_content: Any,
+    data_file: str
+) -> List[Tuple[str, Optional[BaseException]]]:
+    if feed_content is None:
+        return [(chat_id, None) for chat_id, _ in subscribers]
+
+    started_at = time.perf_counter()
+    feed_content = _prune_seen_entries(feed_url, subscribers, feed_content)
+    results = await asyncio.gather(
+        *(
+            _process_feed_for_chat(context, chat_id, feed_url, feed_config, feed_content, data_file)
+            for chat_id, feed_config in subscribers
+        ),
+        return_exceptions=True,
+    )
+    metrics.DISPATCH_SECONDS.observe(time.perf_counter() - started_at)
+
+    # 出错的订阅者同样可能还有未读条目，下一轮不能因内容未变而跳过。
+    pending_unseen = any(result is True or isinstance(result, BaseException) for result in results)
+    feed_state = data_manager.get_feed_state(feed_url)
+    if bool(feed_state.get("pending_unseen")) != pending_unseen:
+        if pending_unseen:
+            feed_state["pending_unseen"] = True
+        else:
+            feed_state.pop("pending_unseen", None)
+        data_manager.mark_feed_state_dirty(feed_url)
+
+    outcomes = []
+    for (chat_id, _), result in zip(subscribers, results):
+        if isinstance(result, BaseException):
+            logger.error(
+                "处理用户 %s 的订阅源 %s 时出错",
+                chat_id,
+                feed_url,
+                exc_info=(type(result), result, result.__traceback__),
+            )
+            outcomes.append((chat_id, result))
+        else:
+            outcomes.append((chat_id, None))
+    return outcomes
+
+
+def _describe_error(error: BaseException) -> str:
+    if isinstance(error, asyncio.TimeoutError):
+        return "检查超时"
+    return f"{type(error).__name__}: {error}" if str(error) else type(error).__name__
+
+
+def _record_feed_failure(
+    feed_url: str,
+    error: BaseException,
+    bounds: Dict[str, int],
+    now: float
+) -> int:
+    failure_count = data_manager.record_feed_failure(feed_url, _describe_error(error), now)
+    metrics.FEED_FAILURES.inc()
+    delay = polling.compute_failure_backoff(bounds, failure_count)
+    if failure_count == polling.CIRCUIT_BREAK_FAILURES:
+        logger.warning("订阅源 %s 已连续失败 %s 次，触发熔断，之后每 %s 秒探测一次。", feed_url, failure_count, delay)
+    elif failure_count > 1:
+        logger.info("订阅源 %s 已连续失败 %s 次，%s 秒后重试。", feed_url, failure_count, delay)
+    return delay
 
 
 async def check_feeds_job(context: ContextTypes.DEFAULT_TYPE, data_file: str) -> None:
+    global _check_cycle_running
+    if _check_cycle_running:
+        # 上一轮尚未结束时不启动新一轮；到期的订阅源会在下一次调度时一并检查。
+        logger.warning("上一轮订阅源检查仍在进行，跳过本次调度。")
+        return
+
+    _check_cycle_running = True
+    profile_session = profiler.begin_cycle()
+    started_at = time.perf_counter()
+    try:
+        await _run_check_cycle(context, data_file)
+    finally:
+        _check_cycle_running = False
+        cycle_seconds = time.perf_counter() - started_at
+        metrics.CHECK_CYCLE_SECONDS.observe(cycle_seconds)
+        if profile_session is not None:
+            await profiler.end_cycle(profile_session, cycle_seconds)
+
+
+async def _run_check_cycle(context: ContextTypes.DEFAULT_TYPE, data_file: str) -> None:
     logger.info("正在运行定期订阅源检查...")
+    if data_manager.get_outbox():
+        # 先投递上一轮或重启前遗留的消息，无需重新拉取订阅源。
+        schedule_delivery(context, data_file)
+
     subscriptions_data = data_manager.get_subscriptions()
 
     if not subscriptions_data:
         logger.info("当前没有需要检查的订阅。")
         return
 
-    all_feed_checks = []
-    feed_check_targets = []
+    feed_urls = data_manager.get_subscribed_feed_urls()
+    if not feed_urls:
+        logger.info("订阅数据中没有可检查的订阅源。")
+        return
 
-    for chat_id, user_data in list(subscriptions_data.items()):
-        feeds = user_data.get("rss_feeds", {})
-        for feed_url, feed_config in list(feeds.items()):
-            feed_check_targets.append((chat_id, feed_url))
-            all_feed_checks.append(
-                check_single_feed(context, chat_id, feed_url, dict(feed_config), data_file)
+    now = time.time()
+    total_feed_count = len(feed_urls)
+    feed_groups: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+    # 按到期时间排序，上一轮被顺延的订阅源排在最前面；只为到期的订阅源复制订阅配置。
+    for feed_url in sorted(feed_urls, key=lambda url: data_manager.get_feed_state(url).get("next_check_at") or 0):
+        feed_state = data_manager.get_feed_state(feed_url)
+        subscribers = data_manager.get_feed_subscriptions(feed_url)
+        if subscribers and (
+            polling.is_due(feed_state, now)
+            or (
+                # 新订阅需要尽快初始化，但正在退避的失败订阅源不提前检查。
+                not feed_state.get("failure_count")
+                and not all(data_manager.is_feed_initialized(feed_config) for _, feed_config in subscribers)
             )
+        ):
+            feed_groups[feed_url] = [(chat_id, dict(feed_config)) for chat_id, feed_config in subscribers]
 
-    if not all_feed_checks:
-        logger.info("订阅数据中没有可检查的订阅源。")
+    if not feed_groups:
+        logger.info("本轮没有到期需要检查的订阅源 (共 %s 个)。", total_feed_count)
+        schedule_delivery(context, data_file)
         return
 
-    logger.info("计划检查 %s 个订阅源，将并发执行。", len(all_feed_checks))
-    results = await asyncio.gather(*all_feed_checks, return_exceptions=True)
+    subscription_count = sum(len(subscribers) for subscribers in feed_groups.values())
+    settings = _get_settings(context)
+    check_scheduler = scheduler.create_scheduler(settings)
+    logger.info(
+        "计划检查 %s/%s 个到期订阅源 (共 %s 个订阅)，全局并发上限 %s，单主机并发上限 %s。",
+        len(feed_groups),
+        total_feed_count,
+        subscription_count,
+        check_scheduler.max_concurrency,
+        check_scheduler.max_per_host,
+    )
+    dispatch_tasks: Dict[str, "asyncio.Task[Any]"] = {}
+    fetch_stats = FetchStats()
+
+    async def fetch_and_dispatch(feed_url: str, subscribers: List[Tuple[str, Dict[str, Any]]]) -> None:
+        feed_content = await _fetch_for_subscribers(context, feed_url, subscribers, fetch_stats)
+        # 推送交给独立任务，调度槽位只覆盖拉取与解析，不会被 Telegram 限流拖住。
+        dispatch_tasks[feed_url] = asyncio.ensure_future(
+            _dispatch_to_subscribers(context, feed_url, subscribers, feed_content, data_file)
+        )
+
+    fetch_results = await check_scheduler.run([
+        (
+            scheduler.get_host_key(feed_url),
+            functools.partial(fetch_and_dispatch, feed_url, subscribers),
+        )
+        for feed_url, subscribers in feed_groups.items()
+    ])
+    dispatch_outcomes = await asyncio.gather(*dispatch_tasks.values(), return_exceptions=True)
+    dispatch_results: Dict[str, List[Tuple[str, Optional[BaseException]]]] = {}
+    for feed_url, outcome in zip(dispatch_tasks, dispatch_outcomes):
+        if isinstance(outcome, BaseException):
+            # 单个订阅源分发出错时记为其全部订阅者失败，不影响其他订阅源的状态更新和落盘。
+            logger.error(
+                "分发订阅源 %s 时出错",
+                feed_url,
+                exc_info=(type(outcome), outcome, outcome.__traceback__),
+            )
+            outcome = [(chat_id, outcome) for chat_id, _ in feed_groups[feed_url]]
+        dispatch_results[feed_url] = outcome
+    # 先把新入队的消息和已读标记落盘，再开始投递。
+    await data_manager.flush(data_file)
+    schedule_delivery(context, data_file)
+
+    stats = check_scheduler.stats
+    logger.info(
+        "调度统计: 提交 %s 个任务，最大排队 %s，平均等待 %.2f 秒，最长等待 %.2f 秒，超时 %s 个，顺延 %s 个。",
+        stats.submitted,
+        stats.max_queue_depth,
+        stats.average_wait_seconds,
+        stats.max_wait_seconds,
+        stats.timed_out,
+        stats.deferred,
+    )
+    logger.info(
+        "解析统计: 解析 %s 个订阅源，304 跳过 %s 个，内容未变跳过 %s 个。",
+        fetch_stats.parsed,
+        fetch_stats.not_modified,
+        fetch_stats.unchanged,
+    )
+
+    finished_at = time.time()
+    bounds = polling.get_polling_bounds(settings)
+    for feed_url, result in zip(feed_groups, fetch_results):
+        if result is scheduler.DEFERRED:
+            # 未完成的订阅源保持到期状态，下一轮优先检查。
+            continue
+        feed_state = data_manager.get_feed_state(feed_url)
+        if isinstance(result, BaseException):
+            delay = _record_feed_failure(feed_url, result, bounds, finished_at)
+        else:
+            if data_manager.record_feed_success(feed_url, finished_at) >= polling.CIRCUIT_BREAK_FAILURES:
+                logger.info("订阅源 %s 已恢复，解除熔断。", feed_url)
+            delay = feed_state.get("interval_seconds", bounds["default"])
+        feed_state["next_check_at"] = finished_at + delay
+        data_manager.mark_feed_state_dirty(feed_url)
 
     error_count = 0
-    for (chat_id, feed_url), result in zip(feed_check_targets, results):
-        if isinstance(result, Exception):
-            error_count += 1
-            logger.error("订阅源检查失败: user=%s feed=%s error=%s", chat_id, feed_url, result)
+    for (feed_url, subscribers), result in zip(feed_groups.items(), fetch_results):
+        if result is scheduler.DEFERRED:
+            logger.info("订阅源 %s 在本轮截止时间内未完成，顺延到下一轮。", feed_url)
+            continue
+        if isinstance(result, asyncio.TimeoutError):
+            error_count += len(subscribers)
+            logger.error("订阅源检查超时: feed=%s subscribers=%s", feed_url, len(subscribers))
+            continue
+        if isinstance(result, BaseException):
+            error_count += len(subscribers)
+            logger.error(
+                "订阅源拉取失败: feed=%s subscribers=%s error=%s",
+                feed_url,
+                len(subscribers),
+                result,
+            )
+            continue
+
+        for chat_id, chat_error in dispatch_results.get(feed_url, ()):
+            if chat_error is not None:
+                error_count += 1
+                logger.error("订阅源检查失败: user=%s feed=%s error=%s", chat_id, feed_url, chat_error)
+
+    message_sender = sender.get_sender()
+    if message_sender is not None:
+        send_stats = message_sender.stats.snapshot(message_sender.queue_depth)
+        logger.info(
+            "发送统计: 已发送 %s 条，失败 %s 条，重试 %s 次，限流 %s 次，队列 %s 条，"
+            "平均 %.2f 条/秒，平均排队 %.2f 秒。",
+            send_stats["sent"],
+            send_stats["failed"],
+            send_stats["retried"],
+            send_stats["rate_limited"],
+            send_stats["queue_depth"],
+            send_stats["messages_per_second"],
+            send_stats["average_queue_seconds"],
+        )
+
+    await data_manager.flush(data_file)
 
     if error_count > 0:
-        logger.warning("本轮有 %s/%s 个订阅源检查失败。", error_count, len(all_feed_checks))
+        logger.warning("本轮有 %s/%s 个订阅检查失败。", error_count, subscription_count)
     else:
         logger.info("本轮所有订阅源检查已完成。")
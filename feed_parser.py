@@ -0,0 +1,380 @@
+import hashlib
+import logging
+import multiprocessing
+import re
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, wait
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import AbstractSet, Any, Dict, List, Optional
+from urllib.parse import urljoin, urlparse
+
+import feedparser
+
+import data_manager
+import keyword_filter
+import polling
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PARSE_WORKERS = 0
+PARSE_POOL_WARM_UP_TIMEOUT_SECONDS = 30
+FEED_INFO_FIELDS = ("title", "ttl", "sy_updateperiod", "sy_updatefrequency")
+
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_STOP_AFTER_KNOWN = 3
+
+_ATOM = "{http://www.w3.org/2005/Atom}"
+_CONTENT_ENCODED = "{http://purl.org/rss/1.0/modules/content/}encoded"
+_DC_DATE = "{http://purl.org/dc/elements/1.1/}date"
+_SY = "{http://purl.org/rss/1.0/modules/syndication/}"
+_XML_BASE = "{http://www.w3.org/XML/1998/namespace}base"
+# 频道级别的生成时间等字段每次请求都可能变化，但不影响条目内容。
+_VOLATILE_HEAD_FIELDS = re.compile(
+    rb"<((?:[\w-]+:)?(?:lastBuildDate|pubDate|updated|date|updateBase))\b[^>]*>.*?</\1\s*>",
+    re.DOTALL,
+)
+_XML_COMMENT = re.compile(rb"<!--.*?-->", re.DOTALL)
+_FIRST_ENTRY = re.compile(rb"<(?:[\w-]+:)?(?:item|entry)[\s>]")
+_FEED_INFO_TAGS = {
+    "title": "title",
+    _ATOM + "title": "title",
+    "ttl": "ttl",
+    _SY + "updatePeriod": "sy_updateperiod",
+    _SY + "updateFrequency": "sy_updatefrequency",
+}
+
+
+class FeedEntry:
+    __slots__ = ("key", "id", "title", "link", "match_fields", "published")
+
+    def __init__(
+        self,
+        key: str,
+        entry_id: Optional[str],
+        title: str,
+        link: str,
+        match_fields: keyword_filter.MatchFields,
+        published: Optional[float] = None
+    ) -> None:
+        self.key = key
+        self.id = entry_id
+        self.title = title
+        self.link = link
+        self.match_fields = match_fields
+        self.published = published
+
+    @property
+    def identity(self) -> Optional[str]:
+        return self.id or self.link or None
+
+
+class CompactFeed:
+    __slots__ = ("entries", "feed", "bozo", "bozo_exception", "latest_entry_id", "pruned_count")
+
+    def __init__(
+        self,
+        entries: List[FeedEntry],
+        feed: Dict[str, Any],
+        bozo: bool = False,
+        bozo_exception: Optional[str] = None,
+        latest_entry_id: Optional[str] = None,
+        pruned_count: int = 0
+    ) -> None:
+        self.entries = entries
+        self.feed = feed
+        self.bozo = bozo
+        self.bozo_exception = bozo_exception
+        self.latest_entry_id = latest_entry_id
+        self.pruned_count = pruned_count
+
+    def without_entries(self, keys: Any) -> "CompactFeed":
+        entries = [entry for entry in self.entries if entry.key not in keys]
+        return CompactFeed(
+            entries,
+            self.feed,
+            self.bozo,
+            self.bozo_exception,
+            self.latest_entry_id,
+            self.pruned_count + len(self.entries) - len(entries),
+        )
+
+
+def _get_raw_field(entry: Any, key: str) -> Any:
+    # 绕过 FeedParserDict 的字段别名，只取条目中真实存在的字段。
+    return dict.get(entry, key) if isinstance(entry, dict) else entry.get(key)
+
+
+def extract_entry(entry: Any) -> Optional[FeedEntry]:
+    entry_id = _get_raw_field(entry, "id") or None
+    link = _get_raw_field(entry, "link") or ""
+    title = entry.get("title", "") or ""
+
+    identity = entry_id or link
+    if not identity:
+        summary = entry.get("summary", "")
+        if not title and not summary:
+            return None
+        identity = f"{title}\n{summary}"
+
+    return FeedEntry(
+        data_manager.make_entry_key(str(identity)),
+        entry_id,
+        str(title),
+        str(link),
+        keyword_filter.build_match_fields(entry),
+        polling.get_entry_timestamp(entry),
+    )
+
+
+def compact_feed(parsed: Any) -> CompactFeed:
+    raw_entries = parsed.entries
+    latest_entry_id = None
+    if raw_entries:
+        latest_entry_id = _get_raw_field(raw_entries[0], "id") or _get_raw_field(raw_entries[0], "link") or None
+
+    # 只保留已读集合能覆盖的最新条目，其余条目和原始解析结果随即释放。
+    entries = []
+    for raw_entry in raw_entries[:data_manager.MAX_FEED_ENTRIES]:
+        entry = extract_entry(raw_entry)
+        if entry is not None:
+            entries.append(entry)
+
+    skipped = min(len(raw_entries), data_manager.MAX_FEED_ENTRIES) - len(entries)
+    if skipped:
+        logger.warning("订阅源中有 %s 个无法识别的条目，已跳过。", skipped)
+
+    feed_info = getattr(parsed, "feed", None) or {}
+    bozo = bool(getattr(parsed, "bozo", False))
+    return CompactFeed(
+        entries,
+        {key: feed_info[key] for key in FEED_INFO_FIELDS if key in feed_info},
+        bozo,
+        str(getattr(parsed, "bozo_exception", None)) if bozo else None,
+        latest_entry_id,
+    )
+
+
+def hash_feed_body(content: bytes) -> str:
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+def hash_normalized_feed_body(content: bytes) -> str:
+    # 去掉注释和第一个条目之前的易变时间字段后再计算哈希，条目本身保持原样。
+    content = _XML_COMMENT.sub(b"", content)
+    first_entry = _FIRST_ENTRY.search(content)
+    split_at = first_entry.start() if first_entry else len(content)
+    head = _VOLATILE_HEAD_FIELDS.sub(b"", content[:split_at])
+    return hashlib.blake2b(head + content[split_at:], digest_size=16).hexdigest()
+
+
+class _UnsupportedFeed(Exception):
+    pass
+
+
+def _resolve_uri(base_url: str, value: Optional[str]) -> str:
+    # 与 feedparser 保持一致：相对地址按 Content-Location 解析，绝对地址原样保留。
+    value = (value or "").strip()
+    if not value or not base_url or urlparse(value).scheme:
+        return value
+    return urljoin(base_url, value)
+
+
+def _element_text(element: Optional[ET.Element]) -> str:
+    if element is None:
+        return ""
+    if len(element):
+        # 内嵌 XHTML 等结构化内容交给 feedparser 处理。
+        raise _UnsupportedFeed()
+    return (element.text or "").strip()
+
+
+def _parse_timestamp(value: str) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        if value[:4].isdigit():
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def _stream_rss_item(element: ET.Element, base_url: str) -> FeedEntry:
+    if element.find(_ATOM + "link") is not None:
+        raise _UnsupportedFeed()
+
+    entry_id = None
+    link = _resolve_uri(base_url, _element_text(element.find("link")))
+    guid = element.find("guid")
+    if guid is not None:
+        is_permalink = {key.lower(): value for key, value in guid.attrib.items()}.get("ispermalink", "true")
+        if is_permalink not in ("true", "false"):
+            raise _UnsupportedFeed()
+        entry_id = _element_text(guid)
+        if entry_id and is_permalink == "true":
+            entry_id = _resolve_uri(base_url, entry_id)
+            link = link or entry_id
+
+    title = _element_text(element.find("title"))
+    summary = _element_text(element.find("description"))
+    content = _element_text(element.find(_CONTENT_ENCODED))
+    published = _element_text(element.find("pubDate")) or _element_text(element.find(_DC_DATE))
+    return _build_stream_entry(entry_id, link, title, summary, content, published)
+
+
+def _stream_atom_entry(element: ET.Element, base_url: str) -> FeedEntry:
+    link = ""
+    for link_element in element.findall(_ATOM + "link"):
+        if link_element.get("rel", "alternate") == "alternate":
+            link = _resolve_uri(base_url, link_element.get("href"))
+            break
+
+    entry_id = _resolve_uri(base_url, _element_text(element.find(_ATOM + "id"))) or None
+    title = _element_text(element.find(_ATOM + "title"))
+    summary = _element_text(element.find(_ATOM + "summary"))
+    content = _element_text(element.find(_ATOM + "content"))
+    published = _element_text(element.find(_ATOM + "published")) or _element_text(element.find(_ATOM + "updated"))
+    return _build_stream_entry(entry_id, link, title, summary, content, published)
+
+
+def _build_stream_entry(
+    entry_id: Optional[str],
+    link: str,
+    title: str,
+    summary: str,
+    content: str,
+    published: str
+) -> FeedEntry:
+    identity = entry_id or link
+    if not identity:
+        # 没有 id 和链接的条目依赖 feedparser 清洗后的标题和摘要生成键，这里无法保证一致。
+        raise _UnsupportedFeed()
+    return FeedEntry(
+        data_manager.make_entry_key(identity),
+        entry_id,
+        title,
+        link,
+        # feedparser 在缺少摘要时以正文充当摘要，这里保持相同的匹配文本。
+        keyword_filter.MatchFields(title.lower(), f"{summary or content} {content}".lower()),
+        _parse_timestamp(published),
+    )
+
+
+def stream_parse_feed(content: bytes, base_url: str, known_keys: AbstractSet[str]) -> Optional[CompactFeed]:
+    # 增量解析 RSS 2.0 / Atom，连续遇到若干已知条目后停止读取剩余文档；
+    # 无法保证与 feedparser 结果一致时返回 None，由调用方回退到完整解析。
+    parser = ET.XMLPullParser(events=("start", "end"))
+    tag_stack: List[str] = []
+    entries: List[FeedEntry] = []
+    feed_info: Dict[str, str] = {}
+    known_run = 0
+
+    try:
+        for offset in range(0, len(content), STREAM_CHUNK_SIZE):
+            parser.feed(content[offset:offset + STREAM_CHUNK_SIZE])
+            for event, element in parser.read_events():
+                if event == "start":
+                    if not tag_stack and element.tag not in ("rss", _ATOM + "feed"):
+                        return None
+                    if _XML_BASE in element.attrib:
+                        return None
+                    tag_stack.append(element.tag)
+                    continue
+
+                tag_stack.pop()
+                parent = tag_stack[-1] if tag_stack else None
+                if element.tag == "item" and parent == "channel":
+                    entry = _stream_rss_item(element, base_url)
+                elif element.tag == _ATOM + "entry" and parent == _ATOM + "feed":
+                    entry = _stream_atom_entry(element, base_url)
+                else:
+                    if parent in ("channel", _ATOM + "feed") and element.tag in _FEED_INFO_TAGS:
+                        feed_info.setdefault(_FEED_INFO_TAGS[element.tag], _element_text(element))
+                    continue
+
+                element.clear()
+                entries.append(entry)
+                known_run = known_run + 1 if entry.key in known_keys else 0
+                if known_run >= STREAM_STOP_AFTER_KNOWN or len(entries) >= data_manager.MAX_FEED_ENTRIES:
+                    logger.debug("读取 %s 字节后提前结束解析。", offset + STREAM_CHUNK_SIZE)
+                    return _build_stream_feed(entries, feed_info)
+        parser.close()
+    except (ET.ParseError, _UnsupportedFeed):
+        return None
+    return _build_stream_feed(entries, feed_info)
+
+
+def _build_stream_feed(entries: List[FeedEntry], feed_info: Dict[str, str]) -> CompactFeed:
+    return CompactFeed(entries, feed_info, latest_entry_id=entries[0].identity if entries else None)
+
+
+def parse_feed_bytes(
+    content: bytes,
+    response_headers: Dict[str, str],
+    known_keys: Optional[AbstractSet[str]] = None
+) -> CompactFeed:
+    # 可在工作进程中执行：只把检查所需的字段传回，避免序列化完整的 FeedParserDict。
+    if known_keys:
+        streamed = stream_parse_feed(content, response_headers.get("content-location", ""), known_keys)
+        if streamed is not None:
+            return streamed
+    return compact_feed(feedparser.parse(content, response_headers=response_headers))
+
+
+class ParsePool(ProcessPoolExecutor):
+    def __init__(self, workers: int, mp_context: Any) -> None:
+        super().__init__(max_workers=workers, mp_context=mp_context)
+        # 记下创建时的工作进程数，预热时不依赖 ProcessPoolExecutor 的私有属性。
+        self.workers = workers
+
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+
+
+def create_parse_pool(settings: Dict[str, Any]) -> Optional[ParsePool]:
+    try:
+        workers = int(settings.get("parse_workers", DEFAULT_PARSE_WORKERS))
+    except (TypeError, ValueError):
+        workers = DEFAULT_PARSE_WORKERS
+    if workers <= 0:
+        return None
+
+    # fork 会把事件循环、SQLite 连接和网络套接字复制进工作进程；forkserver 从干净的服务进程派生。
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    logger.info("订阅源解析将使用 %s 个工作进程 (%s)。", workers, start_method)
+    return ParsePool(workers, multiprocessing.get_context(start_method))
+
+
+def _warm_up_worker() -> None:
+    # 工作进程反序列化本函数时会导入 feed_parser 和 feedparser。
+    return None
+
+
+def warm_up_parse_pool(pool: Optional[ParsePool]) -> None:
+    # 在事件循环启动前拉起全部工作进程，避免第一轮检查承担进程启动和模块导入的开销。
+    if pool is None:
+        return
+    futures = [pool.submit(_warm_up_worker) for _ in range(pool.workers)]
+    done, not_done = wait(futures, timeout=PARSE_POOL_WARM_UP_TIMEOUT_SECONDS)
+    if not_done:
+        logger.warning("有 %s 个解析工作进程未能在 %s 秒内启动。", len(not_done), PARSE_POOL_WARM_UP_TIMEOUT_SECONDS)
+    for future in done:
+        if future.exception() is not None:
+            logger.error("解析工作进程启动失败: %s", future.exception())
+
+
+def set_parse_pool(pool: Optional[ProcessPoolExecutor]) -> None:
+    global _parse_pool
+    _parse_pool = pool
+
+
+def get_parse_pool() -> Optional[ProcessPoolExecutor]:
+    return _parse_pool
+
+
+def close_parse_pool() -> None:
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=False, cancel_futures=True)
+        _parse_pool = None
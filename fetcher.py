@@ -0,0 +1,187 @@
+import abc
+import logging
+from typing import Any, Callable, Dict, Optional, Union
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT_SECONDS = 30.0
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 4
+DEFAULT_DNS_CACHE_SECONDS = 300
+DEFAULT_MAX_FEED_BYTES = 20 * 1024 * 1024
+
+HTTP_NOT_MODIFIED = 304
+ACCEPT_HEADER = (
+    "application/rss+xml, application/atom+xml, application/rdf+xml, "
+    "application/xml;q=0.9, text/xml;q=0.9, */*;q=0.1"
+)
+USER_AGENT = "RSS_Bot (+https://github.com/Hamster-Prime/RSS_Bot)"
+
+
+class FeedTooLargeError(Exception):
+    pass
+
+
+class FetchResult:
+    def __init__(
+        self,
+        url: str,
+        status: int,
+        content: bytes = b"",
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.url = url
+        self.status = status
+        self.content = content
+        self.headers = headers or {}
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == HTTP_NOT_MODIFIED
+
+    @property
+    def etag(self) -> Optional[str]:
+        return self.headers.get("etag") or None
+
+    @property
+    def modified(self) -> Optional[str]:
+        return self.headers.get("last-modified") or None
+
+
+class FeedFetcher(abc.ABC):
+    @abc.abstractmethod
+    async def fetch(
+        self,
+        url: str,
+        etag: Optional[str] = None,
+        modified: Optional[str] = None
+    ) -> FetchResult:
+        ...
+
+    async def close(self) -> None:
+        return None
+
+
+class AiohttpFeedFetcher(FeedFetcher):
+    def __init__(
+        self,
+        timeout_seconds: float = DEFAULT_TIMEOUT_SECONDS,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_connections_per_host: int = DEFAULT_MAX_CONNECTIONS_PER_HOST,
+        dns_cache_seconds: int = DEFAULT_DNS_CACHE_SECONDS,
+        max_feed_bytes: int = DEFAULT_MAX_FEED_BYTES,
+    ) -> None:
+        self.timeout_seconds = timeout_seconds
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.dns_cache_seconds = dns_cache_seconds
+        self.max_feed_bytes = max_feed_bytes
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # ClientSession 必须在事件循环内创建，因此延迟到第一次请求时再初始化。
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections_per_host,
+                ttl_dns_cache=self.dns_cache_seconds,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout_seconds),
+                headers={"User-Agent": USER_AGENT, "Accept": ACCEPT_HEADER},
+            )
+        return self._session
+
+    async def fetch(
+        self,
+        url: str,
+        etag: Optional[str] = None,
+        modified: Optional[str] = None
+    ) -> FetchResult:
+        request_headers = {}
+        if etag:
+            request_headers["If-None-Match"] = etag
+        if modified:
+            request_headers["If-Modified-Since"] = modified
+
+        session = self._get_session()
+        async with session.get(url, headers=request_headers) as response:
+            headers = {key.lower(): value for key, value in response.headers.items()}
+            if response.status == HTTP_NOT_MODIFIED:
+                return FetchResult(str(response.url), response.status, headers=headers)
+
+            response.raise_for_status()
+
+            if response.content_length and response.content_length > self.max_feed_bytes:
+                raise FeedTooLargeError(f"{url} 的响应大小 {response.content_length} 超出限制")
+
+            chunks = []
+            received = 0
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                received += len(chunk)
+                if received > self.max_feed_bytes:
+                    raise FeedTooLargeError(f"{url} 的响应大小超出限制 {self.max_feed_bytes}")
+                chunks.append(chunk)
+
+            return FetchResult(str(response.url), response.status, b"".join(chunks), headers)
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+_fetcher: Optional[FeedFetcher] = None
+
+
+def _read_setting(
+    settings: Dict[str, Any],
+    key: str,
+    default: Union[int, float],
+    convert: Callable[[Any], Union[int, float]],
+    minimum: Union[int, float],
+) -> Union[int, float]:
+    value = settings.get(key, default)
+    try:
+        number = convert(value)
+    except (TypeError, ValueError, OverflowError):
+        number = None
+    # 写成 not >= 让 NaN 也回退到默认值。
+    if number is None or not number >= minimum:
+        logger.warning(f"无效的 {key}: {value}。默认为 {default}。")
+        return default
+    return number
+
+
+def create_fetcher(settings: Dict[str, Any]) -> FeedFetcher:
+    return AiohttpFeedFetcher(
+        timeout_seconds=_read_setting(settings, "fetch_timeout_seconds", DEFAULT_TIMEOUT_SECONDS, float, 0.001),
+        max_connections=_read_setting(settings, "max_connections", DEFAULT_MAX_CONNECTIONS, int, 1),
+        max_connections_per_host=_read_setting(
+            settings, "max_connections_per_host", DEFAULT_MAX_CONNECTIONS_PER_HOST, int, 1
+        ),
+        dns_cache_seconds=_read_setting(settings, "dns_cache_seconds", DEFAULT_DNS_CACHE_SECONDS, int, 0),
+    )
+
+
+def set_fetcher(fetcher: Optional[FeedFetcher]) -> None:
+    global _fetcher
+    _fetcher = fetcher
+
+
+def get_fetcher() -> FeedFetcher:
+    global _fetcher
+    if _fetcher is None:
+        _fetcher = AiohttpFeedFetcher()
+    return _fetcher
+
+
+async def close_fetcher() -> None:
+    if _fetcher is not None:
+        try:
+            await _fetcher.close()
+        except Exception as e:
+            logger.warning(f"关闭 HTTP 连接池时出错: {e}")
@@ -1,10 +1,15 @@
 import logging
-import asyncio
+import os
+import time
 from urllib.parse import urlparse
 from typing import Optional, Dict, Any
 from telegram import Update
 from telegram.ext import ContextTypes
 import data_manager
+import digest
+import keyword_filter
+import polling
+import profiler
 
 logger = logging.getLogger(__name__)
 
@@ -38,16 +43,15 @@ def ensure_user_data(chat_id: str, subscriptions_data: Dict[str, Any]) -> None:
 
 
 def find_feed_by_identifier(
-    feed_identifier: str,
-    feeds: Dict[str, Any]
+    chat_id: str,
+    feed_identifier: str
 ) -> Optional[str]:
     if feed_identifier.isdigit():
-        feed_index = int(feed_identifier) - 1
-        feed_list = list(feeds.keys())
-        if 0 <= feed_index < len(feed_list):
-            return feed_list[feed_index]
+        feed_url = data_manager.get_chat_feed_url(chat_id, int(feed_identifier) - 1)
+        if feed_url is not None:
+            return feed_url
     
-    if feed_identifier in feeds:
+    if feed_identifier in data_manager.get_subscriptions().get(chat_id, {}).get("rss_feeds", {}):
         return feed_identifier
     
     return None
@@ -76,8 +80,12 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         "/removekeyword <RSS链接或ID> <关键词> - 从订阅中移除关键词过滤器\n"
         "/listkeywords <RSS链接或ID> - 列出特定订阅的关键词\n"
         "/removeallkeywords <RSS链接或ID> - 移除特定订阅的所有关键词\n"
+        "/setfilter <RSS链接或ID> <表达式> - 为订阅设置过滤表达式 (支持 OR、-排除、title:/content: 字段、\"短语\"、/正则/)\n"
+        "/clearfilter <RSS链接或ID> - 清除订阅的过滤表达式\n"
         "/setfooter [自定义文本] - 设置推送到此聊天的消息的自定义页脚 (不带文本则清除)\n"
-        "/togglepreview - 切换推送消息中链接预览的显示/隐藏"
+        "/togglepreview - 切换推送消息中链接预览的显示/隐藏\n"
+        "/digest [off|feed|chat] [分钟] - 设置摘要模式，将多条更新合并为一条消息 (可选按分钟间隔汇总)\n"
+        "/brokenfeeds - 列出检查失败或已熔断的订阅源"
     )
     await update.message.reply_text(help_text)
 
@@ -101,18 +109,20 @@ async def add_feed(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await update.message.reply_text(f"订阅源 {feed_url} 已在您的订阅中。")
         return
 
-    if hasattr(asyncio, 'to_thread'):
-        feed_title = await asyncio.to_thread(data_manager.get_feed_title, feed_url) or "未知标题"
-    else:
-        loop = asyncio.get_event_loop()
-        feed_title = await loop.run_in_executor(None, data_manager.get_feed_title, feed_url) or "未知标题"
+    feed_title = await data_manager.fetch_feed_title(feed_url) or data_manager.UNKNOWN_FEED_TITLE
     
-    subscriptions_data[chat_id]["rss_feeds"][feed_url] = {
+    data_manager.add_subscription(chat_id, feed_url, {
         "title": feed_title,
         "keywords": [],
+        "filter": None,
+        "seen_entries": [],
         "last_entry_id": None
-    }
-    data_manager.save_subscriptions(context.bot_data.get('data_file', 'data/subscriptions.json'))
+    })
+    if feed_title == data_manager.UNKNOWN_FEED_TITLE:
+        data_manager.mark_title_pending(chat_id, feed_url)
+    data_manager.mark_chat_dirty(chat_id)
+    data_manager.mark_feed_dirty(chat_id, feed_url)
+    data_manager.request_save(context.bot_data.get('data_file', 'data/subscriptions.json'))
     
     reply_message_text = f"订阅源 '{feed_title}' ({feed_url}) 添加成功！"
     await update.message.reply_text(reply_message_text)
@@ -133,7 +143,8 @@ async def list_feeds(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         title = data.get('title', 'N/A')
         keywords_list = data.get('keywords', [])
         keywords_str = f" (关键词: {', '.join(keywords_list)})" if keywords_list else ""
-        message_content += f"{i}. {title} - {url}{keywords_str}\n"
+        filter_str = f" (过滤: {data['filter']})" if data.get('filter') else ""
+        message_content += f"{i}. {title} - {url}{keywords_str}{filter_str}\n"
     
     await update.message.reply_text(message_content)
 
@@ -153,13 +164,14 @@ async def remove_feed(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         await update.message.reply_text("您没有任何订阅可以移除。")
         return
 
-    feed_to_remove = find_feed_by_identifier(identifier, feeds)
+    feed_to_remove = find_feed_by_identifier(chat_id, identifier)
 
     if feed_to_remove:
         removed_title = feeds[feed_to_remove].get('title', feed_to_remove)
-        del subscriptions_data[chat_id]["rss_feeds"][feed_to_remove]
+        data_manager.remove_subscription(chat_id, feed_to_remove)
+        data_manager.mark_feed_dirty(chat_id, feed_to_remove)
 
-        data_manager.save_subscriptions(context.bot_data.get('data_file', 'data/subscriptions.json'))
+        data_manager.request_save(context.bot_data.get('data_file', 'data/subscriptions.json'))
         reply_message_text = f"订阅源 '{removed_title}' 移除成功。"
         logger.info(f"用户 {chat_id} 移除了订阅源: {feed_to_remove}")
     else:
@@ -184,7 +196,7 @@ async def add_keyword(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         await update.message.reply_text("您没有任何订阅可以添加关键词。")
         return
 
-    target_feed_url = find_feed_by_identifier(feed_identifier, feeds)
+    target_feed_url = find_feed_by_identifier(chat_id, feed_identifier)
 
     if not target_feed_url:
         await update.message.reply_text(f"找不到标识符为 '{feed_identifier}' 的订阅源。请使用 /list 查看。")
@@ -199,7 +211,8 @@ async def add_keyword(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         await update.message.reply_text(f"关键词 '{keyword_to_add}' 已存在于 '{feed_title}'。")
     else:
         feed_data["keywords"].append(keyword_to_add)
-        data_manager.save_subscriptions(context.bot_data.get('data_file', 'data/subscriptions.json'))
+        data_manager.mark_feed_dirty(chat_id, target_feed_url)
+        data_manager.request_save(context.bot_data.get('data_file', 'data/subscriptions.json'))
         feed_title = feed_data.get('title', target_feed_url)
         await update.message.reply_text(f"关键词 '{keyword_to_add}' 已添加到 '{feed_title}'。")
         logger.info(f"用户 {chat_id} 向订阅源 {target_feed_url} 添加了关键词 '{keyword_to_add}'")
@@ -221,7 +234,7 @@ async def remove_keyword(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await update.message.reply_text("您没有任何订阅可以移除关键词。")
         return
 
-    target_feed_url = find_feed_by_identifier(feed_identifier, feeds)
+    target_feed_url = find_feed_by_identifier(chat_id, feed_identifier)
 
     if not target_feed_url:
         await update.message.reply_text(f"找不到标识符为 '{feed_identifier}' 的订阅源。请使用 /list 查看。")
@@ -232,7 +245,8 @@ async def remove_keyword(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     if keyword_to_remove in feed_data.get("keywords", []):
         feed_data["keywords"].remove(keyword_to_remove)
-        data_manager.save_subscriptions(context.bot_data.get('data_file', 'data/subscriptions.json'))
+        data_manager.mark_feed_dirty(chat_id, target_feed_url)
+        data_manager.request_save(context.bot_data.get('data_file', 'data/subscriptions.json'))
         await update.message.reply_text(f"关键词 '{keyword_to_remove}' 已从 '{feed_title}' 移除。")
         logger.info(f"用户 {chat_id} 从订阅源 {target_feed_url} 移除了关键词 '{keyword_to_remove}'")
     else:
@@ -254,7 +268,7 @@ async def list_keywords(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         await update.message.reply_text("您没有任何订阅。")
         return
 
-    target_feed_url = find_feed_by_identifier(feed_identifier, feeds)
+    target_feed_url = find_feed_by_identifier(chat_id, feed_identifier)
 
     if not target_feed_url:
         await update.message.reply_text(f"找不到标识符为 '{feed_identifier}' 的订阅源。请使用 /list 查看。")
@@ -287,7 +301,7 @@ async def remove_all_keywords(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text("您没有任何订阅。")
         return
 
-    target_feed_url = find_feed_by_identifier(feed_identifier, feeds)
+    target_feed_url = find_feed_by_identifier(chat_id, feed_identifier)
 
     if not target_feed_url:
         await update.message.reply_text(f"找不到标识符为 '{feed_identifier}' 的订阅源。请使用 /list 查看。")
@@ -298,13 +312,86 @@ async def remove_all_keywords(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     if feed_data.get("keywords"):
         feed_data["keywords"] = []
-        data_manager.save_subscriptions(context.bot_data.get('data_file', 'data/subscriptions.json'))
+        data_manager.mark_feed_dirty(chat_id, target_feed_url)
+        data_manager.request_save(context.bot_data.get('data_file', 'data/subscriptions.json'))
         await update.message.reply_text(f"已成功移除订阅源 '{feed_title}' 的所有关键词。")
         logger.info(f"用户 {chat_id} 移除了订阅源 {target_feed_url} 的所有关键词。")
     else:
         await update.message.reply_text(f"订阅源 '{feed_title}' 原本就没有设置关键词。")
 
 
+async def set_filter(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    chat_id = get_chat_id(update)
+
+    if len(context.args) < 2:
+        await update.message.reply_text("用法: /setfilter <RSS链接或ID> <表达式>")
+        return
+
+    feed_identifier = context.args[0]
+    filter_expression = " ".join(context.args[1:]).strip()
+    subscriptions_data = data_manager.get_subscriptions()
+    feeds = subscriptions_data.get(chat_id, {}).get("rss_feeds", {})
+
+    if not feeds:
+        await update.message.reply_text("您没有任何订阅可以设置过滤表达式。")
+        return
+
+    target_feed_url = find_feed_by_identifier(chat_id, feed_identifier)
+
+    if not target_feed_url:
+        await update.message.reply_text(f"找不到标识符为 '{feed_identifier}' 的订阅源。请使用 /list 查看。")
+        return
+
+    try:
+        keyword_filter.compile_filter(filter_expression)
+    except keyword_filter.FilterSyntaxError as e:
+        await update.message.reply_text(f"过滤表达式无效: {e}")
+        return
+
+    feed_data = subscriptions_data[chat_id]["rss_feeds"][target_feed_url]
+    feed_data["filter"] = filter_expression
+    data_manager.mark_feed_dirty(chat_id, target_feed_url)
+    data_manager.request_save(context.bot_data.get('data_file', 'data/subscriptions.json'))
+
+    feed_title = feed_data.get('title', target_feed_url)
+    await update.message.reply_text(f"'{feed_title}' 的过滤表达式已设置为: {filter_expression}")
+    logger.info(f"用户 {chat_id} 为订阅源 {target_feed_url} 设置了过滤表达式 '{filter_expression}'")
+
+
+async def clear_filter(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    chat_id = get_chat_id(update)
+
+    if not context.args:
+        await update.message.reply_text("用法: /clearfilter <RSS链接或ID>")
+        return
+
+    feed_identifier = context.args[0]
+    subscriptions_data = data_manager.get_subscriptions()
+    feeds = subscriptions_data.get(chat_id, {}).get("rss_feeds", {})
+
+    if not feeds:
+        await update.message.reply_text("您没有任何订阅。")
+        return
+
+    target_feed_url = find_feed_by_identifier(chat_id, feed_identifier)
+
+    if not target_feed_url:
+        await update.message.reply_text(f"找不到标识符为 '{feed_identifier}' 的订阅源。请使用 /list 查看。")
+        return
+
+    feed_data = subscriptions_data[chat_id]["rss_feeds"][target_feed_url]
+    feed_title = feed_data.get('title', target_feed_url)
+
+    if feed_data.get("filter"):
+        feed_data["filter"] = None
+        data_manager.mark_feed_dirty(chat_id, target_feed_url)
+        data_manager.request_save(context.bot_data.get('data_file', 'data/subscriptions.json'))
+        await update.message.reply_text(f"已清除订阅源 '{feed_title}' 的过滤表达式。")
+        logger.info(f"用户 {chat_id} 清除了订阅源 {target_feed_url} 的过滤表达式。")
+    else:
+        await update.message.reply_text(f"订阅源 '{feed_title}' 原本就没有设置过滤表达式。")
+
+
 async def set_custom_footer(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = get_chat_id(update)
     subscriptions_data = data_manager.get_subscriptions()
@@ -312,7 +399,8 @@ async def set_custom_footer(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     footer_text = " ".join(context.args) if context.args else None
     subscriptions_data[chat_id]["custom_footer"] = footer_text
-    data_manager.save_subscriptions(context.bot_data.get('data_file', 'data/subscriptions.json'))
+    data_manager.mark_chat_dirty(chat_id)
+    data_manager.request_save(context.bot_data.get('data_file', 'data/subscriptions.json'))
 
     if footer_text:
         reply_message_text = f"自定义页脚已设置为: \n{footer_text}"
@@ -331,7 +419,8 @@ async def toggle_link_preview(update: Update, context: ContextTypes.DEFAULT_TYPE
     current_status = subscriptions_data[chat_id].get("link_preview_enabled", True)
     new_status = not current_status
     subscriptions_data[chat_id]["link_preview_enabled"] = new_status
-    data_manager.save_subscriptions(context.bot_data.get('data_file', 'data/subscriptions.json'))
+    data_manager.mark_chat_dirty(chat_id)
+    data_manager.request_save(context.bot_data.get('data_file', 'data/subscriptions.json'))
 
     status_text = "开启" if new_status else "关闭"
     reply_message_text = f"链接预览已切换为: {status_text}。"
@@ -339,3 +428,107 @@ async def toggle_link_preview(update: Update, context: ContextTypes.DEFAULT_TYPE
     logger.info(f"用户 {chat_id} 将链接预览切换为: {status_text}")
     await update.message.reply_text(reply_message_text)
 
+
+def _describe_digest_settings(user_config: Dict[str, Any]) -> str:
+    digest_mode = digest.normalize_digest_mode(user_config.get("digest_mode"))
+    if digest_mode == "off":
+        return "摘要模式: 关闭 (每条更新单独推送)"
+
+    mode_text = "按订阅源合并" if digest_mode == "feed" else "全部订阅源合并"
+    interval = digest.normalize_digest_interval(user_config.get("digest_interval_minutes"))
+    interval_text = f"每 {interval} 分钟汇总一次" if interval else "每轮检查后发送"
+    return f"摘要模式: {mode_text}，{interval_text}"
+
+
+async def set_digest_mode(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    chat_id = get_chat_id(update)
+    subscriptions_data = data_manager.get_subscriptions()
+    ensure_user_data(chat_id, subscriptions_data)
+    user_config = subscriptions_data[chat_id]
+
+    if not context.args:
+        await update.message.reply_text(
+            f"{_describe_digest_settings(user_config)}\n"
+            "用法: /digest <off|feed|chat> [分钟]"
+        )
+        return
+
+    digest_mode = context.args[0].strip().lower()
+    if digest_mode not in digest.DIGEST_MODES:
+        await update.message.reply_text("无效的摘要模式。可选值: off、feed、chat。")
+        return
+
+    interval = 0
+    if len(context.args) > 1:
+        if not context.args[1].isdigit():
+            await update.message.reply_text("摘要间隔必须是以分钟为单位的非负整数。")
+            return
+        interval = digest.normalize_digest_interval(context.args[1])
+
+    user_config["digest_mode"] = digest_mode
+    user_config["digest_interval_minutes"] = interval
+    user_config["digest_next_at"] = None
+    data_manager.mark_chat_dirty(chat_id)
+    data_manager.request_save(context.bot_data.get('data_file', 'data/subscriptions.json'))
+
+    logger.info(f"用户 {chat_id} 将摘要模式设置为: {digest_mode} (间隔 {interval} 分钟)")
+    await update.message.reply_text(f"已更新。{_describe_digest_settings(user_config)}。")
+
+
+def _format_timestamp(timestamp: Optional[float]) -> str:
+    if not timestamp:
+        return "从未"
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp))
+
+
+async def list_broken_feeds(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    chat_id = get_chat_id(update)
+    failing_feeds = data_manager.get_failing_feeds(chat_id)
+
+    if not failing_feeds:
+        await update.message.reply_text("您的订阅源目前都能正常检查。")
+        return
+
+    message_content = "以下订阅源最近检查失败:\n"
+    for i, (url, data, feed_state) in enumerate(failing_feeds, 1):
+        status = "已熔断，每天探测一次" if polling.is_circuit_open(feed_state) else "退避重试中"
+        message_content += (
+            f"{i}. {data.get('title', 'N/A')} - {url}\n"
+            f"   状态: {status}，连续失败 {feed_state['failure_count']} 次\n"
+            f"   最近错误: {feed_state.get('last_error') or '未知'}\n"
+            f"   上次成功: {_format_timestamp(feed_state.get('last_success_at'))}\n"
+        )
+
+    await update.message.reply_text(message_content)
+
+
+def is_admin_chat(chat_id: str, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    admin_chat_ids = context.bot_data.get('config', {}).get('admin_chat_ids') or []
+    return chat_id in {str(admin_chat_id) for admin_chat_id in admin_chat_ids}
+
+
+async def profile_check_cycles(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    chat_id = get_chat_id(update)
+    if not is_admin_chat(chat_id, context):
+        await update.message.reply_text("此命令仅限管理员使用。")
+        return
+
+    cycles = profiler.DEFAULT_PROFILE_CYCLES
+    if context.args:
+        if not context.args[0].isdigit() or int(context.args[0]) < 1:
+            await update.message.reply_text(
+                f"用法: /profile [轮数]，轮数为 1-{profiler.MAX_PROFILE_CYCLES} 的整数。"
+            )
+            return
+        cycles = min(int(context.args[0]), profiler.MAX_PROFILE_CYCLES)
+
+    data_file = context.bot_data.get('data_file', 'data/subscriptions.json')
+    output_dir = os.path.dirname(data_file) or "data"
+    if not profiler.request_profile(cycles, output_dir):
+        await update.message.reply_text("已有一个性能分析正在进行，请等待其完成。")
+        return
+
+    logger.info(f"管理员 {chat_id} 请求对接下来的 {cycles} 轮检查进行性能分析")
+    await update.message.reply_text(
+        f"将对接下来的 {cycles} 轮订阅源检查进行性能分析，完成后结果会写入 {output_dir}/profile-*.json 和 .prof 文件。"
+    )
@@ -0,0 +1,208 @@
+import logging
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METRICS_HOST = "127.0.0.1"
+DEFAULT_LATENCY_BUCKETS = (
+    0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    __slots__ = ("name", "help", "value")
+
+    def __init__(self, name: str, help_text: str) -> None:
+        self.name = name
+        self.help = help_text
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} counter",
+            f"{self.name} {_format_value(self.value)}",
+        ]
+
+
+class LabeledCounter:
+    __slots__ = ("name", "help", "label", "values")
+
+    def __init__(self, name: str, help_text: str, label: str) -> None:
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.values: Dict[str, float] = {}
+
+    def inc(self, label_value: str, amount: float = 1) -> None:
+        self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_value, value in list(self.values.items()):
+            lines.append(f'{self.name}{{{self.label}="{_escape_label(label_value)}"}} {_format_value(value)}')
+        return lines
+
+
+class Gauge:
+    __slots__ = ("name", "help", "value", "callback")
+
+    def __init__(self, name: str, help_text: str, callback: Optional[Callable[[], float]] = None) -> None:
+        self.name = name
+        self.help = help_text
+        self.value = 0.0
+        self.callback = callback
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def render(self) -> List[str]:
+        value = self.value
+        if self.callback is not None:
+            try:
+                value = self.callback()
+            except Exception:
+                logger.exception("读取指标 %s 时出错", self.name)
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {_format_value(value)}",
+        ]
+
+
+class Histogram:
+    __slots__ = ("name", "help", "bounds", "counts", "sum", "count")
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.help = help_text
+        self.bounds = tuple(sorted(buckets))
+        # 最后一个位置对应 +Inf；只记录每个区间的计数，输出时再累加。
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), list(self.counts)):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{_format_value(bound)}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {_format_value(self.sum)}")
+        lines.append(f"{self.name}_count {cumulative}")
+        return lines
+
+
+_registry: Dict[str, Any] = {}
+
+
+def _register(metric: Any) -> Any:
+    existing = _registry.get(metric.name)
+    if existing is not None:
+        return existing
+    _registry[metric.name] = metric
+    return metric
+
+
+def counter(name: str, help_text: str) -> Counter:
+    return _register(Counter(name, help_text))
+
+
+def labeled_counter(name: str, help_text: str, label: str) -> LabeledCounter:
+    return _register(LabeledCounter(name, help_text, label))
+
+
+def gauge(name: str, help_text: str, callback: Optional[Callable[[], float]] = None) -> Gauge:
+    return _register(Gauge(name, help_text, callback))
+
+
+def histogram(name: str, help_text: str, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help_text, buckets))
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in list(_registry.values()):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+CHECK_CYCLE_SECONDS = histogram("rss_check_cycle_seconds", "Duration of a full check_feeds_job cycle.")
+FETCH_SECONDS = histogram("rss_fetch_seconds", "Time spent downloading a feed.")
+PARSE_SECONDS = histogram("rss_parse_seconds", "Time spent parsing a downloaded feed.")
+MATCH_SECONDS = histogram("rss_match_seconds", "Time spent matching one entry against keywords and filters.")
+DISPATCH_SECONDS = histogram("rss_dispatch_seconds", "Time spent processing one feed for all of its subscribers.")
+DELIVER_SECONDS = histogram("rss_outbox_delivery_seconds", "Time spent delivering the outbox.")
+SAVE_SECONDS = histogram("rss_save_seconds", "Time spent writing pending changes to storage.")
+TELEGRAM_SEND_SECONDS = histogram("telegram_send_seconds", "Latency of Telegram send_message calls.")
+
+FEEDS_FETCHED = counter("rss_feeds_fetched_total", "Feed downloads that returned a body.")
+FEEDS_NOT_MODIFIED = counter("rss_feeds_not_modified_total", "Feed downloads answered with 304.")
+FEEDS_UNCHANGED = counter("rss_feeds_unchanged_total", "Feed parses skipped because the body hash did not change.")
+FEED_FAILURES = counter("rss_feed_failures_total", "Feed checks that failed or timed out.")
+FEED_BYTES = labeled_counter("rss_feed_bytes_total", "Bytes downloaded per feed.", "feed")
+MESSAGES_SENT = counter("telegram_messages_sent_total", "Messages delivered to Telegram.")
+MESSAGES_FAILED = counter("telegram_messages_failed_total", "Messages that could not be delivered.")
+SEND_QUEUE_DEPTH = gauge("telegram_send_queue_depth", "Messages waiting in the send queue.")
+
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(body=render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+
+_runner: Optional[web.AppRunner] = None
+
+
+def get_metrics_address(settings: Dict[str, Any]) -> Optional[Tuple[str, int]]:
+    port = settings.get("metrics_port")
+    if not port:
+        return None
+    try:
+        port = int(port)
+    except (TypeError, ValueError):
+        logger.warning("无效的 metrics_port: %s，指标接口不会启动。", port)
+        return None
+    return str(settings.get("metrics_host", DEFAULT_METRICS_HOST)), port
+
+
+async def start_metrics_server(host: str, port: int) -> None:
+    global _runner
+    if _runner is not None:
+        return
+
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    _runner = runner
+    logger.info("指标接口已启动: http://%s:%s/metrics", host, port)
+
+
+async def stop_metrics_server() -> None:
+    global _runner
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
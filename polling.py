@@ -0,0 +1,128 @@
+import calendar
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+DEFAULT_CHECK_INTERVAL_SECONDS = 300
+DEFAULT_MIN_CHECK_INTERVAL_SECONDS = 60
+DEFAULT_MAX_CHECK_INTERVAL_SECONDS = 6 * 60 * 60
+
+LEARNING_SAMPLE_SIZE = 20
+POLLS_PER_UPDATE = 2
+
+CIRCUIT_BREAK_FAILURES = 10
+CIRCUIT_PROBE_INTERVAL_SECONDS = 24 * 60 * 60
+
+SY_UPDATE_PERIOD_SECONDS = {
+    "hourly": 60 * 60,
+    "daily": 24 * 60 * 60,
+    "weekly": 7 * 24 * 60 * 60,
+    "monthly": 30 * 24 * 60 * 60,
+    "yearly": 365 * 24 * 60 * 60,
+}
+
+_MAX_AGE_PATTERN = re.compile(r"(?:^|[,\s])(?:s-)?max-age\s*=\s*(\d+)", re.IGNORECASE)
+
+
+def get_polling_bounds(settings: Dict[str, Any]) -> Dict[str, int]:
+    default_interval = settings.get("check_interval_seconds", DEFAULT_CHECK_INTERVAL_SECONDS)
+    if not isinstance(default_interval, int) or default_interval <= 0:
+        default_interval = DEFAULT_CHECK_INTERVAL_SECONDS
+
+    min_interval = settings.get("min_check_interval_seconds", DEFAULT_MIN_CHECK_INTERVAL_SECONDS)
+    if not isinstance(min_interval, int) or min_interval <= 0:
+        min_interval = DEFAULT_MIN_CHECK_INTERVAL_SECONDS
+
+    max_interval = settings.get("max_check_interval_seconds", DEFAULT_MAX_CHECK_INTERVAL_SECONDS)
+    if not isinstance(max_interval, int) or max_interval < min_interval:
+        max_interval = max(min_interval, DEFAULT_MAX_CHECK_INTERVAL_SECONDS)
+
+    return {
+        "default": min(max(default_interval, min_interval), max_interval),
+        "min": min_interval,
+        "max": max_interval,
+    }
+
+
+def get_entry_timestamp(entry: Any) -> Optional[float]:
+    parsed_time = entry.get("published_parsed") or entry.get("updated_parsed")
+    if not parsed_time:
+        return None
+    try:
+        return float(calendar.timegm(parsed_time))
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def learn_update_interval(timestamps: List[float], now: Optional[float] = None) -> Optional[float]:
+    if len(timestamps) < 2:
+        return None
+
+    now = time.time() if now is None else now
+    ordered = sorted((ts for ts in timestamps if ts <= now), reverse=True)
+    if len(ordered) < 2:
+        return None
+
+    gaps = sorted(newer - older for newer, older in zip(ordered, ordered[1:]) if newer > older)
+    if not gaps:
+        return None
+
+    typical_gap = gaps[len(gaps) // 2]
+    # 最近一次更新已经过去很久时，说明订阅源变慢了，以静默时长为准。
+    quiet_for = now - ordered[0]
+    return max(typical_gap, quiet_for) / POLLS_PER_UPDATE
+
+
+def get_publisher_hint_seconds(feed_info: Any, headers: Optional[Dict[str, str]] = None) -> Optional[float]:
+    hints = []
+
+    cache_control = (headers or {}).get("cache-control", "")
+    match = _MAX_AGE_PATTERN.search(cache_control)
+    if match:
+        hints.append(float(match.group(1)))
+
+    if feed_info:
+        ttl = feed_info.get("ttl")
+        try:
+            if ttl is not None and int(ttl) > 0:
+                hints.append(int(ttl) * 60.0)
+        except (TypeError, ValueError):
+            pass
+
+        update_period = str(feed_info.get("sy_updateperiod", "")).strip().lower()
+        if update_period in SY_UPDATE_PERIOD_SECONDS:
+            try:
+                frequency = max(1, int(feed_info.get("sy_updatefrequency", 1)))
+            except (TypeError, ValueError):
+                frequency = 1
+            hints.append(SY_UPDATE_PERIOD_SECONDS[update_period] / frequency)
+
+    return max(hints) if hints else None
+
+
+def compute_poll_interval(
+    bounds: Dict[str, int],
+    learned_seconds: Optional[float] = None,
+    hint_seconds: Optional[float] = None,
+) -> int:
+    interval = learned_seconds if learned_seconds is not None else bounds["default"]
+    if hint_seconds is not None:
+        interval = max(interval, hint_seconds)
+    return int(min(max(interval, bounds["min"]), bounds["max"]))
+
+
+def is_circuit_open(feed_state: Dict[str, Any]) -> bool:
+    return feed_state.get("failure_count", 0) >= CIRCUIT_BREAK_FAILURES
+
+
+def compute_failure_backoff(bounds: Dict[str, int], failure_count: int) -> int:
+    # 连续失败时按默认间隔指数退避，最长不超过检查间隔上限；熔断后每天只探测一次。
+    if failure_count >= CIRCUIT_BREAK_FAILURES:
+        return max(CIRCUIT_PROBE_INTERVAL_SECONDS, bounds["max"])
+    backoff = bounds["default"] * 2 ** max(failure_count - 1, 0)
+    return int(min(max(backoff, bounds["min"]), bounds["max"]))
+
+
+def is_due(feed_state: Dict[str, Any], now: float) -> bool:
+    next_check_at = feed_state.get("next_check_at")
+    return not next_check_at or next_check_at <= now
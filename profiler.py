@@ -0,0 +1,252 @@
+import asyncio
+import cProfile
+import json
+import logging
+import os
+import pstats
+import signal
+import time
+from typing import Any, Dict, List, Optional
+
+import feed_parser
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_CYCLES = 1
+MAX_PROFILE_CYCLES = 20
+LAG_SAMPLE_INTERVAL_SECONDS = 0.1
+TOP_FUNCTIONS = 50
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _sample_thread_pool(loop: asyncio.AbstractEventLoop) -> Optional[Dict[str, int]]:
+    # asyncio.to_thread 使用事件循环的默认线程池；这些都是私有属性，取不到时跳过采样。
+    executor = getattr(loop, "_default_executor", None)
+    if executor is None:
+        return None
+    work_queue = getattr(executor, "_work_queue", None)
+    idle_semaphore = getattr(executor, "_idle_semaphore", None)
+    threads = len(getattr(executor, "_threads", ()))
+    idle = getattr(idle_semaphore, "_value", 0) if idle_semaphore is not None else 0
+    return {
+        "queued": work_queue.qsize() if work_queue is not None else 0,
+        "busy": max(0, threads - idle),
+        "max_workers": getattr(executor, "_max_workers", 0),
+    }
+
+
+def _sample_parse_pool() -> Optional[Dict[str, int]]:
+    pool = feed_parser.get_parse_pool()
+    if pool is None:
+        return None
+    pending = len(getattr(pool, "_pending_work_items", ()))
+    max_workers = getattr(pool, "workers", 0)
+    return {
+        "queued": max(0, pending - max_workers),
+        "busy": min(pending, max_workers),
+        "max_workers": max_workers,
+    }
+
+
+def _summarize_pool(samples: List[Dict[str, int]]) -> Optional[Dict[str, Any]]:
+    if not samples:
+        return None
+    saturated = sum(
+        1 for sample in samples
+        if sample["queued"] > 0 or (sample["max_workers"] and sample["busy"] >= sample["max_workers"])
+    )
+    return {
+        "samples": len(samples),
+        "max_workers": max(sample["max_workers"] for sample in samples),
+        "max_busy": max(sample["busy"] for sample in samples),
+        "mean_busy": sum(sample["busy"] for sample in samples) / len(samples),
+        "max_queued": max(sample["queued"] for sample in samples),
+        "saturated_fraction": saturated / len(samples),
+    }
+
+
+def _summarize_lag(samples: List[float]) -> Dict[str, Any]:
+    sorted_samples = sorted(samples)
+    return {
+        "samples": len(samples),
+        "interval_seconds": LAG_SAMPLE_INTERVAL_SECONDS,
+        "mean_seconds": sum(samples) / len(samples) if samples else 0.0,
+        "p50_seconds": _percentile(sorted_samples, 0.5),
+        "p95_seconds": _percentile(sorted_samples, 0.95),
+        "p99_seconds": _percentile(sorted_samples, 0.99),
+        "max_seconds": sorted_samples[-1] if sorted_samples else 0.0,
+    }
+
+
+def _top_functions(profile: cProfile.Profile) -> List[Dict[str, Any]]:
+    stats = pstats.Stats(profile)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE)
+    top = []
+    for function in stats.fcn_list[:TOP_FUNCTIONS]:
+        primitive_calls, total_calls, total_time, cumulative_time, _ = stats.stats[function]
+        file_name, line, name = function
+        top.append({
+            "function": f"{file_name}:{line}({name})",
+            "calls": total_calls,
+            "primitive_calls": primitive_calls,
+            "total_seconds": total_time,
+            "cumulative_seconds": cumulative_time,
+        })
+    return top
+
+
+class ProfileSession:
+    def __init__(self, cycles: int, output_dir: str) -> None:
+        self.cycles = cycles
+        self.remaining = cycles
+        self.output_dir = output_dir
+        self.profile = cProfile.Profile()
+        self.started_at: Optional[float] = None
+        self.cycle_seconds: List[float] = []
+        self.lag_samples: List[float] = []
+        self.thread_pool_samples: List[Dict[str, int]] = []
+        self.parse_pool_samples: List[Dict[str, int]] = []
+        self._monitor_task: Optional[asyncio.Task] = None
+
+    def start_monitor(self) -> None:
+        if self._monitor_task is None:
+            self.started_at = time.time()
+            self._monitor_task = asyncio.get_running_loop().create_task(self._monitor())
+
+    async def stop_monitor(self) -> None:
+        if self._monitor_task is None:
+            return
+        self._monitor_task.cancel()
+        try:
+            await self._monitor_task
+        except asyncio.CancelledError:
+            pass
+        self._monitor_task = None
+
+    async def _monitor(self) -> None:
+        # 定时睡眠并记录实际唤醒的延迟：回调阻塞事件循环越久，唤醒越晚。
+        loop = asyncio.get_running_loop()
+        while True:
+            expected_at = loop.time() + LAG_SAMPLE_INTERVAL_SECONDS
+            await asyncio.sleep(LAG_SAMPLE_INTERVAL_SECONDS)
+            self.lag_samples.append(max(0.0, loop.time() - expected_at))
+            thread_pool = _sample_thread_pool(loop)
+            if thread_pool is not None:
+                self.thread_pool_samples.append(thread_pool)
+            parse_pool = _sample_parse_pool()
+            if parse_pool is not None:
+                self.parse_pool_samples.append(parse_pool)
+
+    def build_report(self) -> Dict[str, Any]:
+        return {
+            "started_at": self.started_at,
+            "finished_at": time.time(),
+            "cycles": self.cycles,
+            "cycle_seconds": self.cycle_seconds,
+            "event_loop_lag": _summarize_lag(self.lag_samples),
+            "thread_pool": _summarize_pool(self.thread_pool_samples),
+            "parse_pool": _summarize_pool(self.parse_pool_samples),
+            "top_functions": _top_functions(self.profile),
+        }
+
+    def write(self) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        base_name = os.path.join(
+            self.output_dir,
+            time.strftime("profile-%Y%m%d-%H%M%S", time.localtime(self.started_at)),
+        )
+        self.profile.dump_stats(f"{base_name}.prof")
+        with open(f"{base_name}.json", "w", encoding="utf-8") as f:
+            json.dump(self.build_report(), f, ensure_ascii=False, indent=2)
+        return f"{base_name}.json"
+
+
+_session: Optional[ProfileSession] = None
+
+
+def request_profile(cycles: int, output_dir: str) -> bool:
+    global _session
+    if _session is not None:
+        logger.warning("已有一个性能分析正在进行，忽略新的请求。")
+        return False
+
+    cycles = max(1, min(int(cycles), MAX_PROFILE_CYCLES))
+    _session = ProfileSession(cycles, output_dir)
+    logger.info("将对接下来的 %s 轮订阅源检查进行性能分析。", cycles)
+    return True
+
+
+def is_profiling() -> bool:
+    return _session is not None
+
+
+def begin_cycle() -> Optional[ProfileSession]:
+    # 未请求分析时只读取一个模块变量，对检查周期没有额外开销。
+    session = _session
+    if session is None:
+        return None
+    try:
+        session.profile.enable()
+    except ValueError as e:
+        # 同一进程中已有其他分析器在运行时 cProfile 无法启用。
+        logger.error("无法启动性能分析: %s", e)
+        _clear_session()
+        return None
+    session.start_monitor()
+    return session
+
+
+async def end_cycle(session: ProfileSession, cycle_seconds: float) -> Optional[str]:
+    global _session
+    session.profile.disable()
+    session.cycle_seconds.append(cycle_seconds)
+    session.remaining -= 1
+    if session.remaining > 0:
+        return None
+
+    await session.stop_monitor()
+    if _session is session:
+        _session = None
+    try:
+        # 汇总和写文件可能耗时较长，放到线程中执行以免阻塞事件循环。
+        report_file = await asyncio.to_thread(session.write)
+    except Exception:
+        logger.exception("写入性能分析结果时出错")
+        return None
+    logger.info("性能分析已完成，结果已写入 %s", report_file)
+    return report_file
+
+
+def install_signal_handler(output_dir: str, cycles: int = DEFAULT_PROFILE_CYCLES) -> bool:
+    if not hasattr(signal, "SIGUSR1"):
+        return False
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, request_profile, cycles, output_dir)
+    except (NotImplementedError, RuntimeError):
+        return False
+    logger.info("收到 SIGUSR1 时将对下一轮订阅源检查进行性能分析。")
+    return True
+
+
+def remove_signal_handler() -> None:
+    if not hasattr(signal, "SIGUSR1"):
+        return
+    try:
+        asyncio.get_running_loop().remove_signal_handler(signal.SIGUSR1)
+    except (NotImplementedError, RuntimeError):
+        pass
+
+
+def _clear_session() -> None:
+    global _session
+    if _session is not None:
+        _session.profile.disable()
+        if _session._monitor_task is not None:
+            _session._monitor_task.cancel()
+    _session = None
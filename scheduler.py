@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENT_CHECKS = 20
+DEFAULT_MAX_CHECKS_PER_HOST = 2
+DEFAULT_CYCLE_DEADLINE_SECONDS = 120.0
+DEFAULT_JOB_TIMEOUT_SECONDS = 60.0
+
+# 截止时间到达时仍未开始的任务，其结果位置上放置此标记。
+DEFERRED = object()
+
+JobFactory = Callable[[], Awaitable[Any]]
+
+
+def get_host_key(url: str) -> str:
+    try:
+        return (urlparse(url).hostname or url).lower()
+    except ValueError:
+        return url
+
+
+class SchedulerStats:
+    def __init__(self) -> None:
+        self.submitted = 0
+        self.completed = 0
+        self.max_queue_depth = 0
+        self.deferred = 0
+        self.timed_out = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    @property
+    def average_wait_seconds(self) -> float:
+        if not self.completed:
+            return 0.0
+        return self.total_wait_seconds / self.completed
+
+    def record_wait(self, wait_seconds: float) -> None:
+        self.total_wait_seconds += wait_seconds
+        if wait_seconds > self.max_wait_seconds:
+            self.max_wait_seconds = wait_seconds
+
+
+class CheckScheduler:
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENT_CHECKS,
+        max_per_host: int = DEFAULT_MAX_CHECKS_PER_HOST,
+        cycle_deadline_seconds: Optional[float] = None,
+        job_timeout_seconds: Optional[float] = None,
+    ) -> None:
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_per_host = max(1, int(max_per_host))
+        self.cycle_deadline_seconds = cycle_deadline_seconds
+        self.job_timeout_seconds = job_timeout_seconds
+        self.stats = SchedulerStats()
+        self._pending: Dict[str, Deque[Tuple[int, JobFactory, float]]] = {}
+        self._host_order: Deque[str] = deque()
+        self._active: Dict[str, int] = {}
+        self._queue_depth = 0
+        self._condition: Optional[asyncio.Condition] = None
+        self._deadline: Optional[float] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue_depth
+
+    def _get_job_timeout(self) -> Tuple[Optional[float], bool]:
+        # 返回 (超时时间, 是否受本轮截止时间限制)。
+        timeout = self.job_timeout_seconds
+        if self._deadline is None:
+            return timeout, False
+        remaining = max(self._deadline - time.monotonic(), 0.0)
+        if timeout is None or remaining < timeout:
+            return remaining, True
+        return timeout, False
+
+    def _is_past_deadline(self) -> bool:
+        return self._deadline is not None and time.monotonic() >= self._deadline
+
+    def _take_next(self) -> Optional[Tuple[str, int, JobFactory, float]]:
+        if self._is_past_deadline():
+            return None
+        # 按主机轮转取任务，同一主机的任务不会集中在一起执行。
+        for _ in range(len(self._host_order)):
+            host = self._host_order[0]
+            self._host_order.rotate(-1)
+            host_queue = self._pending.get(host)
+            if not host_queue:
+                continue
+            if self._active.get(host, 0) >= self.max_per_host:
+                continue
+
+            index, factory, enqueued_at = host_queue.popleft()
+            if not host_queue:
+                del self._pending[host]
+                self._host_order.remove(host)
+            self._active[host] = self._active.get(host, 0) + 1
+            self._queue_depth -= 1
+            return host, index, factory, enqueued_at
+        return None
+
+    async def _worker(self, results: List[Any]) -> None:
+        assert self._condition is not None
+        while True:
+            async with self._condition:
+                while True:
+                    job = self._take_next()
+                    if job is not None or not self._pending or self._is_past_deadline():
+                        break
+                    await self._condition.wait()
+
+            if job is None:
+                return
+
+            host, index, factory, enqueued_at = job
+            self.stats.record_wait(time.monotonic() - enqueued_at)
+            timeout, limited_by_deadline = self._get_job_timeout()
+            try:
+                results[index] = await asyncio.wait_for(factory(), timeout=timeout)
+            except asyncio.TimeoutError as e:
+                if limited_by_deadline:
+                    # 被本轮截止时间打断的任务与未开始的任务一样顺延到下一轮。
+                    self.stats.deferred += 1
+                    results[index] = DEFERRED
+                else:
+                    self.stats.timed_out += 1
+                    results[index] = e
+            except Exception as e:
+                results[index] = e
+            finally:
+                async with self._condition:
+                    self._active[host] -= 1
+                    self.stats.completed += 1
+                    self._condition.notify_all()
+
+    async def run(self, jobs: Sequence[Tuple[str, JobFactory]]) -> List[Any]:
+        self._condition = asyncio.Condition()
+        results: List[Any] = [DEFERRED] * len(jobs)
+        enqueued_at = time.monotonic()
+        self._deadline = None
+        if self.cycle_deadline_seconds is not None:
+            self._deadline = enqueued_at + self.cycle_deadline_seconds
+
+        for index, (host, factory) in enumerate(jobs):
+            if host not in self._pending:
+                self._pending[host] = deque()
+                self._host_order.append(host)
+            self._pending[host].append((index, factory, enqueued_at))
+
+        self._queue_depth = len(jobs)
+        self.stats.submitted += len(jobs)
+        self.stats.max_queue_depth = max(self.stats.max_queue_depth, self._queue_depth)
+
+        worker_count = min(self.max_concurrency, len(jobs))
+        if worker_count:
+            await asyncio.gather(*(self._worker(results) for _ in range(worker_count)))
+
+        if self._pending:
+            # 截止时间后未开始的任务留到下一轮，不与下一轮的任务叠加执行。
+            self.stats.deferred += self._queue_depth
+            self._pending.clear()
+            self._host_order.clear()
+            self._queue_depth = 0
+        return results
+
+
+def _get_positive_seconds(settings: Dict[str, Any], key: str, default: float) -> float:
+    try:
+        seconds = float(settings.get(key, default))
+    except (TypeError, ValueError):
+        return default
+    return seconds if seconds > 0 else default
+
+
+def create_scheduler(settings: Dict[str, Any]) -> CheckScheduler:
+    return CheckScheduler(
+        max_concurrency=settings.get("max_concurrent_checks", DEFAULT_MAX_CONCURRENT_CHECKS),
+        max_per_host=settings.get("max_checks_per_host", DEFAULT_MAX_CHECKS_PER_HOST),
+        cycle_deadline_seconds=_get_positive_seconds(
+            settings, "cycle_deadline_seconds", DEFAULT_CYCLE_DEADLINE_SECONDS
+        ),
+        job_timeout_seconds=_get_positive_seconds(
+            settings, "feed_timeout_seconds", DEFAULT_JOB_TIMEOUT_SECONDS
+        ),
+    )
@@ -0,0 +1,320 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from telegram import error as tg_error
+
+import metrics
+import retry_utils
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GLOBAL_MESSAGES_PER_SECOND = 30.0
+DEFAULT_CHAT_MESSAGES_PER_SECOND = 1.0
+DEFAULT_GROUP_MESSAGES_PER_MINUTE = 20.0
+DEFAULT_MAX_IN_FLIGHT = 30
+# 单条消息因限流累计等待超过此时长时不再排队，而是把 RetryAfter 交给调用方（发件箱会保留该消息）。
+DEFAULT_MAX_RETRY_AFTER_SECONDS = 10.0
+IDLE_WAIT_SECONDS = 1.0
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated_at", "paused_until")
+
+    def __init__(self, rate: float, capacity: float, now: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic() if now is None else now
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+    def wait_time(self, now: float) -> float:
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, now: float, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = min(self.tokens, 0.0)
+
+
+class _OutgoingMessage:
+    __slots__ = ("chat_id", "kwargs", "future", "attempts", "rate_limited_seconds", "enqueued_at")
+
+    def __init__(self, chat_id: str, kwargs: Dict[str, Any], future: "asyncio.Future[Any]") -> None:
+        self.chat_id = chat_id
+        self.kwargs = kwargs
+        self.future = future
+        self.attempts = 0
+        self.rate_limited_seconds = 0.0
+        self.enqueued_at = time.monotonic()
+
+
+class SenderStats:
+    def __init__(self) -> None:
+        self.started_at = time.monotonic()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.rate_limited = 0
+        self.total_queue_seconds = 0.0
+
+    def snapshot(self, queue_depth: int) -> Dict[str, float]:
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "rate_limited": self.rate_limited,
+            "queue_depth": queue_depth,
+            "messages_per_second": self.sent / elapsed,
+            "average_queue_seconds": self.total_queue_seconds / self.sent if self.sent else 0.0,
+        }
+
+
+class MessageSender:
+    def __init__(
+        self,
+        bot: Any,
+        global_rate: float = DEFAULT_GLOBAL_MESSAGES_PER_SECOND,
+        chat_rate: float = DEFAULT_CHAT_MESSAGES_PER_SECOND,
+        group_rate_per_minute: float = DEFAULT_GROUP_MESSAGES_PER_MINUTE,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        max_retries: int = retry_utils.DEFAULT_MAX_RETRIES,
+        max_retry_after_seconds: float = DEFAULT_MAX_RETRY_AFTER_SECONDS,
+    ) -> None:
+        self.bot = bot
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate_per_minute / 60.0
+        self.max_retries = max_retries
+        self.max_retry_after_seconds = max_retry_after_seconds
+        self.stats = SenderStats()
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets: Dict[str, TokenBucket] = {}
+        self._queues: Dict[str, Deque[_OutgoingMessage]] = {}
+        self._rotation: Deque[str] = deque()
+        self._in_flight = asyncio.Semaphore(max(1, max_in_flight))
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._deliveries: set = set()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _get_chat_bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # 群组和频道的 chat_id 为负数，Telegram 对其限制为每分钟约 20 条。
+            rate = self.group_rate if chat_id.startswith("-") else self.chat_rate
+            bucket = TokenBucket(rate, 1.0)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _enqueue(self, message: _OutgoingMessage, front: bool = False) -> None:
+        queue = self._queues.get(message.chat_id)
+        if queue is None:
+            queue = deque()
+            self._queues[message.chat_id] = queue
+            self._rotation.append(message.chat_id)
+        if front:
+            queue.appendleft(message)
+        else:
+            queue.append(message)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def send(self, chat_id: Any, **kwargs: Any) -> Any:
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        chat_key = str(chat_id)
+        self._enqueue(_OutgoingMessage(chat_key, {"chat_id": chat_id, **kwargs}, future))
+        return await future
+
+    def start(self) -> None:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch_loop())
+
+    async def stop(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        if self._deliveries:
+            await asyncio.gather(*self._deliveries, return_exceptions=True)
+        for queue in self._queues.values():
+            for message in queue:
+                if not message.future.done():
+                    message.future.set_exception(RuntimeError("消息发送队列已关闭"))
+        self._queues.clear()
+        self._rotation.clear()
+
+    def _take_next(self, now: float) -> "tuple[Optional[_OutgoingMessage], float]":
+        global_wait = self._global_bucket.wait_time(now)
+        if global_wait > 0:
+            return None, global_wait
+
+        shortest_wait = IDLE_WAIT_SECONDS
+        # 按聊天轮转，每个聊天每轮最多取一条，避免单个聊天的积压拖慢其他聊天。
+        for _ in range(len(self._rotation)):
+            chat_id = self._rotation[0]
+            self._rotation.rotate(-1)
+            queue = self._queues.get(chat_id)
+            if not queue:
+                continue
+
+            chat_bucket = self._get_chat_bucket(chat_id)
+            chat_wait = chat_bucket.wait_time(now)
+            if chat_wait > 0:
+                shortest_wait = min(shortest_wait, chat_wait)
+                continue
+
+            message = queue.popleft()
+            if not queue:
+                del self._queues[chat_id]
+                self._rotation.remove(chat_id)
+            chat_bucket.consume(now)
+            self._global_bucket.consume(now)
+            return message, 0.0
+        return None, shortest_wait
+
+    async def _dispatch_loop(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            message, wait_seconds = self._take_next(time.monotonic())
+            if message is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._in_flight.acquire()
+            task = asyncio.get_running_loop().create_task(self._deliver(message))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, message: _OutgoingMessage) -> None:
+        try:
+            if message.future.done():
+                return
+            started_at = time.perf_counter()
+            try:
+                result = await self.bot.send_message(**message.kwargs)
+            finally:
+                metrics.TELEGRAM_SEND_SECONDS.observe(time.perf_counter() - started_at)
+        except Exception as e:
+            self._handle_failure(message, e)
+        else:
+            self.stats.sent += 1
+            metrics.MESSAGES_SENT.inc()
+            self.stats.total_queue_seconds += time.monotonic() - message.enqueued_at
+            if not message.future.done():
+                message.future.set_result(result)
+        finally:
+            self._in_flight.release()
+
+    def _handle_failure(self, message: _OutgoingMessage, exc: Exception) -> None:
+        now = time.monotonic()
+        message.attempts += 1
+
+        if isinstance(exc, tg_error.RetryAfter):
+            # 限流时暂停该聊天与全局令牌桶，而不是在发送任务中睡眠。
+            retry_after = float(exc.retry_after)
+            self.stats.rate_limited += 1
+            self._get_chat_bucket(message.chat_id).pause(now, retry_after)
+            self._global_bucket.pause(now, min(retry_after, 1.0))
+            message.rate_limited_seconds += retry_after
+            if message.rate_limited_seconds <= self.max_retry_after_seconds and message.attempts <= self.max_retries:
+                logger.warning("聊天 %s 触发 Telegram 限流，%.1f 秒后重试。", message.chat_id, retry_after)
+                self._enqueue(message, front=True)
+                return
+            # 长时间限流时不让调用方一直等待；令牌桶保持暂停，消息由调用方留到之后重试。
+            logger.warning(
+                "聊天 %s 触发 Telegram 限流 %.1f 秒，超过单条消息的等待上限，交由调用方稍后重试。",
+                message.chat_id,
+                retry_after,
+            )
+            if not message.future.done():
+                message.future.set_exception(exc)
+            return
+
+        if retry_utils.is_retryable_error(exc) and message.attempts <= self.max_retries:
+            delay = min(
+                retry_utils.DEFAULT_INITIAL_DELAY * (retry_utils.DEFAULT_BACKOFF_FACTOR ** (message.attempts - 1)),
+                retry_utils.DEFAULT_MAX_DELAY,
+            )
+            self.stats.retried += 1
+            logger.warning(
+                "向聊天 %s 发送消息失败 (%s: %s)，%.2f 秒后重试 (%s/%s)",
+                message.chat_id,
+                type(exc).__name__,
+                exc,
+                delay,
+                message.attempts,
+                self.max_retries,
+            )
+            self._get_chat_bucket(message.chat_id).pause(now, delay)
+            self._enqueue(message, front=True)
+            return
+
+        self.stats.failed += 1
+        metrics.MESSAGES_FAILED.inc()
+        logger.error("向聊天 %s 发送消息失败 %s: %s", message.chat_id, type(exc).__name__, exc)
+        if not message.future.done():
+            message.future.set_exception(exc)
+
+
+_sender: Optional[MessageSender] = None
+
+
+def create_sender(bot: Any, settings: Dict[str, Any]) -> MessageSender:
+    return MessageSender(
+        bot,
+        global_rate=float(settings.get("global_messages_per_second", DEFAULT_GLOBAL_MESSAGES_PER_SECOND)),
+        chat_rate=float(settings.get("chat_messages_per_second", DEFAULT_CHAT_MESSAGES_PER_SECOND)),
+        group_rate_per_minute=float(
+            settings.get("group_messages_per_minute", DEFAULT_GROUP_MESSAGES_PER_MINUTE)
+        ),
+    )
+
+
+def set_sender(message_sender: Optional[MessageSender]) -> None:
+    global _sender
+    _sender = message_sender
+
+
+def get_sender() -> Optional[MessageSender]:
+    return _sender
+
+
+def _get_queue_depth() -> int:
+    return _sender.queue_depth if _sender is not None else 0
+
+
+metrics.SEND_QUEUE_DEPTH.callback = _get_queue_depth
+
+
+async def close_sender() -> None:
+    if _sender is not None:
+        await _sender.stop()
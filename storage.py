@@ -0,0 +1,397 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import AbstractSet, Any, Dict, Iterable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+SQLITE_EXTENSIONS = {".db", ".sqlite", ".sqlite3"}
+SCHEMA_VERSION = "1"
+
+FeedKey = Tuple[str, str]
+
+
+def get_feed_state_file(data_file: str) -> str:
+    root, ext = os.path.splitext(data_file)
+    return f"{root}.state{ext or '.json'}"
+
+
+def get_outbox_file(data_file: str) -> str:
+    root, ext = os.path.splitext(data_file)
+    return f"{root}.outbox{ext or '.json'}"
+
+
+def write_json_atomic(target_file: str, payload: Any, indent: Optional[int] = 4) -> None:
+    temp_file = f"{target_file}.tmp"
+
+    try:
+        data_dir = os.path.dirname(target_file)
+        if data_dir:
+            os.makedirs(data_dir, exist_ok=True)
+
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=indent, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(temp_file, target_file)
+    except Exception:
+        if os.path.exists(temp_file):
+            try:
+                os.remove(temp_file)
+            except OSError:
+                logger.warning("清理临时文件失败: %s", temp_file)
+        raise
+
+
+def _read_json_file(path: str) -> Any:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _split_user_config(user_config: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    settings = {key: value for key, value in user_config.items() if key != "rss_feeds"}
+    return settings, user_config.get("rss_feeds", {})
+
+
+class JsonStorage:
+    incremental = False
+
+    def __init__(self, data_file: str) -> None:
+        self.data_file = data_file
+        self.state_file = get_feed_state_file(data_file)
+        self.outbox_file = get_outbox_file(data_file)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.data_file)
+
+    def load_subscriptions(self) -> Any:
+        return _read_json_file(self.data_file)
+
+    def load_feed_states(self) -> Any:
+        if not os.path.exists(self.state_file):
+            return {}
+        return _read_json_file(self.state_file)
+
+    def save_subscriptions(
+        self,
+        subscriptions: Dict[str, Dict[str, Any]],
+        dirty_chats: Optional[Set[str]] = None,
+        dirty_feeds: Optional[Set[FeedKey]] = None,
+    ) -> None:
+        # JSON 文件无法局部更新，脏标记只用于判断是否需要写入。
+        write_json_atomic(self.data_file, subscriptions)
+
+    def save_feed_states(
+        self,
+        feed_states: Dict[str, Dict[str, Any]],
+        dirty_urls: Optional[Set[str]] = None,
+    ) -> None:
+        write_json_atomic(self.state_file, feed_states, indent=None)
+
+    def load_outbox(self) -> Any:
+        if not os.path.exists(self.outbox_file):
+            return {}
+        return _read_json_file(self.outbox_file)
+
+    def save_outbox(
+        self,
+        outbox: Dict[str, Dict[str, Any]],
+        dirty_keys: Optional[Set[str]] = None,
+    ) -> None:
+        write_json_atomic(self.outbox_file, outbox, indent=None)
+
+    def close(self) -> None:
+        return None
+
+
+class SqliteStorage:
+    incremental = True
+
+    def __init__(self, db_file: str, legacy_json_file: Optional[str] = None) -> None:
+        self.data_file = db_file
+        self.legacy_json_file = legacy_json_file
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            data_dir = os.path.dirname(self.data_file)
+            if data_dir:
+                os.makedirs(data_dir, exist_ok=True)
+            conn = sqlite3.connect(self.data_file, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+                CREATE TABLE IF NOT EXISTS chats (
+                    chat_id TEXT PRIMARY KEY,
+                    settings TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS feeds (
+                    chat_id TEXT NOT NULL,
+                    feed_url TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (chat_id, feed_url)
+                );
+                CREATE TABLE IF NOT EXISTS feed_states (
+                    feed_url TEXT PRIMARY KEY,
+                    data TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS outbox (
+                    message_key TEXT PRIMARY KEY,
+                    data TEXT NOT NULL
+                );
+                """
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('schema_version', ?)",
+                (SCHEMA_VERSION,),
+            )
+            self._conn = conn
+            self._migrate_legacy_json()
+        return self._conn
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _migrate_legacy_json(self) -> None:
+        if not self.legacy_json_file or not os.path.exists(self.legacy_json_file):
+            return
+        if self._get_meta("migrated_from") is not None:
+            return
+        if self._conn.execute("SELECT 1 FROM chats LIMIT 1").fetchone():
+            return
+
+        legacy = JsonStorage(self.legacy_json_file)
+        try:
+            subscriptions = legacy.load_subscriptions()
+            feed_states = legacy.load_feed_states()
+            outbox = legacy.load_outbox()
+        except Exception as e:
+            logger.error(f"读取旧版 JSON 数据 {self.legacy_json_file} 失败，跳过迁移: {e}")
+            return
+
+        if not isinstance(subscriptions, dict):
+            subscriptions = {}
+        if not isinstance(feed_states, dict):
+            feed_states = {}
+        if not isinstance(outbox, dict):
+            outbox = {}
+
+        # 待发送的消息也一并迁移，否则切换后端前未送达的消息会丢失。
+        with self._transaction() as conn:
+            self._replace_all(conn, subscriptions)
+            self._write_feed_states(conn, feed_states, feed_states.keys())
+            self._write_outbox(conn, outbox, outbox.keys())
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from', ?)",
+                (self.legacy_json_file,),
+            )
+
+        logger.info(
+            "已将 %s 个聊天的订阅和 %s 条待发送消息从 %s 迁移到 %s。",
+            len(subscriptions),
+            len(outbox),
+            self.legacy_json_file,
+            self.data_file,
+        )
+
+    def _transaction(self) -> "_SqliteTransaction":
+        return _SqliteTransaction(self._conn)
+
+    def exists(self) -> bool:
+        if os.path.exists(self.data_file):
+            return True
+        return bool(self.legacy_json_file and os.path.exists(self.legacy_json_file))
+
+    def load_subscriptions(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            conn = self._connect()
+            subscriptions: Dict[str, Dict[str, Any]] = {}
+            for chat_id, settings in conn.execute("SELECT chat_id, settings FROM chats ORDER BY rowid"):
+                user_config = json.loads(settings)
+                user_config["rss_feeds"] = {}
+                subscriptions[chat_id] = user_config
+
+            for chat_id, feed_url, data in conn.execute(
+                "SELECT chat_id, feed_url, data FROM feeds ORDER BY rowid"
+            ):
+                user_config = subscriptions.setdefault(chat_id, {"rss_feeds": {}})
+                user_config["rss_feeds"][feed_url] = json.loads(data)
+            return subscriptions
+
+    def load_feed_states(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            conn = self._connect()
+            return {
+                feed_url: json.loads(data)
+                for feed_url, data in conn.execute("SELECT feed_url, data FROM feed_states")
+            }
+
+    def _upsert_chat(self, conn: sqlite3.Connection, chat_id: str, user_config: Dict[str, Any]) -> None:
+        settings, _ = _split_user_config(user_config)
+        conn.execute(
+            "INSERT INTO chats (chat_id, settings) VALUES (?, ?) "
+            "ON CONFLICT(chat_id) DO UPDATE SET settings = excluded.settings",
+            (chat_id, json.dumps(settings, ensure_ascii=False)),
+        )
+
+    def _upsert_feed(
+        self,
+        conn: sqlite3.Connection,
+        chat_id: str,
+        feed_url: str,
+        feed_data: Dict[str, Any]
+    ) -> None:
+        conn.execute(
+            "INSERT INTO feeds (chat_id, feed_url, data) VALUES (?, ?, ?) "
+            "ON CONFLICT(chat_id, feed_url) DO UPDATE SET data = excluded.data",
+            (chat_id, feed_url, json.dumps(feed_data, ensure_ascii=False)),
+        )
+
+    def _replace_all(self, conn: sqlite3.Connection, subscriptions: Dict[str, Dict[str, Any]]) -> None:
+        conn.execute("DELETE FROM feeds")
+        conn.execute("DELETE FROM chats")
+        for chat_id, user_config in subscriptions.items():
+            if not isinstance(user_config, dict):
+                continue
+            self._upsert_chat(conn, str(chat_id), user_config)
+            feeds = user_config.get("rss_feeds", {})
+            if isinstance(feeds, dict):
+                for feed_url, feed_data in feeds.items():
+                    self._upsert_feed(conn, str(chat_id), feed_url, feed_data)
+
+    def save_subscriptions(
+        self,
+        subscriptions: Dict[str, Dict[str, Any]],
+        dirty_chats: Optional[Set[str]] = None,
+        dirty_feeds: Optional[Set[FeedKey]] = None,
+    ) -> None:
+        with self._lock:
+            self._connect()
+            with self._transaction() as conn:
+                if dirty_chats is None and dirty_feeds is None:
+                    self._replace_all(conn, subscriptions)
+                    return
+
+                for chat_id in dirty_chats or ():
+                    user_config = subscriptions.get(chat_id)
+                    if user_config is None:
+                        conn.execute("DELETE FROM feeds WHERE chat_id = ?", (chat_id,))
+                        conn.execute("DELETE FROM chats WHERE chat_id = ?", (chat_id,))
+                    else:
+                        self._upsert_chat(conn, chat_id, user_config)
+
+                for chat_id, feed_url in dirty_feeds or ():
+                    feed_data = subscriptions.get(chat_id, {}).get("rss_feeds", {}).get(feed_url)
+                    if feed_data is None:
+                        conn.execute(
+                            "DELETE FROM feeds WHERE chat_id = ? AND feed_url = ?",
+                            (chat_id, feed_url),
+                        )
+                    else:
+                        self._upsert_feed(conn, chat_id, feed_url, feed_data)
+
+    def _write_feed_states(
+        self,
+        conn: sqlite3.Connection,
+        feed_states: Dict[str, Dict[str, Any]],
+        feed_urls: Iterable[str],
+    ) -> None:
+        for feed_url in feed_urls:
+            state = feed_states.get(feed_url)
+            if state is None:
+                conn.execute("DELETE FROM feed_states WHERE feed_url = ?", (feed_url,))
+            else:
+                conn.execute(
+                    "INSERT INTO feed_states (feed_url, data) VALUES (?, ?) "
+                    "ON CONFLICT(feed_url) DO UPDATE SET data = excluded.data",
+                    (feed_url, json.dumps(state, ensure_ascii=False)),
+                )
+
+    def save_feed_states(
+        self,
+        feed_states: Dict[str, Dict[str, Any]],
+        dirty_urls: Optional[Set[str]] = None,
+    ) -> None:
+        with self._lock:
+            self._connect()
+            with self._transaction() as conn:
+                if dirty_urls is None:
+                    conn.execute("DELETE FROM feed_states")
+                    dirty_urls = set(feed_states)
+                self._write_feed_states(conn, feed_states, dirty_urls)
+
+    def _write_outbox(
+        self,
+        conn: sqlite3.Connection,
+        outbox: Dict[str, Dict[str, Any]],
+        message_keys: AbstractSet[str],
+    ) -> None:
+        for message_key in message_keys - outbox.keys():
+            conn.execute("DELETE FROM outbox WHERE message_key = ?", (message_key,))
+        # 按字典顺序写入，保证新消息的 rowid 顺序与入队顺序一致。
+        for message_key, message in outbox.items():
+            if message_key in message_keys:
+                conn.execute(
+                    "INSERT INTO outbox (message_key, data) VALUES (?, ?) "
+                    "ON CONFLICT(message_key) DO UPDATE SET data = excluded.data",
+                    (message_key, json.dumps(message, ensure_ascii=False)),
+                )
+
+    def load_outbox(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            conn = self._connect()
+            return {
+                message_key: json.loads(data)
+                for message_key, data in conn.execute("SELECT message_key, data FROM outbox ORDER BY rowid")
+            }
+
+    def save_outbox(
+        self,
+        outbox: Dict[str, Dict[str, Any]],
+        dirty_keys: Optional[Set[str]] = None,
+    ) -> None:
+        with self._lock:
+            self._connect()
+            with self._transaction() as conn:
+                if dirty_keys is None:
+                    conn.execute("DELETE FROM outbox")
+                    dirty_keys = set(outbox)
+                self._write_outbox(conn, outbox, dirty_keys)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class _SqliteTransaction:
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+
+
+def create_storage(data_file: str) -> Any:
+    root, ext = os.path.splitext(data_file)
+    if ext.lower() in SQLITE_EXTENSIONS:
+        return SqliteStorage(data_file, legacy_json_file=f"{root}.json")
+    return JsonStorage(data_file)
@@ -0,0 +1,50 @@
+import unittest
+
+import digest
+import feed_parser
+
+
+class DigestTests(unittest.TestCase):
+    def test_split_respects_limit_and_repeats_feed_header(self) -> None:
+        items = [("Feed", f"• entry {index:02d}") for index in range(20)]
+
+        messages = digest.split_digest_messages(items, limit=80)
+
+        self.assertGreater(len(messages), 1)
+        self.assertEqual(sum(count for _, count in messages), 20)
+        for text, _ in messages:
+            self.assertLessEqual(len(text), 80)
+            self.assertTrue(text.startswith("<b>Feed</b>\n"))
+
+    def test_split_groups_entries_under_their_feed_headers(self) -> None:
+        messages = digest.split_digest_messages([("A", "• 1"), ("A", "• 2"), ("B&C", "• 3")])
+
+        self.assertEqual(messages, [("<b>A</b>\n• 1\n• 2\n\n<b>B&amp;C</b>\n• 3", 3)])
+
+    def test_split_shrinks_single_entry_longer_than_limit(self) -> None:
+        entry = feed_parser.extract_entry({"title": "Long & link", "link": "https://example.com/" + "a" * 5000})
+        messages = digest.split_digest_messages([("Feed", "• short"), ("Feed", digest.build_digest_line(entry))])
+
+        self.assertEqual(messages[1], ("<b>Feed</b>\n• Long &amp; link", 1))
+        limited = digest.split_digest_messages([("&" * 100, "• tail " * 20)], limit=100)
+        self.assertEqual(len(limited), 1)
+        self.assertLessEqual(len(limited[0][0]), 100)
+        self.assertNotRegex(limited[0][0], r"&[a-z]*…")
+
+    def test_build_digest_line_escapes_and_truncates_title(self) -> None:
+        entry = feed_parser.extract_entry({"title": "<" * 400, "link": "https://example.com/?a=1&b=2"})
+        line = digest.build_digest_line(entry)
+
+        self.assertIn('href="https://example.com/?a=1&amp;b=2"', line)
+        self.assertIn("&lt;" * 10, line)
+        self.assertTrue(line.endswith("…</a>"))
+
+    def test_normalize_digest_settings(self) -> None:
+        self.assertEqual(digest.normalize_digest_mode("FEED"), "feed")
+        self.assertEqual(digest.normalize_digest_mode("weekly"), "off")
+        self.assertEqual(digest.normalize_digest_interval("-5"), 0)
+        self.assertEqual(digest.normalize_digest_interval(10 ** 6), digest.MAX_DIGEST_INTERVAL_MINUTES)
+
+
+if __name__ == "__main__":
+    unittest.main()
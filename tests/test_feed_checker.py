@@ -1,22 +1,41 @@
+import asyncio
+import re
+import time
 import unittest
 from types import SimpleNamespace
 from unittest.mock import AsyncMock, patch
 
+from telegram import error as tg_error
+
 import data_manager
 import feed_checker
+import feed_parser
+import fetcher
+import scheduler
+
+
+def _fake_fetcher(status: int = 200, headers=None) -> SimpleNamespace:
+    result = fetcher.FetchResult("https://example.com/feed", status, b"<rss/>", headers)
+    return SimpleNamespace(fetch=AsyncMock(return_value=result))
 
 
 class FeedCheckerTests(unittest.IsolatedAsyncioTestCase):
     def tearDown(self) -> None:
         data_manager.subscriptions_data = {}
+        data_manager._clear_dirty_marks()
+        data_manager.feed_states = {}
+        data_manager.outbox = {}
+
+    async def asyncTearDown(self) -> None:
+        await feed_checker.close_delivery()
 
     async def test_build_entry_message_escapes_html(self) -> None:
         message = feed_checker._build_entry_message(
             "A&B <Feed>",
-            {
+            feed_parser.extract_entry({
                 "title": '1 < 2 & 3',
                 "link": 'https://example.com/?a=1&b="2"',
-            },
+            }),
         )
 
         self.assertIn("<b>A&amp;B &lt;Feed&gt;</b>", message)
@@ -45,7 +64,7 @@ class FeedCheckerTests(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(kwargs["text"], "<b>Body</b>\n---\n&lt;Footer &amp; more&gt;")
         self.assertTrue(kwargs["disable_web_page_preview"])
 
-    async def test_send_failure_only_advances_last_successful_entry(self) -> None:
+    async def test_send_failure_keeps_undelivered_message_in_outbox(self) -> None:
         feed_url = "https://example.com/feed"
         data_manager.subscriptions_data = {
             "1": {
@@ -79,20 +98,571 @@ class FeedCheckerTests(unittest.IsolatedAsyncioTestCase):
 
         send_side_effect.calls = 0
 
-        with patch("feed_checker.feedparser.parse", return_value=parsed_feed), patch(
+        with patch("feed_parser.feedparser.parse", return_value=parsed_feed), patch(
+            "feed_checker.fetcher.get_fetcher",
+            return_value=_fake_fetcher(),
+        ), patch(
             "feed_checker.send_telegram_message",
             side_effect=send_side_effect,
-        ), patch("feed_checker.data_manager.save_subscriptions"):
-            with self.assertRaises(RuntimeError):
-                await feed_checker.check_single_feed(
-                    SimpleNamespace(),
-                    "1",
-                    feed_url,
-                    dict(data_manager.subscriptions_data["1"]["rss_feeds"][feed_url]),
-                    "data/subscriptions.json",
-                )
+        ), patch("feed_checker.data_manager.request_save"), patch(
+            "feed_checker.data_manager.flush",
+            new=AsyncMock(),
+        ) as flush:
+            await feed_checker.check_feeds_job(SimpleNamespace(bot_data={}), "data/subscriptions.json")
+            await feed_checker.wait_for_delivery()
 
+        flush.assert_awaited()
         self.assertEqual(
             data_manager.subscriptions_data["1"]["rss_feeds"][feed_url]["last_entry_id"],
-            "new-1",
+            "new-2",
+        )
+        pending = list(data_manager.outbox.values())
+        self.assertEqual(len(pending), 1)
+        self.assertIn("https://example.com/2", pending[0]["text"])
+        self.assertEqual(pending[0]["attempts"], 1)
+
+    async def test_check_feeds_job_fetches_shared_url_once(self) -> None:
+        feed_url = "https://example.com/feed"
+        data_manager.subscriptions_data = {
+            chat_id: {
+                "rss_feeds": {
+                    feed_url: {
+                        "title": "Feed",
+                        "keywords": [],
+                        "last_entry_id": "old",
+                    }
+                },
+                "custom_footer": None,
+                "link_preview_enabled": True,
+            }
+            for chat_id in ("1", "2", "3")
+        }
+
+        parsed_feed = SimpleNamespace(
+            entries=[
+                {"id": "new", "title": "New", "link": "https://example.com/new"},
+                {"id": "old", "title": "Old", "link": "https://example.com/old"},
+            ],
+            bozo=False,
+            bozo_exception=None,
+        )
+        send_message = AsyncMock()
+        fake_fetcher = _fake_fetcher()
+
+        with patch("feed_parser.feedparser.parse", return_value=parsed_feed) as parse, patch(
+            "feed_checker.fetcher.get_fetcher",
+            return_value=fake_fetcher,
+        ), patch(
+            "feed_checker.send_telegram_message",
+            new=send_message,
+        ), patch("feed_checker.data_manager.request_save"), patch(
+            "feed_checker.data_manager.flush",
+            new=AsyncMock(),
+        ):
+            await feed_checker.check_feeds_job(
+                SimpleNamespace(bot_data={}),
+                "data/subscriptions.json",
+            )
+            await feed_checker.wait_for_delivery()
+
+        fake_fetcher.fetch.assert_awaited_once()
+        parse.assert_called_once()
+        self.assertEqual(
+            sorted(call.args[1] for call in send_message.await_args_list),
+            ["1", "2", "3"],
         )
+        for chat_id in ("1", "2", "3"):
+            self.assertEqual(
+                data_manager.subscriptions_data[chat_id]["rss_feeds"][feed_url]["last_entry_id"],
+                "new",
+            )
+
+    async def test_check_feeds_job_sends_validators_and_skips_on_not_modified(self) -> None:
+        feed_url = "https://example.com/feed"
+        data_manager.subscriptions_data = {
+            "1": {"rss_feeds": {feed_url: {"title": "Feed", "keywords": [], "last_entry_id": "old"}}}
+        }
+        data_manager.feed_states = {
+            feed_url: {"etag": '"abc"', "modified": "Mon, 01 Jan 2024 00:00:00 GMT"}
+        }
+        fake_fetcher = _fake_fetcher(status=304)
+
+        with patch("feed_parser.feedparser.parse") as parse, patch(
+            "feed_checker.fetcher.get_fetcher",
+            return_value=fake_fetcher,
+        ), patch(
+            "feed_checker._process_feed_for_chat",
+            new=AsyncMock(),
+        ) as process, patch("feed_checker.data_manager.flush", new=AsyncMock()):
+            await feed_checker.check_feeds_job(SimpleNamespace(bot_data={}), "data/subscriptions.json")
+
+        fetch_kwargs = fake_fetcher.fetch.await_args.kwargs
+        self.assertEqual(fetch_kwargs["etag"], '"abc"')
+        self.assertEqual(fetch_kwargs["modified"], "Mon, 01 Jan 2024 00:00:00 GMT")
+        parse.assert_not_called()
+        process.assert_not_awaited()
+
+    async def test_fetch_skips_parse_when_body_is_unchanged(self) -> None:
+        feed_url = "https://example.com/feed"
+        feed_config = {"title": "Feed", "keywords": [], "last_entry_id": "old"}
+        bodies = [
+            b"<rss><channel><lastBuildDate>Mon, 01 Jan 2024</lastBuildDate><item><guid>a</guid></item></channel></rss>",
+            b"<rss><channel><lastBuildDate>Tue, 02 Jan 2024</lastBuildDate><item><guid>a</guid></item></channel></rss>",
+            b"<rss><channel><lastBuildDate>Tue, 02 Jan 2024</lastBuildDate><item><guid>a</guid></item></channel></rss>",
+            b"<rss><channel><lastBuildDate>Tue, 02 Jan 2024</lastBuildDate><item><guid>b</guid></item></channel></rss>",
+        ]
+        fake_fetcher = SimpleNamespace(fetch=AsyncMock(side_effect=[
+            fetcher.FetchResult(feed_url, 200, body, {}) for body in bodies
+        ]))
+        stats = feed_checker.FetchStats()
+
+        with patch("feed_parser.feedparser.parse", return_value=SimpleNamespace(entries=[])) as parse, patch(
+            "feed_checker.fetcher.get_fetcher",
+            return_value=fake_fetcher,
+        ):
+            for _ in bodies:
+                await feed_checker._fetch_for_subscribers(
+                    SimpleNamespace(bot_data={}),
+                    feed_url,
+                    [("1", feed_config)],
+                    stats,
+                )
+
+        self.assertEqual(parse.call_count, 2)
+        self.assertEqual((stats.parsed, stats.unchanged), (2, 2))
+
+    async def test_overflowed_entries_are_sent_in_later_cycles_when_body_is_unchanged(self) -> None:
+        feed_url = "https://example.com/feed"
+        entry_ids = [f"https://example.com/new-{index}" for index in range(12, 0, -1)] + ["https://example.com/old"]
+        body = (
+            "<rss><channel><title>Feed</title>"
+            + "".join(f"<item><guid>{entry_id}</guid><title>{entry_id}</title></item>" for entry_id in entry_ids)
+            + "</channel></rss>"
+        ).encode()
+        data_manager.subscriptions_data = {
+            "1": {
+                "rss_feeds": {
+                    feed_url: {
+                        "title": "Feed",
+                        "keywords": [],
+                        "seen_entries": [data_manager.make_entry_key(entry_ids[-1])],
+                        "last_entry_id": entry_ids[-1],
+                    }
+                },
+                "custom_footer": None,
+                "link_preview_enabled": True,
+            }
+        }
+        fake_fetcher = SimpleNamespace(fetch=AsyncMock(
+            return_value=fetcher.FetchResult(feed_url, 200, body, {"etag": '"v1"'})
+        ))
+        send_message = AsyncMock()
+        sent_per_cycle = []
+
+        with patch("feed_checker.fetcher.get_fetcher", return_value=fake_fetcher), patch(
+            "feed_checker.send_telegram_message",
+            new=send_message,
+        ), patch("feed_checker.data_manager.request_save"), patch(
+            "feed_checker.data_manager.flush",
+            new=AsyncMock(),
+        ), patch("feed_parser.parse_feed_bytes", wraps=feed_parser.parse_feed_bytes) as parse:
+            for _ in range(3):
+                data_manager.get_feed_state(feed_url)["next_check_at"] = None
+                await feed_checker.check_feeds_job(SimpleNamespace(bot_data={}), "data/subscriptions.json")
+                await feed_checker.wait_for_delivery()
+                sent_per_cycle.append(send_message.await_count - sum(sent_per_cycle))
+
+        # 第一轮发送 5 条和一条剩余提示，第二轮补发其余 7 条，之后内容未变才跳过解析。
+        self.assertEqual(sent_per_cycle, [6, 7, 0])
+        self.assertEqual(parse.call_count, 2)
+        self.assertIsNone(fake_fetcher.fetch.await_args_list[1].kwargs["etag"])
+        self.assertEqual(fake_fetcher.fetch.await_args_list[2].kwargs["etag"], '"v1"')
+        self.assertNotIn("pending_unseen", data_manager.get_feed_state(feed_url))
+        sent_texts = "".join(call.args[2] for call in send_message.await_args_list)
+        for entry_id in entry_ids[:-1]:
+            self.assertIn(f'href="{entry_id}"', sent_texts)
+
+    async def test_check_feeds_job_skips_feeds_that_are_not_due(self) -> None:
+        feed_url = "https://example.com/feed"
+        data_manager.subscriptions_data = {
+            "1": {
+                "rss_feeds": {
+                    feed_url: {"title": "Feed", "keywords": [], "last_entry_id": "old"}
+                },
+                "custom_footer": None,
+                "link_preview_enabled": True,
+            }
+        }
+        data_manager.feed_states = {feed_url: {"next_check_at": time.time() + 600}}
+
+        fake_fetcher = _fake_fetcher()
+
+        with patch("feed_checker.fetcher.get_fetcher", return_value=fake_fetcher):
+            await feed_checker.check_feeds_job(
+                SimpleNamespace(bot_data={}),
+                "data/subscriptions.json",
+            )
+
+        fake_fetcher.fetch.assert_not_awaited()
+
+    async def test_check_cycle_sorts_feeds_with_cleared_next_check_at(self) -> None:
+        feed_urls = ("https://a.example/feed", "https://b.example/feed")
+        data_manager.subscriptions_data = {
+            "1": {"rss_feeds": {url: {"title": "Feed", "keywords": [], "last_entry_id": "old"} for url in feed_urls}}
+        }
+        data_manager.feed_states = {feed_urls[0]: {"next_check_at": 1.0}, feed_urls[1]: {"next_check_at": None}}
+        fake_fetcher = _fake_fetcher(status=304)
+
+        with patch("feed_checker.fetcher.get_fetcher", return_value=fake_fetcher), patch(
+            "feed_checker.data_manager.flush",
+            new=AsyncMock(),
+        ):
+            await feed_checker.check_feeds_job(SimpleNamespace(bot_data={}), "data/subscriptions.json")
+
+        self.assertEqual([call.args[0] for call in fake_fetcher.fetch.await_args_list], [feed_urls[1], feed_urls[0]])
+
+    async def test_check_cycle_does_not_wait_for_blocked_delivery(self) -> None:
+        data_manager.subscriptions_data = {
+            "1": {"rss_feeds": {"https://example.com/feed": {"title": "Feed", "keywords": [], "last_entry_id": "old"}}}
+        }
+        data_manager.feed_states = {"https://example.com/feed": {"next_check_at": time.time() + 600}}
+        data_manager.enqueue_message("1:key", "1", "<b>Body</b>")
+        blocked = asyncio.Event()
+
+        async def block_on_flood_wait(*args) -> None:
+            await blocked.wait()
+
+        send_message = AsyncMock(side_effect=block_on_flood_wait)
+
+        with patch("feed_checker.send_telegram_message", new=send_message), patch(
+            "feed_checker.data_manager.request_save"
+        ):
+            for _ in range(2):
+                await asyncio.wait_for(
+                    feed_checker.check_feeds_job(SimpleNamespace(bot_data={}), "data/subscriptions.json"),
+                    timeout=1,
+                )
+            await asyncio.sleep(0)
+            send_message.assert_awaited_once()
+            self.assertIn("1:key", data_manager.outbox)
+            blocked.set()
+            await feed_checker.wait_for_delivery()
+
+    async def test_long_feed_growing_each_cycle_sends_only_new_entries(self) -> None:
+        feed_url = "https://example.com/feed"
+
+        def build_body(newest: int) -> bytes:
+            items = "".join(
+                f"<item><guid>https://example.com/{index}</guid><title>{index}</title></item>"
+                for index in range(newest, 0, -1)
+            )
+            return f"<rss><channel><title>Feed</title>{items}</channel></rss>".encode()
+
+        for use_known_keys in (True, False):
+            with self.subTest(streaming=use_known_keys):
+                data_manager.subscriptions_data = {
+                    "1": {"rss_feeds": {feed_url: {"title": "Feed", "keywords": [], "last_entry_id": None}}}
+                }
+                data_manager.outbox = {}
+                subscribers = data_manager.get_feed_subscriptions(feed_url)
+                sent = []
+                with patch("feed_checker.data_manager.request_save"):
+                    for newest in range(210, 217):
+                        known_keys = feed_checker._get_keys_seen_by_all(feed_url, subscribers) if use_known_keys else None
+                        feed_content = feed_parser.parse_feed_bytes(build_body(newest), {}, known_keys)
+                        await feed_checker._dispatch_to_subscribers(
+                            SimpleNamespace(bot_data={}), feed_url, subscribers, feed_content, "data/subscriptions.json"
+                        )
+                        sent.append(sorted(
+                            re.search(r'href="https://example.com/(\d+)"', message["text"]).group(1)
+                            for message in data_manager.outbox.values()
+                        ))
+                        data_manager.outbox = {}
+
+                # 第一轮只记录已有条目，之后每轮只推送新增的一条。
+                self.assertEqual(sent, [[]] + [[str(newest)] for newest in range(211, 217)])
+
+    async def test_close_delivery_waits_for_in_flight_send_and_records_ack(self) -> None:
+        data_manager.subscriptions_data = {"1": {"rss_feeds": {}}}
+        data_manager.enqueue_message("1:a", "1", "A")
+        data_manager.enqueue_message("1:b", "1", "B")
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_send(*args) -> None:
+            started.set()
+            await release.wait()
+
+        send_message = AsyncMock(side_effect=slow_send)
+
+        with patch("feed_checker.send_telegram_message", new=send_message), patch(
+            "feed_checker.data_manager.request_save"
+        ):
+            feed_checker.schedule_delivery(SimpleNamespace(bot_data={}), "data/subscriptions.json")
+            await started.wait()
+            closing = asyncio.ensure_future(feed_checker.close_delivery())
+            await asyncio.sleep(0)
+            self.assertFalse(closing.done())
+            release.set()
+            await closing
+
+        # 已发出的消息完成确认，尚未开始的消息留在发件箱中。
+        send_message.assert_awaited_once()
+        self.assertEqual(list(data_manager.outbox), ["1:b"])
+
+    async def test_rate_limited_delivery_keeps_message_without_counting_attempt(self) -> None:
+        data_manager.enqueue_message("1:a", "1", "A")
+        data_manager.enqueue_message("1:b", "1", "B")
+        send_message = AsyncMock(side_effect=tg_error.RetryAfter(3600))
+
+        with patch("feed_checker.send_telegram_message", new=send_message), patch(
+            "feed_checker.data_manager.request_save"
+        ):
+            delivered = await feed_checker.deliver_outbox(SimpleNamespace(bot_data={}), "data/subscriptions.json")
+
+        self.assertEqual(delivered, 0)
+        send_message.assert_awaited_once()
+        self.assertEqual([message["attempts"] for message in data_manager.outbox.values()], [0, 0])
+
+    async def test_empty_feed_is_initialized_once_and_then_follows_schedule(self) -> None:
+        feed_url = "https://example.com/feed"
+        data_manager.subscriptions_data = {
+            "1": {"rss_feeds": {feed_url: {"title": "Feed", "keywords": [], "last_entry_id": None}}}
+        }
+        empty_body = b"<rss><channel><title>Feed</title></channel></rss>"
+        fake_fetcher = SimpleNamespace(fetch=AsyncMock(
+            return_value=fetcher.FetchResult(feed_url, 200, empty_body, {"etag": '"v1"'})
+        ))
+
+        with patch("feed_checker.fetcher.get_fetcher", return_value=fake_fetcher), patch(
+            "feed_checker.data_manager.request_save"
+        ), patch("feed_checker.data_manager.flush", new=AsyncMock()):
+            for _ in range(3):
+                await feed_checker.check_feeds_job(SimpleNamespace(bot_data={}), "data/subscriptions.json")
+
+        fake_fetcher.fetch.assert_awaited_once()
+        feed_config = data_manager.subscriptions_data["1"]["rss_feeds"][feed_url]
+        self.assertTrue(feed_config["initialized"])
+        # 首次检查后即使没有游标也发送条件请求。
+        data_manager.get_feed_state(feed_url)["next_check_at"] = None
+        with patch("feed_checker.fetcher.get_fetcher", return_value=fake_fetcher), patch(
+            "feed_checker.data_manager.request_save"
+        ), patch("feed_checker.data_manager.flush", new=AsyncMock()):
+            await feed_checker.check_feeds_job(SimpleNamespace(bot_data={}), "data/subscriptions.json")
+        self.assertEqual(fake_fetcher.fetch.await_args.kwargs["etag"], '"v1"')
+        self.assertIsNone(feed_config["last_entry_id"])
+
+        # 之后出现的条目是新条目，不能再被当作首次检查的历史内容。
+        feed_content = feed_parser.compact_feed(SimpleNamespace(
+            entries=[{"id": "a", "title": "A", "link": "https://example.com/a"}],
+        ))
+        with patch("feed_checker.data_manager.request_save"):
+            await feed_checker._process_feed_for_chat(
+                SimpleNamespace(bot_data={}), "1", feed_url, dict(feed_config), feed_content, "data/subscriptions.json"
+            )
+        self.assertEqual(len(data_manager.outbox), 1)
+
+    async def test_dispatch_error_for_one_feed_does_not_abort_cycle(self) -> None:
+        feed_urls = ("https://a.example/feed", "https://b.example/feed")
+        data_manager.subscriptions_data = {
+            "1": {"rss_feeds": {url: {"title": "Feed", "keywords": [], "last_entry_id": "old"} for url in feed_urls}}
+        }
+        dispatch = AsyncMock(side_effect=lambda context, feed_url, *args: (
+            [("1", None)] if feed_url == feed_urls[1] else 1 / 0
+        ))
+
+        with patch("feed_checker.fetcher.get_fetcher", return_value=_fake_fetcher(status=304)), patch(
+            "feed_checker._dispatch_to_subscribers",
+            new=dispatch,
+        ), patch("feed_checker.data_manager.flush", new=AsyncMock()) as flush:
+            await feed_checker.check_feeds_job(SimpleNamespace(bot_data={}), "data/subscriptions.json")
+
+        self.assertEqual(dispatch.await_count, 2)
+        flush.assert_awaited()
+        for feed_url in feed_urls:
+            self.assertGreater(data_manager.get_feed_state(feed_url)["next_check_at"], time.time())
+
+    async def test_check_feeds_job_skips_overlapping_cycle(self) -> None:
+        release = asyncio.Event()
+
+        async def wait_for_release(*args) -> None:
+            await release.wait()
+
+        run_cycle = AsyncMock(side_effect=wait_for_release)
+
+        with patch("feed_checker._run_check_cycle", new=run_cycle):
+            first = asyncio.ensure_future(feed_checker.check_feeds_job(SimpleNamespace(bot_data={}), "data.json"))
+            await asyncio.sleep(0)
+            await feed_checker.check_feeds_job(SimpleNamespace(bot_data={}), "data.json")
+            release.set()
+            await first
+            await feed_checker.check_feeds_job(SimpleNamespace(bot_data={}), "data.json")
+
+        self.assertEqual(run_cycle.await_count, 2)
+
+    async def test_deferred_feeds_stay_due_for_next_cycle(self) -> None:
+        data_manager.subscriptions_data = {
+            "1": {
+                "rss_feeds": {
+                    url: {"title": "Feed", "keywords": [], "last_entry_id": "old"}
+                    for url in ("https://a.example/feed", "https://b.example/feed")
+                },
+            }
+        }
+        data_manager.feed_states = {
+            "https://a.example/feed": {"next_check_at": 2.0},
+            "https://b.example/feed": {"next_check_at": 1.0},
+        }
+
+        async def run(scheduler_self, jobs):
+            return [scheduler.DEFERRED] + [None] * (len(jobs) - 1)
+
+        with patch("feed_checker.scheduler.CheckScheduler.run", new=run), patch(
+            "feed_checker.data_manager.flush",
+            new=AsyncMock(),
+        ):
+            await feed_checker.check_feeds_job(SimpleNamespace(bot_data={}), "data/subscriptions.json")
+
+        self.assertEqual(data_manager.get_feed_state("https://b.example/feed")["next_check_at"], 1.0)
+        self.assertGreater(data_manager.get_feed_state("https://a.example/feed")["next_check_at"], time.time())
+
+    async def test_failing_feed_backs_off_and_recovers(self) -> None:
+        feed_url = "https://example.com/feed"
+        data_manager.subscriptions_data = {
+            "1": {"rss_feeds": {feed_url: {"title": "Feed", "keywords": [], "last_entry_id": "old"}}}
+        }
+        fake_fetcher = SimpleNamespace(fetch=AsyncMock(side_effect=RuntimeError("404 Not Found")))
+
+        with patch("feed_checker.fetcher.get_fetcher", return_value=fake_fetcher), patch(
+            "feed_checker.data_manager.flush",
+            new=AsyncMock(),
+        ):
+            for failure_count in (1, 2):
+                data_manager.get_feed_state(feed_url)["next_check_at"] = None
+                started_at = time.time()
+                await feed_checker.check_feeds_job(SimpleNamespace(bot_data={}), "data/subscriptions.json")
+
+                feed_state = data_manager.get_feed_state(feed_url)
+                self.assertEqual(feed_state["failure_count"], failure_count)
+                self.assertEqual(feed_state["last_error"], "RuntimeError: 404 Not Found")
+                self.assertGreaterEqual(feed_state["next_check_at"] - started_at, 300 * 2 ** (failure_count - 1))
+
+            self.assertEqual(len(data_manager.get_failing_feeds("1")), 1)
+            fake_fetcher.fetch.side_effect = None
+            fake_fetcher.fetch.return_value = fetcher.FetchResult(feed_url, 304)
+            data_manager.get_feed_state(feed_url)["next_check_at"] = None
+            await feed_checker.check_feeds_job(SimpleNamespace(bot_data={}), "data/subscriptions.json")
+
+        feed_state = data_manager.get_feed_state(feed_url)
+        self.assertNotIn("failure_count", feed_state)
+        self.assertIn("last_success_at", feed_state)
+        self.assertEqual(data_manager.get_failing_feeds("1"), [])
+
+    async def _run_chat_check(self, entries, seen_ids, last_entry_id="a", **user_settings) -> AsyncMock:
+        feed_url = "https://example.com/feed"
+        data_manager.subscriptions_data = {
+            "1": {
+                "rss_feeds": {
+                    feed_url: {
+                        "title": "Feed",
+                        "keywords": [],
+                        "seen_entries": [data_manager.make_entry_key(entry_id) for entry_id in seen_ids],
+                        "last_entry_id": last_entry_id,
+                    }
+                },
+                "custom_footer": None,
+                "link_preview_enabled": True,
+                **user_settings,
+            }
+        }
+        feed_content = feed_parser.compact_feed(SimpleNamespace(
+            entries=[{"id": entry_id, "title": entry_id, "link": f"https://example.com/{entry_id}"} for entry_id in entries],
+        ))
+        send_message = AsyncMock()
+
+        with patch("feed_checker.send_telegram_message", new=send_message), patch(
+            "feed_checker.data_manager.request_save"
+        ):
+            await feed_checker._process_feed_for_chat(
+                SimpleNamespace(bot_data={}),
+                "1",
+                feed_url,
+                dict(data_manager.subscriptions_data["1"]["rss_feeds"][feed_url]),
+                feed_content,
+                "data/subscriptions.json",
+            )
+            await feed_checker.deliver_outbox(SimpleNamespace(bot_data={}), "data/subscriptions.json")
+        return send_message
+
+    async def test_reordered_feed_only_sends_unseen_entries(self) -> None:
+        send_message = await self._run_chat_check(["b", "c", "a"], ["a", "b"])
+
+        self.assertEqual(len(send_message.await_args_list), 1)
+        self.assertIn("https://example.com/c", send_message.await_args.args[2])
+
+    async def test_deleted_cursor_entry_does_not_resend_old_entries(self) -> None:
+        send_message = await self._run_chat_check(["d", "c", "b"], ["a", "b", "c"], last_entry_id="a")
+
+        self.assertEqual(len(send_message.await_args_list), 1)
+        self.assertIn("https://example.com/d", send_message.await_args.args[2])
+        self.assertIn(
+            data_manager.make_entry_key("d"),
+            data_manager.get_seen_entries("1", "https://example.com/feed"),
+        )
+
+    async def test_digest_mode_batches_backlog_into_one_message(self) -> None:
+        entry_ids = [f"n{index}" for index in range(10, 0, -1)]
+        send_message = await self._run_chat_check(entry_ids + ["a"], ["a"], digest_mode="chat")
+
+        send_message.assert_not_awaited()
+        self.assertEqual(len(data_manager.subscriptions_data["1"]["digest_pending"]), 10)
+
+        with patch("feed_checker.send_telegram_message", new=send_message), patch(
+            "feed_checker.data_manager.request_save"
+        ):
+            await feed_checker.send_pending_digests(SimpleNamespace(bot_data={}), "data/subscriptions.json")
+
+        self.assertEqual(len(send_message.await_args_list), 1)
+        text = send_message.await_args.args[2]
+        self.assertEqual(text.count("<b>Feed</b>"), 1)
+        self.assertLess(text.index("https://example.com/n1"), text.index("https://example.com/n10"))
+        self.assertEqual(data_manager.subscriptions_data["1"]["digest_pending"], [])
+
+    async def test_digest_window_holds_entries_until_due(self) -> None:
+        data_manager.subscriptions_data = {
+            "1": {
+                "rss_feeds": {},
+                "digest_mode": "chat",
+                "digest_interval_minutes": 30,
+                "digest_next_at": 2000.0,
+                "digest_pending": [{"feed_url": "u", "feed_title": "Feed", "line": "• x"}],
+            }
+        }
+        send_message = AsyncMock()
+
+        with patch("feed_checker.send_telegram_message", new=send_message), patch(
+            "feed_checker.data_manager.request_save"
+        ):
+            await feed_checker.send_pending_digests(
+                SimpleNamespace(bot_data={}),
+                "data/subscriptions.json",
+                now=1000.0,
+            )
+            send_message.assert_not_awaited()
+            await feed_checker.send_pending_digests(
+                SimpleNamespace(bot_data={}),
+                "data/subscriptions.json",
+                now=2000.0,
+            )
+
+        send_message.assert_awaited_once()
+        self.assertEqual(data_manager.subscriptions_data["1"]["digest_next_at"], 2000.0 + 30 * 60)
+
+    def test_seen_entries_ring_buffer_is_bounded(self) -> None:
+        seen_entries = data_manager.SeenEntries(limit=3)
+        for key in ("a", "b", "c", "d"):
+            seen_entries.add(key)
+
+        self.assertEqual(seen_entries.to_list(), ["b", "c", "d"])
+        self.assertNotIn("a", seen_entries)
+        self.assertEqual(len(seen_entries), 3)
@@ -0,0 +1,161 @@
+import asyncio
+import pickle
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+import data_manager
+import feed_parser
+
+RSS = b"""<?xml version="1.0"?>
+<rss version="2.0" xmlns:sy="http://purl.org/rss/1.0/modules/syndication/">
+<channel>
+  <title>Example</title>
+  <ttl>30</ttl>
+  <item>
+    <guid>entry-2</guid>
+    <title>Second &amp; newest</title>
+    <link>https://example.com/2</link>
+    <description>Python release notes</description>
+    <pubDate>Tue, 02 Jan 2024 00:00:00 GMT</pubDate>
+  </item>
+  <item>
+    <title>No identity</title>
+    <description>Only a summary</description>
+  </item>
+</channel>
+</rss>
+"""
+
+STREAM_RSS = b"""<?xml version="1.0"?>
+<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/">
+<channel>
+  <title>Stream</title>
+  <item><guid>g1</guid><title>A &amp; B</title><description>Hello</description></item>
+  <item><guid isPermaLink="false">g2</guid><link>/rel/2</link><content:encoded><![CDATA[<p>Body</p>]]></content:encoded></item>
+  <item><link> https://example.org/3 </link><pubDate>Tue, 02 Jan 2024 00:00:00 GMT</pubDate></item>
+  <item><guid>tag:example.org,2024:4</guid></item>
+  <item><guid>g5</guid></item>
+  <item><guid>g6</guid></item>
+</channel>
+</rss>
+"""
+
+STREAM_ATOM = b"""<?xml version="1.0"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <title>Atom</title>
+  <entry><id>urn:uuid:1</id><link href="/a/1"/><title type="html">A &lt;b&gt;x&lt;/b&gt;</title></entry>
+  <entry><id>rel-id</id><link rel="self" href="/self"/><link rel="alternate" href="https://y.example/2"/></entry>
+  <entry><link rel="enclosure" href="/e.mp3"/><link href="/a/3"/><updated>2024-01-02T00:00:00Z</updated></entry>
+</feed>
+"""
+
+HEADERS = {"content-location": "https://example.com/feed/"}
+
+
+class FeedParserTests(unittest.IsolatedAsyncioTestCase):
+    def test_parse_feed_bytes_returns_compact_picklable_entries(self) -> None:
+        feed = feed_parser.parse_feed_bytes(RSS, {})
+
+        self.assertEqual(feed.feed["title"], "Example")
+        self.assertEqual(feed.feed["ttl"], "30")
+        self.assertEqual(feed.latest_entry_id, "entry-2")
+        first, second = feed.entries
+        self.assertEqual(first.identity, "entry-2")
+        self.assertEqual(first.link, "https://example.com/2")
+        self.assertEqual(first.published, 1704153600.0)
+        self.assertIn("python", first.match_fields.content)
+        self.assertIsNone(second.identity)
+        self.assertEqual(second.key, data_manager.make_entry_key("No identity\nOnly a summary"))
+
+        restored = pickle.loads(pickle.dumps(feed))
+        self.assertEqual(restored.entries[0].match_fields.title, "second & newest")
+
+    async def test_parse_in_process_pool(self) -> None:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            feed = await asyncio.get_running_loop().run_in_executor(
+                pool,
+                feed_parser.parse_feed_bytes,
+                RSS,
+                {},
+            )
+
+        self.assertEqual([entry.id for entry in feed.entries], ["entry-2", None])
+
+    def test_compact_feed_keeps_only_newest_entries_and_prunes_by_key(self) -> None:
+        parsed = SimpleNamespace(
+            entries=[{"id": str(index)} for index in range(data_manager.MAX_FEED_ENTRIES + 50)],
+            feed={},
+            bozo=False,
+        )
+
+        feed = feed_parser.compact_feed(parsed)
+        self.assertEqual(len(feed.entries), data_manager.MAX_FEED_ENTRIES)
+
+        pruned = feed.without_entries({feed.entries[1].key, feed.entries[2].key})
+        self.assertEqual([entry.id for entry in pruned.entries[:2]], ["0", "3"])
+        self.assertEqual(pruned.pruned_count, 2)
+        self.assertEqual(pruned.latest_entry_id, "0")
+
+    def test_stream_parse_matches_feedparser(self) -> None:
+        for document in (STREAM_RSS, STREAM_ATOM):
+            expected = feed_parser.parse_feed_bytes(document, HEADERS)
+            streamed = feed_parser.stream_parse_feed(document, HEADERS["content-location"], {"unknown"})
+
+            self.assertIsNotNone(streamed)
+            self.assertEqual(streamed.feed, expected.feed)
+            self.assertEqual(streamed.latest_entry_id, expected.latest_entry_id)
+            self.assertEqual(
+                [(entry.key, entry.id, entry.title, entry.link, entry.published) for entry in streamed.entries],
+                [(entry.key, entry.id, entry.title, entry.link, entry.published) for entry in expected.entries],
+            )
+            self.assertEqual(
+                [entry.match_fields.any for entry in streamed.entries],
+                [entry.match_fields.any for entry in expected.entries],
+            )
+
+    def test_stream_parse_stops_after_consecutive_known_entries(self) -> None:
+        full = feed_parser.parse_feed_bytes(STREAM_RSS, HEADERS)
+        known_keys = {entry.key for entry in full.entries[1:]}
+
+        feed = feed_parser.parse_feed_bytes(STREAM_RSS, HEADERS, known_keys)
+
+        self.assertEqual(
+            [entry.key for entry in feed.entries],
+            [entry.key for entry in full.entries[:1 + feed_parser.STREAM_STOP_AFTER_KNOWN]],
+        )
+        self.assertEqual(feed.latest_entry_id, full.latest_entry_id)
+
+    def test_stream_parse_falls_back_for_unsupported_documents(self) -> None:
+        rdf = b"""<?xml version="1.0"?>
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns="http://purl.org/rss/1.0/">
+  <item><link>https://example.com/1</link></item>
+</rdf:RDF>
+"""
+        self.assertIsNone(feed_parser.stream_parse_feed(rdf, "", {"known"}))
+        self.assertIsNone(feed_parser.stream_parse_feed(b"<rss><channel><item>", "", {"known"}))
+        # 没有 id 和链接的条目只能由 feedparser 生成键。
+        self.assertIsNone(feed_parser.stream_parse_feed(RSS, "", {"known"}))
+
+        feed = feed_parser.parse_feed_bytes(RSS, {}, {"known"})
+        self.assertEqual(feed.entries[1].key, data_manager.make_entry_key("No identity\nOnly a summary"))
+
+    def test_create_parse_pool_is_disabled_by_default(self) -> None:
+        self.assertIsNone(feed_parser.create_parse_pool({}))
+        self.assertIsNone(feed_parser.create_parse_pool({"parse_workers": "bad"}))
+
+    def test_parse_pool_does_not_fork_and_is_warmed_up(self) -> None:
+        pool = feed_parser.create_parse_pool({"parse_workers": 2})
+        self.addCleanup(pool.shutdown)
+
+        feed_parser.warm_up_parse_pool(pool)
+
+        self.assertNotEqual(pool._mp_context.get_start_method(), "fork")
+        self.assertEqual(pool.workers, 2)
+        self.assertEqual(len(pool._processes), 2)
+        feed = pool.submit(feed_parser.parse_feed_bytes, RSS, {}).result(timeout=30)
+        self.assertEqual(len(feed.entries), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import fetcher
+
+
+class AiohttpFeedFetcherTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.request_headers = []
+
+        async def feed(request: web.Request) -> web.Response:
+            self.request_headers.append(dict(request.headers))
+            if request.headers.get("If-None-Match") == '"v1"':
+                return web.Response(status=304)
+            return web.Response(
+                body=b"<rss><channel><title>Feed</title></channel></rss>",
+                headers={"ETag": '"v1"', "Content-Type": "application/rss+xml"},
+            )
+
+        app = web.Application()
+        app.router.add_get("/feed", feed)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.fetcher = fetcher.AiohttpFeedFetcher(timeout_seconds=5)
+
+    async def asyncTearDown(self) -> None:
+        await self.fetcher.close()
+        await self.server.close()
+
+    async def test_fetch_reuses_validators_and_reports_not_modified(self) -> None:
+        url = str(self.server.make_url("/feed"))
+
+        first = await self.fetcher.fetch(url)
+        second = await self.fetcher.fetch(url, etag=first.etag)
+
+        self.assertEqual(first.status, 200)
+        self.assertIn(b"<title>Feed</title>", first.content)
+        self.assertEqual(first.etag, '"v1"')
+        self.assertTrue(second.not_modified)
+        self.assertEqual(self.request_headers[1]["If-None-Match"], '"v1"')
+
+
+class CreateFetcherTests(unittest.TestCase):
+    def test_invalid_settings_fall_back_to_defaults(self) -> None:
+        with self.assertLogs("fetcher", level="WARNING") as logs:
+            created = fetcher.create_fetcher({
+                "fetch_timeout_seconds": "abc",
+                "max_connections": 0,
+                "max_connections_per_host": "8",
+                "dns_cache_seconds": None,
+            })
+
+        self.assertEqual(created.timeout_seconds, fetcher.DEFAULT_TIMEOUT_SECONDS)
+        self.assertEqual(created.max_connections, fetcher.DEFAULT_MAX_CONNECTIONS)
+        self.assertEqual(created.max_connections_per_host, 8)
+        self.assertEqual(created.dns_cache_seconds, fetcher.DEFAULT_DNS_CACHE_SECONDS)
+        self.assertEqual(len(logs.records), 3)
+
+    def test_fetcher_base_class_is_abstract(self) -> None:
+        with self.assertRaises(TypeError):
+            fetcher.FeedFetcher()
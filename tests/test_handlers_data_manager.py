@@ -11,6 +11,8 @@ import handlers
 class HandlerTests(unittest.IsolatedAsyncioTestCase):
     def tearDown(self) -> None:
         data_manager.subscriptions_data = {}
+        data_manager.feed_states = {}
+        data_manager._clear_dirty_marks()
 
     async def test_remove_feed_preserves_user_preferences(self) -> None:
         data_manager.subscriptions_data = {
@@ -36,7 +38,7 @@ class HandlerTests(unittest.IsolatedAsyncioTestCase):
             bot_data={"data_file": "data/subscriptions.json"},
         )
 
-        with patch("handlers.data_manager.save_subscriptions"):
+        with patch("handlers.data_manager.request_save"):
             await handlers.remove_feed(update, context)
 
         self.assertIn("123", data_manager.subscriptions_data)
@@ -44,10 +46,167 @@ class HandlerTests(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(data_manager.subscriptions_data["123"]["custom_footer"], "Footer")
         self.assertFalse(data_manager.subscriptions_data["123"]["link_preview_enabled"])
 
+    async def test_list_broken_feeds_reports_failing_feeds(self) -> None:
+        data_manager.subscriptions_data = {
+            "123": {
+                "rss_feeds": {
+                    "https://example.com/ok": {"title": "OK", "keywords": []},
+                    "https://example.com/dead": {"title": "Dead", "keywords": []},
+                },
+            }
+        }
+        for _ in range(handlers.polling.CIRCUIT_BREAK_FAILURES):
+            data_manager.record_feed_failure("https://example.com/dead", "ClientResponseError: 404")
+
+        update = SimpleNamespace(
+            effective_chat=SimpleNamespace(id=123),
+            message=SimpleNamespace(reply_text=AsyncMock()),
+        )
+        await handlers.list_broken_feeds(update, SimpleNamespace(args=[], bot_data={}))
+
+        reply = update.message.reply_text.await_args.args[0]
+        self.assertIn("Dead - https://example.com/dead", reply)
+        self.assertIn("已熔断", reply)
+        self.assertIn("ClientResponseError: 404", reply)
+        self.assertNotIn("https://example.com/ok", reply)
+
+    async def test_profile_command_is_admin_only(self) -> None:
+        update = SimpleNamespace(
+            effective_chat=SimpleNamespace(id=123),
+            message=SimpleNamespace(reply_text=AsyncMock()),
+        )
+        bot_data = {"data_file": "data/subscriptions.json", "config": {"admin_chat_ids": [456]}}
+
+        with patch("handlers.profiler.request_profile") as request_profile:
+            await handlers.profile_check_cycles(update, SimpleNamespace(args=["3"], bot_data=bot_data))
+            request_profile.assert_not_called()
+            self.assertIn("仅限管理员", update.message.reply_text.await_args.args[0])
+
+            bot_data["config"]["admin_chat_ids"].append(123)
+            await handlers.profile_check_cycles(update, SimpleNamespace(args=["3"], bot_data=bot_data))
+
+        request_profile.assert_called_once_with(3, "data")
+
+    async def test_set_filter_rejects_invalid_expression(self) -> None:
+        data_manager.subscriptions_data = {
+            "123": {
+                "rss_feeds": {
+                    "https://example.com/feed": {
+                        "title": "Feed",
+                        "keywords": [],
+                        "filter": None,
+                        "last_entry_id": None,
+                    }
+                },
+                "custom_footer": None,
+                "link_preview_enabled": True,
+            }
+        }
+
+        reply_text = AsyncMock()
+        update = SimpleNamespace(
+            effective_chat=SimpleNamespace(id=123),
+            message=SimpleNamespace(reply_text=reply_text),
+        )
+        context = SimpleNamespace(
+            args=["1", "/(a+)+/"],
+            bot_data={"data_file": "data/subscriptions.json"},
+        )
+
+        with patch("handlers.data_manager.request_save") as request_save:
+            await handlers.set_filter(update, context)
+
+        request_save.assert_not_called()
+        self.assertIsNone(data_manager.subscriptions_data["123"]["rss_feeds"]["https://example.com/feed"]["filter"])
+        self.assertIn("过滤表达式无效", reply_text.await_args.args[0])
+
 
 class DataManagerTests(unittest.TestCase):
     def tearDown(self) -> None:
         data_manager.subscriptions_data = {}
+        data_manager.feed_states = {}
+        data_manager.outbox = {}
+        data_manager._clear_dirty_marks()
+        data_manager._clear_pending_titles()
+
+    def test_subscription_indexes_follow_add_and_remove(self) -> None:
+        data_manager.subscriptions_data = {
+            "1": {"rss_feeds": {"https://a.example/feed": {"title": "A"}}},
+            "2": {"rss_feeds": {}},
+        }
+
+        data_manager.add_subscription("2", "https://a.example/feed", {"title": "A"})
+        data_manager.add_subscription("2", "https://b.example/feed", {"title": "B"})
+        data_manager.add_subscription("1", "https://c.example/feed", {"title": "C"})
+
+        self.assertEqual(list(data_manager.get_feed_subscribers("https://a.example/feed")), ["1", "2"])
+        self.assertEqual(data_manager.get_chat_feed_url("2", 1), "https://b.example/feed")
+        self.assertEqual(handlers.find_feed_by_identifier("1", "2"), "https://c.example/feed")
+
+        self.assertEqual(data_manager.remove_subscription("1", "https://a.example/feed"), {"title": "A"})
+        self.assertIsNone(data_manager.remove_subscription("1", "https://a.example/feed"))
+
+        self.assertEqual(list(data_manager.get_feed_subscribers("https://a.example/feed")), ["2"])
+        self.assertEqual(data_manager.get_chat_feed_urls("1"), ["https://c.example/feed"])
+        self.assertEqual(handlers.find_feed_by_identifier("1", "1"), "https://c.example/feed")
+        self.assertIsNone(handlers.find_feed_by_identifier("1", "https://a.example/feed"))
+        self.assertEqual(
+            sorted(data_manager.get_subscribed_feed_urls()),
+            ["https://a.example/feed", "https://b.example/feed", "https://c.example/feed"],
+        )
+
+        # 整体替换订阅数据后索引随之重建。
+        data_manager.subscriptions_data = {"3": {"rss_feeds": {"https://d.example/feed": {"title": "D"}}}}
+        self.assertEqual(data_manager.get_subscribed_feed_urls(), ["https://d.example/feed"])
+        self.assertEqual(list(data_manager.get_feed_subscribers("https://a.example/feed")), [])
+
+    def test_subscription_indexes_are_rebuilt_after_invalidation(self) -> None:
+        data_manager.subscriptions_data = {
+            "1": {"rss_feeds": {"https://a.example/feed": {"title": "A"}}},
+        }
+        self.assertEqual(data_manager.get_chat_feed_urls("1"), ["https://a.example/feed"])
+
+        # 数量不变的直接修改无法从数据本身察觉，需要显式使索引失效。
+        feeds = data_manager.subscriptions_data["1"]["rss_feeds"]
+        del feeds["https://a.example/feed"]
+        feeds["https://b.example/feed"] = {"title": "B"}
+        data_manager.invalidate_indexes()
+
+        self.assertEqual(data_manager.get_chat_feed_urls("1"), ["https://b.example/feed"])
+        self.assertEqual(data_manager.get_subscribed_feed_urls(), ["https://b.example/feed"])
+
+    def test_remove_subscription_prunes_pending_messages_digests_and_state(self) -> None:
+        feed_url = "https://a.example/feed"
+        other_url = "https://b.example/feed"
+        data_manager.subscriptions_data = {
+            "1": {
+                "rss_feeds": {feed_url: {"title": "A"}, other_url: {"title": "B"}},
+                "digest_pending": [
+                    {"feed_url": feed_url, "feed_title": "A", "line": "a"},
+                    {"feed_url": other_url, "feed_title": "B", "line": "b"},
+                ],
+            },
+            "2": {"rss_feeds": {feed_url: {"title": "A"}}},
+        }
+        data_manager.get_feed_state(feed_url)["etag"] = '"v1"'
+        data_manager.enqueue_message("1:a", "1", "A", feed_url)
+        data_manager.enqueue_message("1:b", "1", "B", other_url)
+        data_manager.enqueue_message("2:a", "2", "A", feed_url)
+
+        data_manager.remove_subscription("1", feed_url)
+
+        self.assertEqual(sorted(data_manager.outbox), ["1:b", "2:a"])
+        self.assertEqual(
+            [item["feed_url"] for item in data_manager.subscriptions_data["1"]["digest_pending"]],
+            [other_url],
+        )
+        self.assertIn(feed_url, data_manager.feed_states)
+
+        data_manager.remove_subscription("2", feed_url)
+
+        self.assertEqual(list(data_manager.outbox), ["1:b"])
+        self.assertNotIn(feed_url, data_manager.feed_states)
+        self.assertIn(feed_url, data_manager._dirty_feed_states)
 
     def test_load_subscriptions_normalizes_feed_fields(self) -> None:
         data_file = Path("tests/.tmp_subscriptions.json")
@@ -100,3 +259,71 @@ class DataManagerTests(unittest.TestCase):
 
         self.assertIn("100", loaded)
         self.assertNotIn("bad", loaded)
+
+    def test_load_subscriptions_defers_missing_titles(self) -> None:
+        data_file = Path("tests/.tmp_subscriptions.json")
+        self.addCleanup(lambda: data_file.unlink(missing_ok=True))
+        data_file.write_text(
+            json.dumps(
+                {
+                    "100": {
+                        "rss_feeds": {
+                            "https://example.com/feed": {"keywords": [], "last_entry_id": None},
+                        },
+                    }
+                }
+            ),
+            encoding="utf-8",
+        )
+
+        with patch("data_manager.fetch_feed_title", new=AsyncMock()) as fetch_feed_title:
+            loaded = data_manager.load_subscriptions(str(data_file))
+
+        fetch_feed_title.assert_not_called()
+        self.assertEqual(
+            loaded["100"]["rss_feeds"]["https://example.com/feed"]["title"],
+            data_manager.UNKNOWN_FEED_TITLE,
+        )
+        self.assertEqual(data_manager.get_pending_title_urls(), ["https://example.com/feed"])
+
+
+class PendingTitleTests(unittest.IsolatedAsyncioTestCase):
+    def tearDown(self) -> None:
+        data_manager.subscriptions_data = {}
+        data_manager._clear_dirty_marks()
+        data_manager._clear_pending_titles()
+
+    async def test_refresh_pending_titles_fills_titles_for_all_chats(self) -> None:
+        feed_url = "https://example.com/feed"
+        data_manager.subscriptions_data = {
+            chat_id: {
+                "rss_feeds": {
+                    feed_url: {
+                        "title": data_manager.UNKNOWN_FEED_TITLE,
+                        "keywords": [],
+                        "last_entry_id": None,
+                    }
+                },
+                "custom_footer": None,
+                "link_preview_enabled": True,
+            }
+            for chat_id in ("1", "2")
+        }
+        data_manager.mark_title_pending("1", feed_url)
+        data_manager.mark_title_pending("2", feed_url)
+
+        with patch(
+            "data_manager.fetch_feed_title",
+            new=AsyncMock(return_value="Real Title"),
+        ) as fetch_feed_title, patch("data_manager.request_save") as request_save:
+            updated = await data_manager.refresh_pending_titles("data/subscriptions.json")
+
+        self.assertEqual(updated, 2)
+        fetch_feed_title.assert_awaited_once_with(feed_url)
+        request_save.assert_called_once()
+        for chat_id in ("1", "2"):
+            self.assertEqual(
+                data_manager.subscriptions_data[chat_id]["rss_feeds"][feed_url]["title"],
+                "Real Title",
+            )
+        self.assertEqual(data_manager.get_pending_title_urls(), [])
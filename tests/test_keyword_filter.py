@@ -0,0 +1,114 @@
+import time
+import unittest
+from unittest.mock import patch
+
+import feed_checker
+import feed_parser
+import keyword_filter
+
+
+class KeywordFilterTests(unittest.TestCase):
+    def test_normalize_keywords_dedupes_and_drops_redundant_terms(self) -> None:
+        self.assertEqual(
+            keyword_filter.normalize_keywords(["Python", "python", "pythonic", " ", "rust"]),
+            ("rust", "python"),
+        )
+
+    def test_automaton_matches_like_substring_scan(self) -> None:
+        keywords = tuple(f"kw{index:03d}" for index in range(200)) + ("he", "she", "hers")
+        automaton = keyword_filter._AhoCorasickAutomaton(keyword_filter.normalize_keywords(keywords))
+
+        for text in ("ushers", "a kw199 b", "nothing here", "no match", "kw20"):
+            expected = any(keyword in text for keyword in keywords)
+            self.assertEqual(automaton.search(text), expected, text)
+
+    def test_compile_keywords_is_cached_per_keyword_set(self) -> None:
+        first = keyword_filter.compile_keywords(["a", "b"])
+
+        self.assertIs(keyword_filter.compile_keywords(["a", "b"]), first)
+        self.assertIsNot(keyword_filter.compile_keywords(["a", "c"]), first)
+
+    def test_match_text_is_built_once_per_entry(self) -> None:
+        raw_entry = {
+            "id": "1",
+            "title": "Hello",
+            "summary": "World",
+            "content": [{"value": "中文内容"}],
+        }
+
+        with patch(
+            "keyword_filter.build_match_fields",
+            wraps=keyword_filter.build_match_fields,
+        ) as build_match_fields:
+            entry = feed_parser.extract_entry(raw_entry)
+            self.assertTrue(feed_checker._matches_keywords(entry, ["world"]))
+            self.assertTrue(feed_checker._matches_keywords(entry, ["中文"]))
+            self.assertFalse(feed_checker._matches_keywords(entry, ["missing"]))
+
+        build_match_fields.assert_called_once()
+
+
+class FilterExpressionTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.entry = feed_parser.extract_entry({
+            "id": "1",
+            "title": "Python 3.13 Released",
+            "summary": "Changelog for the new version",
+            "content": [{"value": "Includes a JIT preview"}],
+        })
+
+    def _matches(self, expression: str) -> bool:
+        return feed_checker._matches_filter(self.entry, expression)
+
+    def test_boolean_operators_and_field_scopes(self) -> None:
+        self.assertTrue(self._matches("python -beta"))
+        self.assertTrue(self._matches("title:python content:jit"))
+        self.assertFalse(self._matches("title:changelog"))
+        self.assertTrue(self._matches("rust OR (title:python AND NOT deprecated)"))
+        self.assertTrue(self._matches('title:"3.13 released"'))
+        self.assertFalse(self._matches("-python"))
+
+    def test_regex_terms(self) -> None:
+        self.assertTrue(self._matches(r"title:/python\s+3\.\d+/"))
+        self.assertFalse(self._matches("content:/^python/"))
+
+    def test_rejects_invalid_and_backtracking_prone_expressions(self) -> None:
+        for expression in (
+            "(python", "title:", "/(a+)+$/", "/(\\w*)*x/", "/(a)\\1/", "OR",
+            "/a*a*a*a*b/", "/(a|a)*b/", "/a.*b.*c/",
+        ):
+            with self.assertRaises(keyword_filter.FilterSyntaxError, msg=expression):
+                keyword_filter.compile_filter(expression)
+
+    def test_accepted_regex_is_bounded_on_adversarial_text(self) -> None:
+        predicate = keyword_filter.compile_filter("/\\w+x/")
+        fields = keyword_filter.MatchFields("", "a" * 50000)
+
+        started_at = time.perf_counter()
+        self.assertFalse(predicate(fields))
+        self.assertLess(time.perf_counter() - started_at, 0.5)
+
+    def test_regex_without_long_repeat_scans_whole_field(self) -> None:
+        fields = keyword_filter.MatchFields("", "x" * 5000 + " python 3.13")
+
+        self.assertTrue(keyword_filter.compile_filter(r"/python 3\.1\d/")(fields))
+        self.assertFalse(keyword_filter.compile_filter(r"/python\s+3/")(fields))
+
+    def test_invalid_stored_filter_is_parsed_and_logged_once(self) -> None:
+        feed_checker._compile_stored_filter.cache_clear()
+
+        with patch(
+            "keyword_filter._tokenize_filter",
+            wraps=keyword_filter._tokenize_filter,
+        ) as tokenize, self.assertLogs("feed_checker", level="WARNING") as logs:
+            for _ in range(3):
+                self.assertTrue(self._matches("(python"))
+
+        tokenize.assert_called_once()
+        self.assertEqual(len(logs.records), 1)
+
+    def test_compiled_filter_is_cached(self) -> None:
+        self.assertIs(
+            keyword_filter.compile_filter("python -beta"),
+            keyword_filter.compile_filter("python -beta"),
+        )
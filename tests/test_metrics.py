@@ -0,0 +1,58 @@
+import timeit
+import unittest
+
+import aiohttp
+
+import metrics
+
+
+class MetricsTests(unittest.IsolatedAsyncioTestCase):
+    def test_histogram_renders_cumulative_buckets(self) -> None:
+        histogram = metrics.Histogram("test_seconds", "Test histogram.", buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 5.0):
+            histogram.observe(value)
+
+        lines = histogram.render()
+
+        self.assertIn('test_seconds_bucket{le="0.1"} 2', lines)
+        self.assertIn('test_seconds_bucket{le="1.0"} 3', lines)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 4', lines)
+        self.assertIn("test_seconds_count 4", lines)
+        self.assertIn("test_seconds_sum 5.65", lines)
+
+    def test_labeled_counter_escapes_label_values(self) -> None:
+        counter = metrics.LabeledCounter("test_bytes_total", "Test counter.", "feed")
+        counter.inc('https://example.com/"feed"', 10)
+        counter.inc('https://example.com/"feed"', 5)
+
+        self.assertIn('test_bytes_total{feed="https://example.com/\\"feed\\""} 15', counter.render())
+
+    def test_observe_is_cheap(self) -> None:
+        histogram = metrics.Histogram("bench_seconds", "Benchmark histogram.")
+        runs = 100_000
+        seconds = min(timeit.repeat(lambda: histogram.observe(0.003), number=runs, repeat=3))
+
+        # 包含 lambda 调用本身的开销，宽松上限只用于发现明显退化。
+        self.assertLess(seconds / runs, 5e-6)
+
+    async def test_metrics_endpoint_serves_prometheus_text(self) -> None:
+        metrics.FEEDS_FETCHED.inc()
+        await metrics.start_metrics_server("127.0.0.1", 0)
+        try:
+            site = next(iter(metrics._runner.sites))
+            port = site._server.sockets[0].getsockname()[1]
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"http://127.0.0.1:{port}/metrics") as response:
+                    body = await response.text()
+                    content_type = response.headers["Content-Type"]
+        finally:
+            await metrics.stop_metrics_server()
+
+        self.assertTrue(content_type.startswith("text/plain"))
+        self.assertIn("# TYPE rss_fetch_seconds histogram", body)
+        self.assertIn("rss_feeds_fetched_total", body)
+        self.assertIn("telegram_send_queue_depth 0", body)
+
+
+if __name__ == "__main__":
+    unittest.main()
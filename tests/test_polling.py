@@ -0,0 +1,68 @@
+import time
+import unittest
+
+import polling
+
+
+class PollingTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.bounds = polling.get_polling_bounds(
+            {
+                "check_interval_seconds": 300,
+                "min_check_interval_seconds": 60,
+                "max_check_interval_seconds": 86400,
+            }
+        )
+
+    def test_learn_update_interval_uses_typical_gap(self) -> None:
+        now = 1_000_000.0
+        timestamps = [now - 600 * index for index in range(10)]
+
+        learned = polling.learn_update_interval(timestamps, now=now)
+
+        self.assertEqual(learned, 300)
+
+    def test_learn_update_interval_grows_for_quiet_feeds(self) -> None:
+        now = 1_000_000.0
+        timestamps = [now - 86400 * 3 - 600 * index for index in range(10)]
+
+        learned = polling.learn_update_interval(timestamps, now=now)
+
+        self.assertGreater(learned, 86400)
+
+    def test_publisher_hints_set_lower_bound(self) -> None:
+        hint = polling.get_publisher_hint_seconds(
+            {"ttl": "60", "sy_updateperiod": "daily", "sy_updatefrequency": "4"},
+            {"cache-control": "public, max-age=120"},
+        )
+
+        self.assertEqual(hint, 6 * 60 * 60)
+        self.assertEqual(polling.compute_poll_interval(self.bounds, 300, hint), 6 * 60 * 60)
+
+    def test_compute_poll_interval_clamps_to_bounds(self) -> None:
+        self.assertEqual(polling.compute_poll_interval(self.bounds, 5), 60)
+        self.assertEqual(polling.compute_poll_interval(self.bounds, 10**9), 86400)
+        self.assertEqual(polling.compute_poll_interval(self.bounds), 300)
+
+    def test_failure_backoff_grows_exponentially_until_circuit_opens(self) -> None:
+        self.assertEqual(polling.compute_failure_backoff(self.bounds, 1), 300)
+        self.assertEqual(polling.compute_failure_backoff(self.bounds, 3), 1200)
+        self.assertEqual(polling.compute_failure_backoff(self.bounds, 9), 76800)
+        self.assertEqual(
+            polling.compute_failure_backoff(self.bounds, polling.CIRCUIT_BREAK_FAILURES),
+            polling.CIRCUIT_PROBE_INTERVAL_SECONDS,
+        )
+        self.assertTrue(polling.is_circuit_open({"failure_count": polling.CIRCUIT_BREAK_FAILURES}))
+        self.assertFalse(polling.is_circuit_open({}))
+
+    def test_get_entry_timestamp_reads_struct_time(self) -> None:
+        entries = [
+            {"published_parsed": time.gmtime(1_700_000_000)},
+            {"updated_parsed": time.gmtime(1_699_990_000)},
+            {"title": "no date"},
+        ]
+
+        self.assertEqual(
+            [polling.get_entry_timestamp(entry) for entry in entries],
+            [1_700_000_000.0, 1_699_990_000.0, None],
+        )
@@ -0,0 +1,53 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import feed_checker
+import profiler
+
+
+class ProfilerTests(unittest.IsolatedAsyncioTestCase):
+    def tearDown(self) -> None:
+        profiler._clear_session()
+
+    def test_begin_cycle_is_noop_when_not_requested(self) -> None:
+        self.assertIsNone(profiler.begin_cycle())
+        self.assertFalse(profiler.is_profiling())
+
+    async def test_profiles_requested_cycles_and_writes_dump(self) -> None:
+        async def slow_cycle(*args) -> None:
+            await asyncio.sleep(0.15)
+            # 阻塞事件循环，模拟在协程里执行同步的重计算。
+            time.sleep(0.3)
+            await asyncio.to_thread(time.sleep, 0.01)
+            await asyncio.sleep(0.15)
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            self.assertTrue(profiler.request_profile(2, output_dir))
+            self.assertFalse(profiler.request_profile(1, output_dir))
+
+            with patch("feed_checker._run_check_cycle", side_effect=slow_cycle):
+                await feed_checker.check_feeds_job(SimpleNamespace(bot_data={}), "data.json")
+                self.assertTrue(profiler.is_profiling())
+                await feed_checker.check_feeds_job(SimpleNamespace(bot_data={}), "data.json")
+
+            self.assertFalse(profiler.is_profiling())
+            dumps = sorted(os.listdir(output_dir))
+            self.assertEqual([name.rsplit(".", 1)[1] for name in dumps], ["json", "prof"])
+            with open(os.path.join(output_dir, dumps[0]), "r", encoding="utf-8") as f:
+                report = json.load(f)
+
+        self.assertEqual(report["cycles"], 2)
+        self.assertEqual(len(report["cycle_seconds"]), 2)
+        self.assertGreaterEqual(report["event_loop_lag"]["max_seconds"], 0.1)
+        self.assertIsNotNone(report["thread_pool"])
+        self.assertTrue(any("slow_cycle" in item["function"] for item in report["top_functions"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import asyncio
+import unittest
+
+import scheduler
+
+
+class CheckSchedulerTests(unittest.IsolatedAsyncioTestCase):
+    async def test_run_respects_global_and_per_host_limits(self) -> None:
+        check_scheduler = scheduler.CheckScheduler(max_concurrency=3, max_per_host=1)
+        active = {"total": 0, "a": 0, "b": 0, "c": 0}
+        peaks = {"total": 0, "a": 0, "b": 0, "c": 0}
+
+        def make_job(host: str, value: int):
+            async def job() -> int:
+                active["total"] += 1
+                active[host] += 1
+                peaks["total"] = max(peaks["total"], active["total"])
+                peaks[host] = max(peaks[host], active[host])
+                await asyncio.sleep(0.01)
+                active["total"] -= 1
+                active[host] -= 1
+                return value
+
+            return job
+
+        jobs = [(host, make_job(host, index)) for index, host in enumerate("aaaabbbcc")]
+        results = await check_scheduler.run(jobs)
+
+        self.assertEqual(results, list(range(9)))
+        self.assertLessEqual(peaks["total"], 3)
+        self.assertEqual(peaks["a"], 1)
+        self.assertEqual(check_scheduler.stats.completed, 9)
+        self.assertEqual(check_scheduler.stats.max_queue_depth, 9)
+        self.assertEqual(check_scheduler.queue_depth, 0)
+
+    async def test_run_captures_job_exceptions(self) -> None:
+        async def failing() -> None:
+            raise RuntimeError("boom")
+
+        async def ok() -> str:
+            return "ok"
+
+        results = await scheduler.CheckScheduler().run([("a", failing), ("b", ok)])
+
+        self.assertIsInstance(results[0], RuntimeError)
+        self.assertEqual(results[1], "ok")
+
+    async def test_run_times_out_slow_jobs_and_defers_jobs_after_deadline(self) -> None:
+        async def slow() -> str:
+            await asyncio.sleep(1)
+            return "slow"
+
+        async def ok() -> str:
+            return "ok"
+
+        check_scheduler = scheduler.CheckScheduler(max_concurrency=1, job_timeout_seconds=0.02)
+        results = await check_scheduler.run([("a", slow), ("b", ok)])
+        self.assertIsInstance(results[0], asyncio.TimeoutError)
+        self.assertEqual(results[1], "ok")
+        self.assertEqual(check_scheduler.stats.timed_out, 1)
+
+        check_scheduler = scheduler.CheckScheduler(max_concurrency=1, cycle_deadline_seconds=0.02)
+        results = await check_scheduler.run([("a", slow), ("b", ok)])
+        self.assertEqual(results, [scheduler.DEFERRED, scheduler.DEFERRED])
+        self.assertEqual(check_scheduler.stats.deferred, 2)
+        self.assertEqual(check_scheduler.queue_depth, 0)
+
+    def test_get_host_key_normalizes_hostname(self) -> None:
+        self.assertEqual(scheduler.get_host_key("https://Example.COM:8443/feed"), "example.com")
@@ -0,0 +1,102 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import AsyncMock
+
+from telegram import error as tg_error
+
+import sender
+
+
+class TokenBucketTests(unittest.TestCase):
+    def test_wait_time_reflects_refill_rate_and_pause(self) -> None:
+        bucket = sender.TokenBucket(rate=2.0, capacity=1.0, now=0.0)
+
+        self.assertEqual(bucket.wait_time(0.0), 0.0)
+        bucket.consume(0.0)
+        self.assertAlmostEqual(bucket.wait_time(0.0), 0.5)
+        self.assertEqual(bucket.wait_time(0.5), 0.0)
+
+        bucket.pause(0.5, 3.0)
+        self.assertAlmostEqual(bucket.wait_time(1.0), 2.5)
+
+
+class MessageSenderTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncTearDown(self) -> None:
+        sender.set_sender(None)
+
+    async def test_round_robin_keeps_busy_chat_from_starving_others(self) -> None:
+        delivered = []
+
+        async def send_message(**kwargs):
+            delivered.append((kwargs["chat_id"], kwargs["text"]))
+
+        bot = AsyncMock()
+        bot.send_message.side_effect = send_message
+        message_sender = sender.MessageSender(bot, global_rate=1000, chat_rate=50, max_in_flight=1)
+
+        busy = [message_sender.send("1", text=f"busy-{index}") for index in range(4)]
+        quiet = message_sender.send("2", text="quiet")
+        await asyncio.gather(*busy, quiet)
+        await message_sender.stop()
+
+        self.assertEqual(delivered[:2], [("1", "busy-0"), ("2", "quiet")])
+        self.assertEqual(message_sender.stats.sent, 5)
+
+    async def test_retry_after_pauses_chat_and_requeues_message(self) -> None:
+        bot = AsyncMock()
+        bot.send_message.side_effect = [tg_error.RetryAfter(0.05), "ok"]
+        message_sender = sender.MessageSender(bot, global_rate=1000, chat_rate=1000)
+
+        result = await message_sender.send("1", text="hello")
+        await message_sender.stop()
+
+        self.assertEqual(result, "ok")
+        self.assertEqual(bot.send_message.await_count, 2)
+        self.assertEqual(message_sender.stats.rate_limited, 1)
+        self.assertEqual(message_sender.stats.sent, 1)
+
+    async def test_long_retry_after_is_raised_to_caller_without_waiting(self) -> None:
+        bot = AsyncMock()
+        bot.send_message.side_effect = tg_error.RetryAfter(3600)
+        message_sender = sender.MessageSender(bot, global_rate=1000, chat_rate=1000)
+
+        with self.assertRaises(tg_error.RetryAfter):
+            await asyncio.wait_for(message_sender.send("1", text="hello"), timeout=1)
+        # 令牌桶仍然暂停，同一聊天的后续消息不会立即重发。
+        self.assertGreater(message_sender._get_chat_bucket("1").wait_time(time.monotonic()), 3000)
+        await message_sender.stop()
+
+        self.assertEqual(bot.send_message.await_count, 1)
+
+    async def test_repeated_short_retry_after_is_capped_per_message(self) -> None:
+        bot = AsyncMock()
+        bot.send_message.side_effect = tg_error.RetryAfter(0.01)
+        message_sender = sender.MessageSender(bot, global_rate=1000, chat_rate=1000, max_retries=2)
+
+        with self.assertRaises(tg_error.RetryAfter):
+            await asyncio.wait_for(message_sender.send("1", text="hello"), timeout=1)
+        await message_sender.stop()
+
+        self.assertEqual(bot.send_message.await_count, 3)
+
+    async def test_non_retryable_error_is_raised_to_caller(self) -> None:
+        bot = AsyncMock()
+        bot.send_message.side_effect = tg_error.BadRequest("chat not found")
+        message_sender = sender.MessageSender(bot, global_rate=1000, chat_rate=1000)
+
+        with self.assertRaises(tg_error.BadRequest):
+            await message_sender.send("1", text="hello")
+        await message_sender.stop()
+
+        self.assertEqual(message_sender.stats.failed, 1)
+
+    def test_group_chats_use_group_rate(self) -> None:
+        message_sender = sender.MessageSender(AsyncMock(), chat_rate=1.0, group_rate_per_minute=20)
+
+        self.assertAlmostEqual(message_sender._get_chat_bucket("-100123").rate, 20 / 60)
+        self.assertEqual(message_sender._get_chat_bucket("123").rate, 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import data_manager
+import storage
+
+
+class SqliteStorageTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.addCleanup(data_manager.close_storage)
+        self.db_file = str(Path(self.temp_dir.name) / "subscriptions.db")
+
+    def tearDown(self) -> None:
+        data_manager.subscriptions_data = {}
+        data_manager._clear_dirty_marks()
+        data_manager.feed_states = {}
+        data_manager.outbox = {}
+
+    def _read_feed_rows(self) -> dict:
+        with sqlite3.connect(self.db_file) as conn:
+            return {
+                (chat_id, feed_url): json.loads(data)
+                for chat_id, feed_url, data in conn.execute("SELECT chat_id, feed_url, data FROM feeds")
+            }
+
+    def test_load_migrates_legacy_json_once(self) -> None:
+        legacy_file = Path(self.temp_dir.name) / "subscriptions.json"
+        legacy_file.write_text(
+            json.dumps(
+                {
+                    "100": {
+                        "rss_feeds": {
+                            "https://example.com/a": {"title": "A", "keywords": [], "last_entry_id": "1"},
+                            "https://example.com/b": {"title": "B", "keywords": ["x"], "last_entry_id": None},
+                        },
+                        "custom_footer": "Footer",
+                        "link_preview_enabled": False,
+                    }
+                }
+            ),
+            encoding="utf-8",
+        )
+
+        loaded = data_manager.load_subscriptions(self.db_file)
+
+        self.assertEqual(list(loaded["100"]["rss_feeds"]), ["https://example.com/a", "https://example.com/b"])
+        self.assertEqual(loaded["100"]["custom_footer"], "Footer")
+        self.assertFalse(loaded["100"]["link_preview_enabled"])
+
+        legacy_file.write_text(json.dumps({"200": {"rss_feeds": {}}}), encoding="utf-8")
+        data_manager.close_storage()
+        reloaded = data_manager.load_subscriptions(self.db_file)
+        self.assertEqual(list(reloaded), ["100"])
+
+    def test_migration_carries_pending_outbox_messages(self) -> None:
+        Path(self.temp_dir.name, "subscriptions.json").write_text(
+            json.dumps({"1": {"rss_feeds": {}}}),
+            encoding="utf-8",
+        )
+        Path(self.temp_dir.name, "subscriptions.outbox.json").write_text(
+            json.dumps({
+                "k2": {"chat_id": "1", "text": "second", "created_at": 1, "attempts": 0},
+                "k1": {"chat_id": "1", "text": "first", "created_at": 2, "attempts": 1},
+            }),
+            encoding="utf-8",
+        )
+
+        data_manager.load_subscriptions(self.db_file)
+
+        self.assertEqual([m["text"] for m in data_manager.get_outbox().values()], ["second", "first"])
+
+    def test_save_writes_only_dirty_rows(self) -> None:
+        data_manager.subscriptions_data = {
+            "1": {
+                "rss_feeds": {
+                    "https://example.com/a": {"title": "A", "keywords": [], "last_entry_id": "1"},
+                    "https://example.com/b": {"title": "B", "keywords": [], "last_entry_id": "1"},
+                },
+                "custom_footer": None,
+                "link_preview_enabled": True,
+            }
+        }
+        data_manager.save_subscriptions(self.db_file)
+
+        feeds = data_manager.subscriptions_data["1"]["rss_feeds"]
+        feeds["https://example.com/a"]["last_entry_id"] = "2"
+        feeds["https://example.com/b"]["last_entry_id"] = "unsaved"
+        data_manager.mark_feed_dirty("1", "https://example.com/a")
+        data_manager.save_subscriptions(self.db_file)
+
+        rows = self._read_feed_rows()
+        self.assertEqual(rows[("1", "https://example.com/a")]["last_entry_id"], "2")
+        self.assertEqual(rows[("1", "https://example.com/b")]["last_entry_id"], "1")
+
+        del feeds["https://example.com/b"]
+        data_manager.mark_feed_dirty("1", "https://example.com/b")
+        data_manager.save_subscriptions(self.db_file)
+
+        self.assertEqual(list(self._read_feed_rows()), [("1", "https://example.com/a")])
+
+    def test_outbox_survives_restart_and_ignores_duplicate_keys(self) -> None:
+        data_manager.subscriptions_data = {"1": {"rss_feeds": {}}}
+        self.assertTrue(data_manager.enqueue_message("k2", "1", "second"))
+        self.assertTrue(data_manager.enqueue_message("k1", "1", "first"))
+        self.assertFalse(data_manager.enqueue_message("k2", "1", "again"))
+        data_manager.save_subscriptions(self.db_file)
+
+        data_manager.close_storage()
+        data_manager.load_subscriptions(self.db_file)
+        self.assertEqual([m["text"] for m in data_manager.get_outbox().values()], ["second", "first"])
+
+        data_manager.acknowledge_message("k2")
+        data_manager.save_subscriptions(self.db_file)
+        data_manager.close_storage()
+        data_manager.load_subscriptions(self.db_file)
+        self.assertEqual(list(data_manager.get_outbox()), ["k1"])
+
+    def test_create_storage_picks_backend_by_extension(self) -> None:
+        self.assertIsInstance(storage.create_storage("data/subscriptions.db"), storage.SqliteStorage)
+        self.assertIsInstance(storage.create_storage("data/subscriptions.json"), storage.JsonStorage)
+
+
+class WriteBehindTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.addCleanup(data_manager.close_storage)
+        self.addCleanup(data_manager.configure_persistence, data_manager.DEFAULT_SAVE_DELAY_SECONDS)
+        self.db_file = str(Path(self.temp_dir.name) / "subscriptions.db")
+        data_manager.subscriptions_data = {
+            "1": {"rss_feeds": {}, "custom_footer": None, "link_preview_enabled": True}
+        }
+
+    def tearDown(self) -> None:
+        data_manager.subscriptions_data = {}
+        data_manager._clear_dirty_marks()
+        data_manager.feed_states = {}
+
+    async def test_request_save_coalesces_writes_within_window(self) -> None:
+        data_manager.configure_persistence(0.05)
+        storage_backend = data_manager._get_storage(self.db_file)
+
+        with patch.object(
+            storage_backend,
+            "save_subscriptions",
+            wraps=storage_backend.save_subscriptions,
+        ) as save:
+            for index in range(50):
+                data_manager.subscriptions_data["1"]["rss_feeds"][f"https://example.com/{index}"] = {
+                    "title": str(index),
+                    "keywords": [],
+                    "last_entry_id": None,
+                }
+                data_manager.mark_feed_dirty("1", f"https://example.com/{index}")
+                data_manager.request_save(self.db_file)
+
+            await asyncio.sleep(0.2)
+
+        save.assert_called_once()
+        data_manager.close_storage()
+        self.assertEqual(len(data_manager.load_subscriptions(self.db_file)["1"]["rss_feeds"]), 50)
+
+    async def test_flush_writes_pending_changes_immediately(self) -> None:
+        data_manager.configure_persistence(60)
+        data_manager.subscriptions_data["1"]["custom_footer"] = "Footer"
+        data_manager.mark_chat_dirty("1")
+        data_manager.request_save(self.db_file)
+
+        await data_manager.flush(self.db_file)
+
+        data_manager.close_storage()
+        self.assertEqual(data_manager.load_subscriptions(self.db_file)["1"]["custom_footer"], "Footer")
+
+    async def test_flush_writes_dirty_feed_states(self) -> None:
+        data_manager.subscriptions_data["1"]["rss_feeds"]["https://example.com/a"] = {"title": "A"}
+        data_manager.save_subscriptions(self.db_file)
+        data_manager.get_feed_state("https://example.com/a")["etag"] = '"v1"'
+        data_manager.mark_feed_state_dirty("https://example.com/a")
+
+        await data_manager.flush(self.db_file)
+
+        data_manager.close_storage()
+        data_manager.load_subscriptions(self.db_file)
+        self.assertEqual(data_manager.get_feed_state("https://example.com/a")["etag"], '"v1"')